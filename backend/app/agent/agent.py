@@ -1,17 +1,35 @@
 import asyncio
 import re
-from typing import Optional, Dict, Any
+import time
+from typing import Optional, Dict, Any, Set
 import json
 
 from app.bot.client import bot_client
+from app.bot.world_state import world_state
+from app.debug.metrics import metrics
+from app.debug.trace import trace_recorder
 from app.llm.client import llm_client
 from app.llm.prompts import get_agent_system_prompt, format_observation
-from app.script.executor import script_executor, BotAPI
+from app.agent.triage import decision_cascade
+from app.script.executor import script_executor, BotAPI, run_skill_task
 from app.skills.manager import skill_manager
-from app.task.manager import task_manager, TaskStatus
+from app.task.manager import task_manager, TaskStatus, DEFAULT_SKILL_RESOURCES
 from app.config import settings
 
 
+# 决策循环指标（/api/metrics）
+TICK_PHASES = ("observe", "status", "format", "prompt", "llm", "dispatch")
+_tick_outcomes = metrics.counter(
+    "agent_ticks_total", "Agent ticks by outcome (decided / no_action / error / skipped_* / disconnected)",
+    ("outcome",)
+)
+_tick_seconds = metrics.histogram("agent_tick_seconds", "Duration of ticks that called the LLM")
+_phase_seconds = metrics.histogram("agent_phase_seconds", "Time spent in each tick phase", ("phase",))
+_phases = {name: _phase_seconds.labels(name) for name in TICK_PHASES}
+_action_seconds = metrics.histogram("agent_action_seconds", "Action dispatch latency by action name", ("action",))
+_action_results = metrics.counter("agent_actions_total", "Dispatched actions by name and result", ("action", "result"))
+
+
 class Agent:
     """
     Main Agent class
@@ -30,8 +48,16 @@ class Agent:
         # 任务管理器引用
         self.task_manager = task_manager
         
-        # 任务运行时的轮询计时
-        self._task_tick_counter: int = 0
+        # 唤醒信号：聊天、受伤、任务结束时立即唤醒决策循环，否则按心跳间隔空转
+        self._wake_event = asyncio.Event()
+        self._wake_reasons: Set[str] = set()
+        self._last_health: Optional[float] = None
+        
+        # 有后台任务时上一次调用 LLM 的时间（用于定时轮询）
+        self._last_llm_call_at: float = 0.0
+        
+        # 录制中的 tick 记录（trace_recorder 启用时）
+        self._trace: Optional[Dict[str, Any]] = None
     
     async def start(self):
         """Start the agent's decision loop"""
@@ -43,7 +69,8 @@ class Agent:
         self.is_running = True
         
         # Register event handler for chat messages
-        bot_client.add_event_handler(self._handle_bot_event)
+        bot_client.add_event_handler(self._handle_bot_event, name="agent")
+        self.task_manager.add_listener(self._on_task_event)
         
         # Start tick loop
         self._tick_task = asyncio.create_task(self._tick_loop())
@@ -67,6 +94,34 @@ class Agent:
                 pass
         
         bot_client.remove_event_handler(self._handle_bot_event)
+        self.task_manager.remove_listener(self._on_task_event)
+    
+    def wake(self, reason: str):
+        """
+        立即唤醒决策循环
+        
+        Args:
+            reason: 唤醒原因（chat / damage / task / manual）
+        """
+        self._wake_reasons.add(reason)
+        self._wake_event.set()
+    
+    async def _wait_for_wake(self):
+        """等待唤醒信号；超过心跳间隔仍未被唤醒则以 heartbeat 原因返回"""
+        try:
+            await asyncio.wait_for(self._wake_event.wait(), timeout=settings.agent_tick_rate)
+        except asyncio.TimeoutError:
+            self._wake_reasons.add("heartbeat")
+        else:
+            # 去抖：把短时间内连续到达的事件合并到同一次 tick
+            if settings.agent_wake_debounce > 0:
+                await asyncio.sleep(settings.agent_wake_debounce)
+        self._wake_event.clear()
+    
+    def _on_task_event(self, event: str, task):
+        """后台任务结束时唤醒决策循环，让 LLM 及时看到结果"""
+        if event in ("completed", "failed"):
+            self.wake("task")
     
     async def _tick_loop(self):
         """Main decision loop"""
@@ -82,24 +137,46 @@ class Agent:
                 elif error_count == 4:
                     print("[Agent] 后续相同错误将不再显示...")
             
-            await asyncio.sleep(settings.agent_tick_rate)
+            await self._wait_for_wake()
     
     async def tick(self):
         """Single decision-action cycle - 事件驱动模式"""
         if not self.is_running:
             return
         
-        # 先检查Bot是否已连接
+        reasons = self._wake_reasons
+        self._wake_reasons = set()
+        # 被事件唤醒（而不只是心跳）时本次 tick 一定要调用 LLM
+        woken_by_event = bool(reasons - {"heartbeat"})
+        
+        # 心跳 tick 在发起任何 HTTP 请求前先判断能否跳过；没有唤醒 Agent 的事件
+        # （如生命值/饥饿值变化）也会进入世界状态镜像，有未读事件时和基线一样照常决策
+        if not woken_by_event and not self._pending_chat and not world_state.has_pending_messages:
+            if self.task_manager.has_active_tasks:
+                task_tick_rate = settings.agent_task_tick_rate
+                if task_tick_rate <= 0 or time.monotonic() - self._last_llm_call_at < task_tick_rate:
+                    _tick_outcomes.labels("skipped_busy").inc()
+                    return
+            elif self.last_action and self.last_action.get("action") == "wait":
+                _tick_outcomes.labels("skipped_wait").inc()
+                return
+        
+        # 1. Get observation（优先使用本地世界状态镜像，过期时才请求 Bot 服务）
+        tick_start = time.perf_counter()
         try:
-            status = await bot_client.get_status()
-            if not status.get("connected"):
+            observation = await world_state.get_observation()
+            if not world_state.connected:
+                _tick_outcomes.labels("disconnected").inc()
                 return  # Bot未连接，静默跳过
         except Exception:
+            _tick_outcomes.labels("observe_error").inc()
             return  # 无法获取状态，静默跳过
+        if trace_recorder.active:
+            self._trace = trace_recorder.begin_tick(list(reasons), observation, self._pending_chat)
+        phase_start = self._end_phase("observe", tick_start)
         
+        outcome = "decided"
         try:
-            # 1. Get observation from bot
-            observation = await bot_client.get_observation()
             
             # Add any pending chat messages
             if self._pending_chat:
@@ -111,6 +188,7 @@ class Agent:
             # 2. 添加当前任务状态到观察
             task_status = self.task_manager.get_status_summary()
             observation["currentTasks"] = task_status
+            phase_start = self._end_phase("status", phase_start)
             
             # 3. 检查触发条件
             has_chat = bool(observation.get("chatMessages"))
@@ -124,14 +202,16 @@ class Agent:
             has_urgent_situation = is_health_critical or is_food_critical
             
             # LLM 触发策略：
-            # - 空闲状态（无后台任务）：每 agent_tick_rate 秒调用一次，让 bot 可以主动行动
+            # - 聊天、受伤、任务结束会立即唤醒循环（经 agent_wake_debounce 去抖）
+            # - 空闲状态（无后台任务）：每个心跳（agent_tick_rate 秒）调用一次，让 bot 可以主动行动
             # - 有后台任务运行时：
-            #   - 有事件/聊天/紧急情况时立即调用
+            #   - 被唤醒或有事件/聊天/紧急情况时立即调用
             #   - 否则每 agent_task_tick_rate 秒调用一次（如果配置 > 0）
             
             if has_active_tasks:
                 # 有后台任务运行时
                 should_call_llm = (
+                    woken_by_event or         # 聊天/受伤/任务结束唤醒
                     has_chat or               # 有聊天消息
                     has_events or             # 有游戏事件
                     has_urgent_situation      # 紧急情况
@@ -140,32 +220,23 @@ class Agent:
                 if not should_call_llm:
                     # 检查是否到了定时轮询时间
                     task_tick_rate = settings.agent_task_tick_rate
-                    if task_tick_rate > 0:
-                        # 计算需要多少个 tick 才等于 task_tick_rate
-                        ticks_needed = int(task_tick_rate / settings.agent_tick_rate)
-                        self._task_tick_counter += 1
-                        
-                        if self._task_tick_counter >= ticks_needed:
-                            # 到达定时轮询时间，触发 LLM
-                            self._task_tick_counter = 0
-                            should_call_llm = True
+                    if task_tick_rate > 0 and time.monotonic() - self._last_llm_call_at >= task_tick_rate:
+                        should_call_llm = True
                     
                     if not should_call_llm:
                         # 任务运行中且未到轮询时间，跳过本次 tick
+                        self._finish_tick("skipped_busy")
                         return
-                else:
-                    # 有事件触发，重置计数器
-                    self._task_tick_counter = 0
             else:
-                # 空闲状态：重置任务计数器
-                self._task_tick_counter = 0
-                
-                # 保持每 tick_rate 秒调用一次
+                # 空闲状态：每个心跳调用一次
                 # 但如果上次是 wait 且没有新事件，可以跳过
-                if (not has_chat and not has_events and
+                if (not woken_by_event and not has_chat and not has_events and
                     self.last_action and self.last_action.get("action") == "wait"):
+                    self._finish_tick("skipped_wait")
                     return
             
+            self._last_llm_call_at = time.monotonic()
+            
             # 3. Format observation for LLM
             user_message = format_observation(observation)
             
@@ -175,21 +246,52 @@ class Agent:
             
             if self.last_action_result:
                 user_message += f"\n\nLast action result: {self.last_action_result}"
+            phase_start = self._end_phase("format", phase_start)
             
             # 4. Get decision from LLM
             print("[Agent] Thinking...")
             
+            # 易变状态（位置、生命值、时间）已在 user_message 中，
+            # 系统提示词只随后台任务状态变化，保证前缀可被缓存复用
             system_prompt = get_agent_system_prompt({
-                "position": observation.get("position"),
-                "health": observation.get("health"),
-                "time": observation.get("time"),
                 "has_active_tasks": has_active_tasks
             })
+            phase_start = self._end_phase("prompt", phase_start)
+            if self._trace is not None:
+                self._trace["sp"] = trace_recorder.prompt_id(system_prompt)
+                self._trace["um"] = user_message
             
             # print(f"[Agent] System Prompt: {system_prompt}")
             # print(f"[Agent] User Message: {user_message}")
 
-            response = await llm_client.chat_json(system_prompt, user_message)
+            # 配置了分诊模型时先由小模型判断，简单情况不经过主模型
+            response, tier = await decision_cascade.decide(
+                system_prompt, user_message, urgent=has_urgent_situation
+            )
+            phase_start = self._end_phase("llm", phase_start)
+            if self._trace is not None:
+                self._trace["llm"] = {
+                    "raw": llm_client.last_response,
+                    "decision": response,
+                    "stats": dict(llm_client.last_stats),
+                    "tier": tier,
+                    "triage": decision_cascade.last_triage,
+                }
+            
+            if settings.llm_stream_decisions and llm_client.last_stats:
+                stats = llm_client.last_stats
+                print(
+                    f"[Agent] 决策耗时: 动作就绪 {stats.get('time_to_action')}s, "
+                    f"首 token {stats.get('time_to_first_token')}s, "
+                    f"总计 {stats.get('total_time')}s"
+                    f"{' (已提前中止生成)' if stats.get('aborted') else ''}"
+                )
+            if llm_client.last_stats.get("prompt_eval_count") is not None:
+                stats = llm_client.last_stats
+                print(
+                    f"[Agent] Prompt 评估: {stats['prompt_eval_count']} tokens, "
+                    f"{stats.get('prompt_eval_duration')}s"
+                )
             
             if settings.debug:
                 print(f"[Agent] LLM Response: {response}")
@@ -197,9 +299,10 @@ class Agent:
             # 5. Execute action
             if response and response.get("action"):
                 print(f"[Agent] Thought: {response.get('thought', 'N/A')}")
-                print(f"[Agent] Action: {response['action']} {response.get('parameters', {})}")
+                print(f"[Agent] Action ({tier}): {response['action']} {response.get('parameters', {})}")
                 
                 self.last_action = response
+                action_name = str(response["action"])
                 
                 # 特殊处理：启动后台技能任务
                 if response["action"] == "startSkill":
@@ -225,19 +328,52 @@ class Agent:
                         response.get("parameters", {})
                     )
                 
+                action_time = time.perf_counter() - phase_start
+                self._record_phase("dispatch", action_time)
+                _action_seconds.labels(action_name).observe(action_time)
+                succeeded = isinstance(self.last_action_result, dict) and self.last_action_result.get("success")
+                _action_results.labels(action_name, "success" if succeeded else "failure").inc()
+                
                 print(f"[Agent] Result: {self.last_action_result.get('message', 'N/A')}")
             else:
+                outcome = "no_action"
                 print("[Agent] No valid action in response")
         except AttributeError as e:
+            outcome = "invalid_response"
             print(f"[Agent] Error: {e}")
             print("[Agent] LLM Response is not a JSON, skipping JSON decode")
             self.last_action_result = {"success": False, "message": "Please respond in JSON format only."}
         except Exception as e:
+            outcome = "error"
             print(f"[Agent] Error: {e}")
             self.last_action_result = {"success": False, "message": str(e)}
+        self._finish_tick(outcome, tick_start)
+    
+    def _record_phase(self, name: str, elapsed: float):
+        _phases[name].observe(elapsed)
+        if self._trace is not None:
+            self._trace["phases"][name] = round(elapsed, 6)
+    
+    def _end_phase(self, name: str, start: float) -> float:
+        """记录一个阶段的耗时，返回下一个阶段的开始时间"""
+        now = time.perf_counter()
+        self._record_phase(name, now - start)
+        return now
+    
+    def _finish_tick(self, outcome: str, tick_start: Optional[float] = None):
+        """记录 tick 结果（已获取观察之后的 tick）"""
+        _tick_outcomes.labels(outcome).inc()
+        if tick_start is not None:
+            _tick_seconds.observe(time.perf_counter() - tick_start)
+        if self._trace is not None:
+            if outcome in ("decided", "error", "invalid_response"):
+                self._trace["result"] = self.last_action_result
+            trace_recorder.end_tick(self._trace, outcome)
+            self._trace = None
     
     async def force_tick(self):
         """Force an immediate decision cycle"""
+        self._wake_reasons.add("manual")
         await self.tick()
     
     async def _start_skill_task(self, params: Dict[str, Any]) -> Dict[str, Any]:
@@ -263,17 +399,27 @@ class Agent:
                 "message": f"技能 '{skill_name}' 不存在，可用技能: {', '.join(skill_names)}"
             }
         
-        # 创建后台任务
-        async def run_skill():
-            bot_api = BotAPI()
-            return await bot_api.useSkill(skill_name, **skill_kwargs)
-        
-        task = self.task_manager.create_task(
-            name=skill_name,
-            description=skill.get("description", ""),
-            coroutine_func=run_skill
-        )
+        # 创建后台任务（后端重启后按 resume 重新执行）
+        try:
+            task = self.task_manager.create_task(
+                skill_name,
+                skill.get("description", ""),
+                run_skill_task,
+                skill_name,
+                skill_kwargs,
+                priority=int(params.get("priority", 0)),
+                resources=skill.get("resources", DEFAULT_SKILL_RESOURCES),
+                resume={"skill": skill_name, "kwargs": skill_kwargs}
+            )
+        except ValueError as e:
+            return {"success": False, "message": f"无法启动技能 '{skill_name}': {e}"}
         
+        if task.status == TaskStatus.PENDING:
+            return {
+                "success": True,
+                "message": f"技能 '{skill_name}' 已加入队列（{self.task_manager.get_wait_reason(task)}），任务ID: {task.id}",
+                "task_id": task.id
+            }
         return {
             "success": True,
             "message": f"已启动技能 '{skill_name}'，任务ID: {task.id}",
@@ -400,6 +546,18 @@ class Agent:
         """Handle events from the bot WebSocket"""
         event_type = event.get("type")
         
+        if event_type == "health":
+            health = event.get("health")
+            food = event.get("food")
+            if health is not None:
+                # 生命值下降视为受伤，立即唤醒
+                if self._last_health is not None and health < self._last_health:
+                    self.wake("damage")
+                self._last_health = health
+            if (health is not None and health < 6) or (food is not None and food < 4):
+                self.wake("urgent")
+            return
+        
         if event_type == "chat":
             message = event.get("message", "")
             username = event.get("username", "")
@@ -440,6 +598,7 @@ class Agent:
                 "username": username,
                 "message": message
             })
+            self.wake("chat")
     
     async def _handle_test_command(self, message: str, username: str):
         """
@@ -530,10 +689,13 @@ class Agent:
                     await bot_client.execute_action("stopMoving", {})
                     raise
             
+            # 玩家直接触发的测试优先于 LLM 启动的任务
             task = self.task_manager.create_task(
                 name=skill_name,
                 description=f"测试技能 (由 {username} 触发)",
-                coroutine_func=run_skill_with_notification
+                coroutine_func=run_skill_with_notification,
+                priority=10,
+                resources=skill.get("resources", DEFAULT_SKILL_RESOURCES)
             )
             
             await bot_client.execute_action("chat", {
@@ -650,6 +812,9 @@ class Agent:
             "last_action": self.last_action,
             "last_action_result": self.last_action_result,
             "pending_chat_count": len(self._pending_chat),
+            "llm_stats": llm_client.last_stats,
+            "cascade": decision_cascade.get_stats(),
+            "world_state": world_state.get_stats(),
             "active_tasks": task_status
         }
 
@@ -0,0 +1,189 @@
+"""
+Decision Cascade for LLM-MC
+
+Two-tier decisions: when settings.llm_triage_model is set, a small model
+first classifies the tick (idle / chat / plan / emergency). Categories in
+agent_triage_answer with confidence >= agent_triage_min_confidence are
+answered by the small model itself (idle -> wait, chat -> chat reply);
+everything else, and any triage failure, escalates to the planner
+(settings.llm_model). Ticks with critical health or food skip triage.
+
+Every decision is tagged with the tier that produced it (triage / planner);
+agent_decision_seconds{tier} and agent_llm_tokens_total{stage} show the
+latency and token cost of each tier, get_stats() estimates the time saved.
+"""
+import time
+from typing import Optional, Dict, Any, Tuple
+
+from app.config import settings
+from app.debug.metrics import metrics
+from app.llm.client import llm_client
+from app.llm.prompts import get_triage_system_prompt
+from app.llm.schema import DecisionError, decision_schema, triage_schema
+
+
+_decisions = metrics.counter("agent_decisions_total", "Agent decisions by the tier that produced them", ("tier",))
+_decision_seconds = metrics.histogram(
+    "agent_decision_seconds", "LLM time per decision by tier (planner includes triage time when escalated)", ("tier",)
+)
+_triage_results = metrics.counter(
+    "agent_triage_total",
+    "Triage results by category (invalid / error when triage failed) and result "
+    "(answered / escalated / low_confidence / bypassed)",
+    ("category", "result")
+)
+_llm_tokens = metrics.counter(
+    "agent_llm_tokens_total", "Prompt + completion tokens spent per cascade stage", ("stage",)
+)
+
+# 分诊判断为 idle 时的等待秒数（之后的心跳 tick 会因为上次是 wait 被跳过，直到有新事件）
+IDLE_WAIT_SECONDS = 1
+
+
+def _tokens(stats: Dict[str, Any]) -> int:
+    return (stats.get("prompt_eval_count") or 0) + (stats.get("eval_count") or stats.get("chunks") or 0)
+
+
+class DecisionCascade:
+    """
+    两级决策：分诊小模型 + 主模型
+
+    Agent 每次决策调用 decide()，未配置分诊模型时直接调用主模型。
+    """
+
+    def __init__(self):
+        self.last_triage: Optional[Dict[str, Any]] = None
+        self.last_tier: Optional[str] = None
+        self.triage_calls = 0
+        self.triage_seconds = 0.0
+        self.answered = 0
+        self.escalated = 0
+        self.escalated_seconds = 0.0  # 升级的 tick 中花在分诊上的时间
+        self.planner_calls = 0
+        self.planner_seconds = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(settings.llm_triage_model)
+
+    async def decide(self, system_prompt: str, user_message: str, urgent: bool = False) -> Tuple[Dict[str, Any], str]:
+        """
+        获取本次 tick 的决策
+
+        Args:
+            system_prompt: 主模型的系统提示词
+            user_message: 格式化后的观察信息
+            urgent: 生命值/饥饿值危急，跳过分诊直接交给主模型
+
+        Returns:
+            (决策, 产生决策的层级 triage / planner)
+        """
+        start = time.perf_counter()
+        self.last_triage = None
+        if self.enabled:
+            if urgent:
+                _triage_results.labels("emergency", "bypassed").inc()
+            else:
+                decision = await self._triage(user_message)
+                if decision is not None:
+                    return self._done(decision, "triage", start)
+
+        planner_start = time.perf_counter()
+        decision = await llm_client.chat_json(system_prompt, user_message, schema=decision_schema)
+        self.planner_calls += 1
+        self.planner_seconds += time.perf_counter() - planner_start
+        _llm_tokens.labels("planner").inc(_tokens(llm_client.last_stats))
+        return self._done(decision, "planner", start)
+
+    def _done(self, decision: Dict[str, Any], tier: str, start: float) -> Tuple[Dict[str, Any], str]:
+        self.last_tier = tier
+        _decisions.labels(tier).inc()
+        _decision_seconds.labels(tier).observe(time.perf_counter() - start)
+        return decision, tier
+
+    async def _triage(self, user_message: str) -> Optional[Dict[str, Any]]:
+        """调用分诊模型；能直接处理时返回决策，否则返回 None（升级到主模型）"""
+        start = time.perf_counter()
+        category = None
+        # 请求失败时 last_stats 不会更新，先清空，避免把上一次（通常是主模型）的 token 算到分诊上
+        llm_client.last_stats = {}
+        try:
+            result = await llm_client.chat_json(
+                get_triage_system_prompt(), user_message,
+                schema=triage_schema, profile="triage", use_history=False
+            )
+            category = result["category"]
+        except DecisionError:
+            result, label = None, "invalid"
+        except Exception as e:
+            # 分诊模型不可用时不影响决策，交给主模型
+            print(f"[Triage] 分诊失败: {e}")
+            result, label = None, "error"
+        elapsed = time.perf_counter() - start
+        self.triage_calls += 1
+        self.triage_seconds += elapsed
+        _llm_tokens.labels("triage").inc(_tokens(llm_client.last_stats))
+
+        decision = None
+        if result is not None:
+            label = category
+            decision = self._answer(result)
+            self.last_triage = {**result, "seconds": round(elapsed, 3)}
+        if decision is None:
+            self.escalated += 1
+            self.escalated_seconds += elapsed
+            low_confidence = result is not None and category in settings.agent_triage_answer
+            _triage_results.labels(label, "low_confidence" if low_confidence else "escalated").inc()
+            return None
+        self.answered += 1
+        _triage_results.labels(label, "answered").inc()
+        return decision
+
+    @staticmethod
+    def _answer(result: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """分诊模型自己给出的决策；类别不在 agent_triage_answer 或置信度不足时返回 None"""
+        category = result["category"]
+        if category not in settings.agent_triage_answer:
+            return None
+        if result["confidence"] < settings.agent_triage_min_confidence:
+            return None
+        if category == "idle":
+            return {"thought": "分诊: 没有需要处理的事情", "action": "wait",
+                    "parameters": {"seconds": IDLE_WAIT_SECONDS}}
+        if category == "chat" and result["reply"]:
+            return {"thought": "分诊: 简单聊天，直接回复", "action": "chat",
+                    "parameters": {"message": result["reply"]}}
+        return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各层调用次数、平均耗时和估算节省的时间"""
+        triage_avg = self.triage_seconds / self.triage_calls if self.triage_calls else None
+        planner_avg = self.planner_seconds / self.planner_calls if self.planner_calls else None
+        saved = None
+        if triage_avg is not None and planner_avg is not None:
+            # 分诊直接处理的 tick 省下一次主模型调用，升级的 tick 多花一次分诊
+            saved = self.answered * (planner_avg - triage_avg) - self.escalated_seconds
+        decisions = self.answered + self.planner_calls
+        return {
+            "enabled": self.enabled,
+            "triage_model": settings.llm_triage_model or None,
+            "planner_model": settings.llm_model,
+            "last_tier": self.last_tier,
+            "last_triage": self.last_triage,
+            "triage": {
+                "calls": self.triage_calls,
+                "answered": self.answered,
+                "escalated": self.escalated,
+                "avg_seconds": round(triage_avg, 3) if triage_avg is not None else None,
+            },
+            "planner": {
+                "calls": self.planner_calls,
+                "avg_seconds": round(planner_avg, 3) if planner_avg is not None else None,
+            },
+            "answered_rate": round(self.answered / decisions, 3) if decisions else None,
+            "saved_seconds_est": (round(saved, 1) or 0.0) if saved is not None else None,
+        }
+
+
+# 全局两级决策实例
+decision_cascade = DecisionCascade()
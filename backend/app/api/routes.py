@@ -1,12 +1,21 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Header
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 
 from app.agent.agent import agent
 from app.bot.client import bot_client
+from app.bot.world_state import world_state
+from app.debug.metrics import metrics
+from app.debug.trace import trace_recorder, resolve_trace_name
+from app.debug.watchdog import loop_watchdog
+from app.llm.client import llm_client
+from app.llm.profiles import PROFILES
 from app.script.executor import script_executor
+from app.skills.cache import skill_cache
 from app.skills.manager import skill_manager
-from app.task.manager import task_manager
+from app.task.manager import task_manager, DEFAULT_SKILL_RESOURCES
+from app.task.stream import task_stream
 
 
 router = APIRouter()
@@ -73,6 +82,97 @@ async def get_bot_observation():
         raise HTTPException(status_code=503, detail=f"Bot service error: {str(e)}")
 
 
+@router.get("/bot/world-state")
+async def get_world_state():
+    """Get the local world-state mirror and how many HTTP calls it saved"""
+    return {
+        "stats": world_state.get_stats(),
+        "snapshot": {
+            "position": world_state.position,
+            "health": world_state.health,
+            "inventory": world_state.inventory,
+            "nearbyEntities": world_state.nearby_entities,
+            "time": world_state.time,
+            "weather": world_state.weather,
+        }
+    }
+
+
+@router.get("/bot/events")
+async def get_event_dispatch_stats():
+    """Get WebSocket event dispatch stats (per-subscriber queue depth and drops)"""
+    return bot_client.get_dispatch_stats()
+
+
+@router.get("/debug/loop")
+async def get_loop_stats(offenders: int = 10, reset: bool = False):
+    """
+    Get event loop lag stats: lag histogram, stall count, top blocking sources
+    and the most recent offenders with their captured stacks
+    """
+    stats = loop_watchdog.get_stats(offenders=offenders)
+    if reset:
+        loop_watchdog.reset()
+    return stats
+
+
+@router.get("/debug/trace")
+async def get_trace_status():
+    """Get the agent trace recorder status"""
+    return trace_recorder.get_stats()
+
+
+@router.post("/debug/trace/start")
+async def start_trace(path: str = "agent-trace.jsonl.gz"):
+    """
+    Start recording agent ticks and bot round trips to `path`, a file name
+    under backend/data/. Replay offline with
+    `python -m app.debug.replay data/<path>`
+    """
+    try:
+        path = resolve_trace_name(path)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    trace_recorder.start(path)
+    return {"success": True, **trace_recorder.get_stats()}
+
+
+@router.post("/debug/trace/stop")
+async def stop_trace():
+    """Stop recording"""
+    trace_recorder.stop()
+    return {"success": True, **trace_recorder.get_stats()}
+
+
+@router.get("/llm/profiles")
+async def get_llm_profiles():
+    """Generation profiles per call type (options and keep_alive sent to Ollama)"""
+    return {name: profile.to_dict() for name, profile in PROFILES.items()}
+
+
+@router.get("/llm/endpoints")
+async def get_llm_endpoints():
+    """LLM endpoints with health, in-flight requests and latency EWMA"""
+    return llm_client.router.get_stats()
+
+
+@router.get("/metrics")
+async def get_metrics(format: str = "prometheus", reset: bool = False):
+    """
+    Agent decision-loop and LLM metrics: per-phase tick timers, ticks by
+    outcome / skip reason, action latency by name, token counts and JSON
+    parse outcomes. Prometheus text format by default, `?format=json` for
+    a summary with counts and averages
+    """
+    if format == "json":
+        body = metrics.snapshot()
+    else:
+        body = PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+    if reset:
+        metrics.reset()
+    return body
+
+
 @router.post("/bot/connect")
 async def connect_bot():
     """Connect bot to Minecraft server"""
@@ -183,6 +283,18 @@ async def execute_script(request: ScriptRequest):
         raise HTTPException(status_code=500, detail=f"Script execution error: {str(e)}")
 
 
+@router.get("/script/cache")
+async def get_script_cache_stats():
+    """Get script compile cache stats (hits on raw / normalized script, misses, evictions)"""
+    return script_executor.get_cache_stats()
+
+
+@router.get("/script/workers")
+async def get_script_worker_stats():
+    """Get script worker pool stats (isolation mode, idle/busy workers, timeouts, crashes)"""
+    return script_executor.get_worker_stats()
+
+
 # ========== Skills Library Endpoints ==========
 
 class SkillCreateRequest(BaseModel):
@@ -191,6 +303,7 @@ class SkillCreateRequest(BaseModel):
     description: str
     code: str
     params: Optional[List[str]] = None
+    resources: Optional[List[str]] = None
 
 
 class SkillResponse(BaseModel):
@@ -257,7 +370,8 @@ async def create_skill(request: SkillCreateRequest):
         name=request.name,
         description=request.description,
         code=request.code,
-        params=request.params or []
+        params=request.params or [],
+        resources=request.resources
     )
     
     if result.get("success"):
@@ -311,6 +425,12 @@ async def get_skill_code(name: str):
     }
 
 
+@router.get("/skills-cache")
+async def get_skills_cache_stats():
+    """获取技能编译缓存的命中统计"""
+    return skill_cache.get_stats()
+
+
 @router.get("/skills-description")
 async def get_skills_description():
     """
@@ -369,6 +489,45 @@ async def get_current_task():
         }
 
 
+@router.get("/tasks/scheduler")
+async def get_scheduler_stats():
+    """
+    获取调度器状态：资源占用、等待队列（排队原因、等待时间）和抢占次数
+    """
+    return {
+        "success": True,
+        "scheduler": task_manager.get_scheduler_stats(),
+        "journal": task_manager.get_journal_stats()
+    }
+
+
+@router.get("/tasks/stream")
+async def stream_tasks(since: Optional[int] = None, last_event_id: Optional[str] = Header(None)):
+    """
+    推送任务变更（Server-Sent Events）
+    
+    每条消息的 id 是序号，event 是变更类型（create / queue / start / progress / log /
+    completed / failed / cancelled / snapshot），data 只包含变化的字段。
+    
+    Args:
+        since: 已收到的最后一个序号，从它之后继续推送；不填时先发送完整快照。
+               浏览器 EventSource 重连时会自动带上 Last-Event-ID 请求头
+    """
+    if since is None and last_event_id and last_event_id.isdigit():
+        since = int(last_event_id)
+    return StreamingResponse(
+        task_stream.stream(since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/tasks/stream/stats")
+async def get_task_stream_stats():
+    """获取任务推送统计（当前序号、客户端缓冲、快照重发次数）"""
+    return task_stream.get_stats()
+
+
 @router.get("/tasks/{task_id}")
 async def get_task(task_id: str):
     """
@@ -392,6 +551,7 @@ class StartSkillRequest(BaseModel):
     """启动技能请求"""
     skillName: str
     kwargs: Optional[Dict[str, Any]] = None
+    priority: int = 0
 
 
 @router.post("/tasks/start-skill")
@@ -402,23 +562,30 @@ async def start_skill_task(request: StartSkillRequest):
     Args:
         skillName: 技能名称
         kwargs: 技能参数（可选）
+        priority: 优先级（可选），数字越大越优先
     """
-    from app.script.executor import BotAPI
+    from app.script.executor import run_skill_task
     
     skill = skill_manager.get_skill(request.skillName)
     if not skill:
         raise HTTPException(status_code=404, detail=f"Skill '{request.skillName}' not found")
     
-    # 创建后台任务
-    async def run_skill():
-        bot_api = BotAPI()
-        return await bot_api.useSkill(request.skillName, **(request.kwargs or {}))
-    
-    task = task_manager.create_task(
-        name=request.skillName,
-        description=skill.get("description", ""),
-        coroutine_func=run_skill
-    )
+    # 创建后台任务（后端重启后按 resume 重新执行）
+    kwargs = request.kwargs or {}
+    try:
+        task = task_manager.create_task(
+            request.skillName,
+            skill.get("description", ""),
+            run_skill_task,
+            request.skillName,
+            kwargs,
+            priority=request.priority,
+            resources=skill.get("resources", DEFAULT_SKILL_RESOURCES),
+            resume={"skill": request.skillName, "kwargs": kwargs}
+        )
+    except ValueError as e:
+        # 技能声明了无效的资源（如手动编辑过 index.json）
+        raise HTTPException(status_code=400, detail=str(e))
     
     return {
         "success": True,
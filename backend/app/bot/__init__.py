@@ -1,3 +1,4 @@
-from .client import BotClient, bot_client
+from .client import BotClient, BotRPCError, bot_client
+from .world_state import WorldState, world_state
 
-__all__ = ["BotClient", "bot_client"]
\ No newline at end of file
+__all__ = ["BotClient", "BotRPCError", "bot_client", "WorldState", "world_state"]
\ No newline at end of file
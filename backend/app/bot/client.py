@@ -1,12 +1,29 @@
 import httpx
 import asyncio
+import itertools
 import json
-from typing import Dict, Any, Optional, Callable, List
+import time
+from typing import Dict, Any, Optional, Callable, List, Set
 import websockets
 
+from app.bot.dispatch import EventSubscriber
 from app.config import settings
 
 
+class BotRPCError(Exception):
+    """Bot 服务通过 WebSocket RPC 返回的错误（对应 HTTP 的 4xx/5xx）"""
+    
+    def __init__(self, status: int, result: Any):
+        self.status = status
+        self.result = result
+        message = result.get("message") or result.get("error") if isinstance(result, dict) else result
+        super().__init__(f"Bot service error {status}: {message}")
+
+
+class _RPCNotSent(Exception):
+    """请求没有发出（WebSocket 不可用），可以安全地回退到 HTTP"""
+
+
 class BotClient:
     """Client for communicating with the Node.js Mineflayer bot service"""
     
@@ -16,10 +33,39 @@ class BotClient:
         self.http_client: Optional[httpx.AsyncClient] = None
         self.ws_connection = None
         self.event_handlers: List[Callable] = []
+        # 每个事件处理器一个订阅者（独立的有界队列和 worker）
+        self._subscribers: Dict[Callable, EventSubscriber] = {}
+        self.events_received = 0
         self._ws_task: Optional[asyncio.Task] = None
+        # 读取任务把事件直接放入各订阅者队列（从不等待）；block 策略的订阅者落后时事件进入
+        # 各自的等待区，合计达到 ws_inbox_size 才暂停读取 WebSocket，由 TCP 流控把压力传回 Bot 服务
+        self._inbox_space = asyncio.Event()
+        self._inbox_space.set()
+        self.inbox_max_depth = 0
+        self.read_pauses = 0
+        self.read_paused_time = 0.0
+        # 正在停止的订阅者（保留引用，避免任务被回收）
+        self._stopping: Set[asyncio.Task] = set()
+        
+        # 事件等待器：按事件类型分桶，按 id 存储，注册/移除均为 O(1)
+        self._event_waiters: Dict[str, Dict[int, "_EventWaiter"]] = {}
+        # 带键值匹配的等待器：event_type -> {(字段路径, 值): {id: waiter}}
+        self._keyed_waiters: Dict[str, Dict[tuple, Dict[int, "_EventWaiter"]]] = {}
+        # event_type -> {字段路径: 引用计数}，事件到达时只需检查这些路径
+        self._keyed_paths: Dict[str, Dict[str, int]] = {}
+        self._waiter_ids = itertools.count()
         
-        # 事件等待器：用于等待特定事件
-        self._event_waiters: List[Dict[str, Any]] = []
+        self.ws_connected = False
+        # HTTP 请求计数（用于统计每分钟的往返次数）
+        self.http_request_count = 0
+        
+        # WebSocket RPC：id -> 等待响应的 future，多个请求可以同时在途
+        self._rpc_pending: Dict[int, asyncio.Future] = {}
+        self._rpc_ids = itertools.count(1)
+        self.rpc_request_count = 0
+        self.rpc_fallback_count = 0
+        # 动作执行监听器：callback(action, result)，用于本地状态镜像等
+        self._action_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
     
     async def init(self):
         """Initialize the HTTP client"""
@@ -38,6 +84,8 @@ class BotClient:
         """Close connections"""
         if self._ws_task:
             self._ws_task.cancel()
+        for subscriber in list(self._subscribers.values()):
+            await subscriber.stop()
         if self.ws_connection:
             await self.ws_connection.close()
         if self.http_client:
@@ -47,12 +95,22 @@ class BotClient:
     
     async def get_status(self) -> Dict[str, Any]:
         """Get bot status"""
+        try:
+            return await self._rpc("status", timeout=10.0)
+        except _RPCNotSent:
+            pass
+        self.http_request_count += 1
         response = await self.http_client.get("/status")
         response.raise_for_status()
         return response.json()
     
     async def get_observation(self) -> Dict[str, Any]:
         """Get current observation from bot"""
+        try:
+            return await self._rpc("observation", timeout=10.0)
+        except _RPCNotSent:
+            pass
+        self.http_request_count += 1
         response = await self.http_client.get("/observation")
         response.raise_for_status()
         return response.json()
@@ -60,42 +118,206 @@ class BotClient:
     async def execute_action(
         self, 
         action: str, 
-        parameters: Optional[Dict[str, Any]] = None
+        parameters: Optional[Dict[str, Any]] = None,
+        timeout: Optional[float] = None
     ) -> Dict[str, Any]:
-        """Execute an action on the bot"""
-        payload = {
-            "action": action,
-            "parameters": parameters or {}
-        }
-        response = await self.http_client.post("/action", json=payload)
-        response.raise_for_status()
-        return response.json()
+        """
+        Execute an action on the bot
+        
+        优先通过 WebSocket RPC 发送，WebSocket 不可用时回退到 HTTP。
+        请求一旦发出就不会再用 HTTP 重试，避免动作被执行两次。
+        
+        Args:
+            action: 动作名称
+            parameters: 动作参数
+            timeout: 等待结果的超时时间（秒），默认 settings.bot_rpc_timeout
+        """
+        try:
+            result = await self._rpc(
+                "action",
+                {"action": action, "parameters": parameters or {}},
+                timeout=timeout or settings.bot_rpc_timeout
+            )
+        except _RPCNotSent:
+            payload = {
+                "action": action,
+                "parameters": parameters or {}
+            }
+            self.http_request_count += 1
+            response = await self.http_client.post("/action", json=payload, timeout=timeout or httpx.USE_CLIENT_DEFAULT)
+            response.raise_for_status()
+            result = response.json()
+        for listener in self._action_listeners:
+            try:
+                listener(action, result)
+            except Exception as e:
+                print(f"[BotClient] Action listener error: {e}")
+        return result
+    
+    async def execute_batch(self, actions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        在一次往返中执行多个只读动作
+        
+        Args:
+            actions: [{"action": 名称, "parameters": {...}}, ...]
+            
+        Returns:
+            与输入顺序一致的结果列表，每一项单独成功或失败
+            （非只读动作会得到 success=False 的结果，不会被执行）
+        """
+        if not actions:
+            return []
+        result = await self.execute_action("batch", {"actions": actions})
+        if result.get("success") and isinstance(result.get("results"), list):
+            return result["results"]
+        if "Unknown action" in str(result.get("message", "")):
+            # Bot 服务版本较旧，不支持 batch：逐个执行
+            return [
+                await self.execute_action(item["action"], item.get("parameters") or {})
+                for item in actions
+            ]
+        return [dict(result) for _ in actions]
+    
+    def add_action_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """Add a listener called after every executed action"""
+        self._action_listeners.append(callback)
+    
+    def remove_action_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """Remove an action listener"""
+        if callback in self._action_listeners:
+            self._action_listeners.remove(callback)
     
     async def connect(self) -> Dict[str, Any]:
         """Tell bot to connect to Minecraft server"""
+        self.http_request_count += 1
         response = await self.http_client.post("/connect")
         response.raise_for_status()
         return response.json()
     
     async def disconnect(self) -> Dict[str, Any]:
         """Tell bot to disconnect from Minecraft server"""
+        self.http_request_count += 1
         response = await self.http_client.post("/disconnect")
         response.raise_for_status()
         return response.json()
     
+    # ========== WebSocket RPC ==========
+    
+    async def _rpc(self, method: str, payload: Optional[Dict[str, Any]] = None, timeout: float = 30.0) -> Any:
+        """
+        通过 WebSocket 发送一个请求并等待对应 id 的响应
+        
+        Raises:
+            _RPCNotSent: RPC 未启用或 WebSocket 不可用，调用方应回退到 HTTP
+            BotRPCError: Bot 服务返回错误状态
+            asyncio.TimeoutError: 超时未收到响应
+        """
+        ws = self.ws_connection
+        if not settings.bot_ws_rpc or not self.ws_connected or ws is None:
+            if settings.bot_ws_rpc:
+                self.rpc_fallback_count += 1
+            raise _RPCNotSent()
+        
+        request_id = next(self._rpc_ids)
+        future = asyncio.get_running_loop().create_future()
+        self._rpc_pending[request_id] = future
+        try:
+            try:
+                await ws.send(json.dumps({"type": "rpc", "id": request_id, "method": method, **(payload or {})}))
+            except Exception:
+                self.rpc_fallback_count += 1
+                raise _RPCNotSent()
+            self.rpc_request_count += 1
+            status, result = await asyncio.wait_for(future, timeout=timeout)
+        finally:
+            self._rpc_pending.pop(request_id, None)
+        
+        if status >= 400:
+            raise BotRPCError(status, result)
+        return result
+    
+    def _resolve_rpc(self, message: Dict[str, Any]):
+        future = self._rpc_pending.get(message.get("id"))
+        if future is not None and not future.done():
+            future.set_result((message.get("status", 200), message.get("result")))
+    
+    def _fail_pending_rpcs(self, error: Exception):
+        """连接断开时，让所有在途请求立即失败"""
+        for future in self._rpc_pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._rpc_pending.clear()
+    
     # ========== WebSocket Methods ==========
     
-    def add_event_handler(self, handler: Callable):
-        """Add an event handler for WebSocket events"""
+    def add_event_handler(
+        self,
+        handler: Callable,
+        max_queue: Optional[int] = None,
+        overflow: Optional[str] = None,
+        name: Optional[str] = None
+    ):
+        """
+        Add an event handler for WebSocket events
+        
+        每个处理器有自己的有界队列，按自身速度消费，不会阻塞 WebSocket 读取。
+        
+        Args:
+            handler: 事件处理函数（同步或异步）
+            max_queue: 队列上限，默认 settings.ws_subscriber_queue_size
+            overflow: 队列满时的策略 drop_oldest / coalesce / block，默认 settings.ws_overflow_policy
+            name: 统计中显示的名称
+        """
+        if handler in self._subscribers:
+            return
+        subscriber = EventSubscriber(
+            handler,
+            max_queue=max_queue or settings.ws_subscriber_queue_size,
+            overflow=overflow or settings.ws_overflow_policy,
+            name=name
+        )
+        subscriber.on_drain = self._on_subscriber_drain
+        self._subscribers[handler] = subscriber
         self.event_handlers.append(handler)
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return  # 尚无事件循环，在 start_ws_listener 时启动
+        subscriber.start()
     
     def remove_event_handler(self, handler: Callable):
         """Remove an event handler"""
         if handler in self.event_handlers:
             self.event_handlers.remove(handler)
+        subscriber = self._subscribers.pop(handler, None)
+        if subscriber:
+            # 它的等待区不再计入总数，读取可能因此恢复
+            self._on_subscriber_drain()
+            task = asyncio.create_task(subscriber.stop())
+            self._stopping.add(task)
+            task.add_done_callback(self._stopping.discard)
+    
+    def get_dispatch_stats(self) -> Dict[str, Any]:
+        """事件分发统计：每个订阅者的队列深度和丢弃计数"""
+        return {
+            "ws_connected": self.ws_connected,
+            "events_received": self.events_received,
+            "inbox_depth": self.pending_events,
+            "inbox_max_depth": self.inbox_max_depth,
+            "read_pauses": self.read_pauses,
+            "read_paused_time": round(self.read_paused_time, 3),
+            "rpc_requests": self.rpc_request_count,
+            "rpc_in_flight": len(self._rpc_pending),
+            "rpc_fallbacks": self.rpc_fallback_count,
+            "http_requests": self.http_request_count,
+            "waiters": self.get_waiter_count(),
+            "subscribers": [s.get_stats() for s in self._subscribers.values()],
+        }
     
     async def start_ws_listener(self):
         """Start listening for WebSocket events"""
+        for subscriber in self._subscribers.values():
+            subscriber.start()
         self._ws_task = asyncio.create_task(self._ws_loop())
     
     async def _ws_loop(self):
@@ -104,14 +326,25 @@ class BotClient:
             try:
                 async with websockets.connect(self.ws_url) as ws:
                     self.ws_connection = ws
+                    self.ws_connected = True
                     print(f"[BotClient] WebSocket connected to {self.ws_url}")
                     
-                    async for message in ws:
-                        try:
-                            event = json.loads(message)
-                            await self._handle_event(event)
-                        except json.JSONDecodeError:
-                            print(f"[BotClient] Invalid JSON: {message}")
+                    try:
+                        async for message in ws:
+                            try:
+                                event = json.loads(message)
+                            except json.JSONDecodeError:
+                                print(f"[BotClient] Invalid JSON: {message}")
+                                continue
+                            if event.get("type") == "rpcResult":
+                                self._resolve_rpc(event)
+                            else:
+                                self._handle_event(event)
+                                if not self._inbox_space.is_set():
+                                    await self._wait_for_inbox_space()
+                    finally:
+                        self.ws_connected = False
+                        self._fail_pending_rpcs(ConnectionError("WebSocket connection closed"))
                             
             except websockets.exceptions.ConnectionClosed:
                 print("[BotClient] WebSocket connection closed, reconnecting...")
@@ -120,55 +353,115 @@ class BotClient:
                 print(f"[BotClient] WebSocket error: {e}, reconnecting...")
                 await asyncio.sleep(5)
     
-    async def _handle_event(self, event: Dict[str, Any]):
-        """Handle incoming WebSocket event"""
-        # 首先检查事件等待器
-        await self._check_event_waiters(event)
+    def _handle_event(self, event: Dict[str, Any]):
+        """Handle incoming WebSocket event（在读取任务中调用，不会等待）"""
+        self.events_received += 1
+        # 事件等待器在读取任务中直接处理（只是设置 future，开销很小）
+        self._check_event_waiters(event)
         
-        # 然后调用普通事件处理器
-        for handler in self.event_handlers:
-            try:
-                if asyncio.iscoroutinefunction(handler):
-                    await handler(event)
-                else:
-                    handler(event)
-            except Exception as e:
-                print(f"[BotClient] Event handler error: {e}")
+        # 普通事件处理器：放入各订阅者的队列，由订阅者自己的 worker 处理
+        for subscriber in self._subscribers.values():
+            subscriber.put(event)
+        pending = self.pending_events
+        if pending > self.inbox_max_depth:
+            self.inbox_max_depth = pending
+        if pending >= settings.ws_inbox_size:
+            self._inbox_space.clear()
+    
+    @property
+    def pending_events(self) -> int:
+        """block 策略订阅者等待区中的事件总数"""
+        return sum(s.pending for s in self._subscribers.values())
+    
+    def _on_subscriber_drain(self):
+        if not self._inbox_space.is_set() and self.pending_events < settings.ws_inbox_size:
+            self._inbox_space.set()
+    
+    async def _wait_for_inbox_space(self):
+        """等待区已满：暂停读取 WebSocket，直到 block 策略的订阅者消化掉一部分事件"""
+        self.read_pauses += 1
+        start = time.perf_counter()
+        await self._inbox_space.wait()
+        self.read_paused_time += time.perf_counter() - start
     
-    async def _check_event_waiters(self, event: Dict[str, Any]):
-        """检查并触发匹配的事件等待器"""
+    # ========== Event Waiters ==========
+    
+    def _check_event_waiters(self, event: Dict[str, Any]):
+        """检查并触发匹配的事件等待器（只检查同类型的等待器）"""
         event_type = event.get("type")
         
-        # 遍历所有等待器
-        waiters_to_remove = []
-        for waiter in self._event_waiters:
-            # 检查事件类型是否匹配
-            if waiter["event_type"] != event_type:
-                continue
-            
-            # 如果有过滤器，检查是否匹配
-            filter_func = waiter.get("filter")
-            if filter_func:
+        # 带过滤函数或无条件的等待器
+        waiters = self._event_waiters.get(event_type)
+        if waiters:
+            for waiter in list(waiters.values()):
+                if waiter.matches(event):
+                    self._resolve_waiter(waiter, event)
+        
+        # 按键值索引的等待器：每个注册过的路径只需一次字典查找
+        keyed = self._keyed_waiters.get(event_type)
+        if keyed:
+            for path in list(self._keyed_paths.get(event_type, ())):
+                value = _get_path(event, path)
                 try:
-                    if not filter_func(event):
-                        continue
-                except Exception as e:
-                    print(f"[BotClient] Event filter error: {e}")
+                    bucket = keyed.get((path, value))
+                except TypeError:
+                    continue  # 不可哈希的值不可能被索引
+                if not bucket:
                     continue
-            
-            # 匹配成功，设置结果
-            waiter["future"].set_result(event)
-            waiters_to_remove.append(waiter)
-        
-        # 移除已触发的等待器
-        for waiter in waiters_to_remove:
-            self._event_waiters.remove(waiter)
+                for waiter in list(bucket.values()):
+                    if waiter.matches(event):
+                        self._resolve_waiter(waiter, event)
+    
+    def _resolve_waiter(self, waiter: "_EventWaiter", event: Dict[str, Any]):
+        if not waiter.future.done():
+            waiter.future.set_result(event)
+        self._remove_waiter(waiter)
+    
+    def _add_waiter(self, waiter: "_EventWaiter"):
+        if waiter.index_path is None:
+            self._event_waiters.setdefault(waiter.event_type, {})[waiter.id] = waiter
+            return
+        keyed = self._keyed_waiters.setdefault(waiter.event_type, {})
+        for value in waiter.index_values:
+            keyed.setdefault((waiter.index_path, value), {})[waiter.id] = waiter
+        paths = self._keyed_paths.setdefault(waiter.event_type, {})
+        paths[waiter.index_path] = paths.get(waiter.index_path, 0) + 1
+    
+    def _remove_waiter(self, waiter: "_EventWaiter"):
+        """移除等待器（O(1)，可重复调用）"""
+        if waiter.removed:
+            return
+        waiter.removed = True
+        if waiter.index_path is None:
+            waiters = self._event_waiters.get(waiter.event_type)
+            if waiters is not None:
+                waiters.pop(waiter.id, None)
+                if not waiters:
+                    del self._event_waiters[waiter.event_type]
+            return
+        keyed = self._keyed_waiters.get(waiter.event_type, {})
+        for value in waiter.index_values:
+            key = (waiter.index_path, value)
+            bucket = keyed.get(key)
+            if bucket is not None:
+                bucket.pop(waiter.id, None)
+                if not bucket:
+                    del keyed[key]
+        if not keyed:
+            self._keyed_waiters.pop(waiter.event_type, None)
+        paths = self._keyed_paths.get(waiter.event_type, {})
+        paths[waiter.index_path] = paths.get(waiter.index_path, 1) - 1
+        if paths[waiter.index_path] <= 0:
+            del paths[waiter.index_path]
+        if not paths:
+            self._keyed_paths.pop(waiter.event_type, None)
     
     async def wait_for_event(
         self,
         event_type: str,
         filter_func: Optional[Callable[[Dict[str, Any]], bool]] = None,
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        match: Optional[Dict[str, Any]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         等待特定类型的事件
@@ -177,6 +470,9 @@ class BotClient:
             event_type: 事件类型（如 'playerCollect', 'chat', 'death' 等）
             filter_func: 可选的过滤函数，返回 True 表示匹配
             timeout: 超时时间（秒），默认 30 秒
+            match: 可选的键值匹配条件，键为点分隔的字段路径，值为期望值
+                   （值为 list/set/tuple 时表示匹配其中任意一个）。
+                   第一个条件会被建立索引，无需为每个事件调用过滤函数
             
         Returns:
             匹配的事件数据，超时返回 None
@@ -185,35 +481,95 @@ class BotClient:
             # 等待某个玩家捡起物品
             event = await bot_client.wait_for_event(
                 "playerCollect",
-                filter_func=lambda e: e.get("collector", {}).get("name") == "Steve",
+                match={"collector.name": "Steve"},
                 timeout=10.0
             )
         """
-        future = asyncio.get_event_loop().create_future()
-        
-        waiter = {
-            "event_type": event_type,
-            "filter": filter_func,
-            "future": future
-        }
-        
-        self._event_waiters.append(waiter)
+        future = asyncio.get_running_loop().create_future()
+        waiter = _EventWaiter(next(self._waiter_ids), event_type, filter_func, match, future)
+        self._add_waiter(waiter)
         
         try:
-            result = await asyncio.wait_for(future, timeout=timeout)
-            return result
+            return await asyncio.wait_for(future, timeout=timeout)
         except asyncio.TimeoutError:
-            # 超时，移除等待器
-            if waiter in self._event_waiters:
-                self._event_waiters.remove(waiter)
             return None
+        finally:
+            # 超时或被取消时清理等待器
+            self._remove_waiter(waiter)
+    
+    def get_waiter_count(self) -> int:
+        """当前注册的等待器数量"""
+        count = sum(len(w) for w in self._event_waiters.values())
+        for keyed in self._keyed_waiters.values():
+            seen = set()
+            for bucket in keyed.values():
+                seen.update(bucket.keys())
+            count += len(seen)
+        return count
     
     def cancel_all_waiters(self):
         """取消所有事件等待器"""
-        for waiter in self._event_waiters:
-            if not waiter["future"].done():
-                waiter["future"].cancel()
+        waiters = [w for ws in self._event_waiters.values() for w in ws.values()]
+        waiters += [w for keyed in self._keyed_waiters.values() for b in keyed.values() for w in b.values()]
+        for waiter in waiters:
+            if not waiter.future.done():
+                waiter.future.cancel()
         self._event_waiters.clear()
+        self._keyed_waiters.clear()
+        self._keyed_paths.clear()
+
+
+_MATCH_ANY_TYPES = (list, tuple, set, frozenset)
+
+
+def _get_path(event: Dict[str, Any], path: str) -> Any:
+    """按点分隔路径取值，如 'collector.name'"""
+    value: Any = event
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+class _EventWaiter:
+    """单个事件等待器"""
+    
+    __slots__ = ("id", "event_type", "filter", "conditions", "index_path", "index_values", "future", "removed")
+    
+    def __init__(self, waiter_id: int, event_type: str, filter_func: Optional[Callable],
+                 match: Optional[Dict[str, Any]], future: asyncio.Future):
+        self.id = waiter_id
+        self.event_type = event_type
+        self.filter = filter_func
+        self.future = future
+        self.removed = False
+        self.index_path: Optional[str] = None
+        self.index_values: tuple = ()
+        self.conditions: List[tuple] = []
+        
+        if match:
+            items = list(match.items())
+            self.index_path, expected = items[0]
+            self.index_values = tuple(expected) if isinstance(expected, _MATCH_ANY_TYPES) else (expected,)
+            # 第一个条件由索引保证，其余条件在命中后逐一检查
+            self.conditions = items[1:]
+    
+    def matches(self, event: Dict[str, Any]) -> bool:
+        for path, expected in self.conditions:
+            value = _get_path(event, path)
+            if isinstance(expected, _MATCH_ANY_TYPES):
+                if value not in expected:
+                    return False
+            elif value != expected:
+                return False
+        if self.filter:
+            try:
+                return bool(self.filter(event))
+            except Exception as e:
+                print(f"[BotClient] Event filter error: {e}")
+                return False
+        return True
 
 
 # Singleton instance
@@ -0,0 +1,160 @@
+"""
+WebSocket Event Dispatch for LLM-MC
+Each event subscriber gets its own bounded queue and worker task, so a slow
+handler never stalls the other subscribers. Only "block" subscribers that
+fall settings.ws_inbox_size events behind pause reading the socket
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Dict, Any, Optional, Callable, Deque
+
+
+# 队列满时的处理策略
+OVERFLOW_DROP_OLDEST = "drop_oldest"  # 丢弃最旧的事件
+OVERFLOW_COALESCE = "coalesce"        # 用新事件替换队列中同类型的旧事件（没有同类型时丢弃最旧的）
+OVERFLOW_BLOCK = "block"              # 不丢事件：队列满后新事件进入订阅者自己的等待区，不影响其他订阅者；
+                                      # 所有等待区合计达到 ws_inbox_size 时 BotClient 暂停读取 WebSocket
+OVERFLOW_POLICIES = (OVERFLOW_DROP_OLDEST, OVERFLOW_COALESCE, OVERFLOW_BLOCK)
+
+
+class EventSubscriber:
+    """
+    单个事件订阅者
+
+    读取任务调用 put() 入队（从不等待），订阅者自己的 worker 按自身速度逐个取出并调用 handler。
+    """
+
+    def __init__(
+        self,
+        handler: Callable,
+        max_queue: int = 1000,
+        overflow: str = OVERFLOW_DROP_OLDEST,
+        name: Optional[str] = None
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow} (expected one of {', '.join(OVERFLOW_POLICIES)})")
+        self.handler = handler
+        self.max_queue = max(1, max_queue)
+        self.overflow = overflow
+        self.name = name or getattr(handler, "__qualname__", repr(handler))
+        self._is_async = asyncio.iscoroutinefunction(handler)
+
+        self._queue: Deque[Dict[str, Any]] = deque()
+        # block 策略：队列满后到达的事件按顺序在这里等待进入队列
+        self._pending: Deque[Dict[str, Any]] = deque()
+        self._blocked_since = 0.0
+        self._not_empty = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        # 等待区有事件进入队列时调用（BotClient 据此恢复读取 WebSocket）
+        self.on_drain: Optional[Callable[[], None]] = None
+
+        # 统计
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.errors = 0
+        self.max_depth = 0
+        self.max_pending = 0
+        self.blocked_time = 0.0
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    @property
+    def pending(self) -> int:
+        """block 策略等待区中的事件数"""
+        return len(self._pending)
+
+    def start(self):
+        """启动 worker（需要在事件循环中调用，可重复调用）"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """停止 worker，丢弃未处理的事件"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._queue.clear()
+        if self._pending:
+            self._pending.clear()
+            if self.on_drain:
+                self.on_drain()
+
+    def put(self, event: Dict[str, Any]):
+        """入队（不等待）；block 策略在队列满时把事件放进自己的等待区"""
+        if self._pending or len(self._queue) >= self.max_queue:
+            if self.overflow == OVERFLOW_BLOCK:
+                if not self._pending:
+                    self._blocked_since = time.perf_counter()
+                self._pending.append(event)
+                if len(self._pending) > self.max_pending:
+                    self.max_pending = len(self._pending)
+                return
+            elif self.overflow == OVERFLOW_COALESCE and self._coalesce(event):
+                return
+            else:
+                self._queue.popleft()
+                self.dropped += 1
+
+        self._queue.append(event)
+        if len(self._queue) > self.max_depth:
+            self.max_depth = len(self._queue)
+        self._not_empty.set()
+
+    def _coalesce(self, event: Dict[str, Any]) -> bool:
+        """用新事件替换队列中最旧的同类型事件，成功返回 True（只在队列满时扫描）"""
+        event_type = event.get("type")
+        for i, queued in enumerate(self._queue):
+            if queued.get("type") == event_type:
+                del self._queue[i]
+                self._queue.append(event)
+                self.coalesced += 1
+                return True
+        return False
+
+    async def _run(self):
+        while True:
+            if not self._queue:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+                continue
+
+            event = self._queue.popleft()
+            if self._pending:
+                self._queue.append(self._pending.popleft())
+                if not self._pending:
+                    self.blocked_time += time.perf_counter() - self._blocked_since
+                if self.on_drain:
+                    self.on_drain()
+            try:
+                if self._is_async:
+                    await self.handler(event)
+                else:
+                    self.handler(event)
+            except Exception as e:
+                self.errors += 1
+                print(f"[BotClient] Event handler error ({self.name}): {e}")
+            self.delivered += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "policy": self.overflow,
+            "depth": self.depth,
+            "max_queue": self.max_queue,
+            "max_depth": self.max_depth,
+            "pending": self.pending,
+            "max_pending": self.max_pending,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "errors": self.errors,
+            "blocked_time": round(self.blocked_time, 3),
+        }
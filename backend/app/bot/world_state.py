@@ -0,0 +1,311 @@
+"""
+World State Mirror for LLM-MC
+Keeps a local copy of the bot's state, maintained from the WebSocket event stream
+"""
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, Any, Optional, List, Set
+
+from app.bot.client import BotClient, bot_client
+from app.config import settings
+
+
+# 执行后会改变对应状态的动作：执行完成后本地镜像中的这些字段需要重新从 Bot 服务读取
+ACTION_INVALIDATES: Dict[str, tuple] = {
+    "goTo": ("position",),
+    "followPlayer": ("position",),
+    "stopMoving": ("position",),
+    "mountEntity": ("position",),
+    "dismount": ("position",),
+    "collectBlock": ("position", "inventory"),
+    "craft": ("position", "inventory"),
+    "smelt": ("position", "inventory"),
+    "placeBlock": ("inventory",),
+    "dropItem": ("inventory",),
+    "equipItem": ("inventory",),
+    "useItem": ("inventory",),
+    "useOnEntity": ("inventory",),
+    "depositItem": ("inventory",),
+    "withdrawItem": ("inventory",),
+    "eat": ("inventory", "health"),
+}
+
+
+class WorldState:
+    """
+    Bot 世界状态的本地镜像
+
+    - 订阅 WebSocket 事件（position / health / inventory / entities / time）增量更新
+    - 定期向 Bot 服务完整同步一次，纠正漏掉的事件造成的偏差
+    - 在 WebSocket 在线且距离上次完整同步不超过 world_state_max_staleness 秒时，
+      查询直接由本地镜像提供，否则回退到 Bot 服务（WebSocket RPC 或 HTTP）
+    - Bot 服务每次返回观察都会清空其中的聊天和游戏事件，所有读取都把它们
+      收进镜像，由 snapshot() 统一交给 Agent
+    """
+
+    def __init__(self, client: BotClient):
+        self.client = client
+
+        self.connected = False
+        self.position: Optional[Dict[str, Any]] = None
+        self.health: Optional[Dict[str, Any]] = None
+        self.inventory: List[Dict[str, Any]] = []
+        self.nearby_entities: List[Dict[str, Any]] = []
+        self.time: Optional[Dict[str, Any]] = None
+        self.weather: Optional[Dict[str, Any]] = None
+
+        self._events: List[str] = []      # 未读的游戏事件（health 事件生成的 + 观察中带回的），读取后清空
+        self._chat: List[Dict[str, Any]] = []  # WebSocket 没有送达、由观察带回的聊天消息，读取后清空
+        # 上次读取 Bot 服务观察以来经 WebSocket 收到的聊天和事件，观察中的相同条目据此去重
+        self._ws_chat: Counter = Counter()
+        self._ws_events: Counter = Counter()
+        self._dirty: Set[str] = set()     # 动作执行后需要重新读取的字段
+        self._last_sync: Optional[float] = None
+        self.last_observation_local = False  # 最近一次 get_observation 是否由本地镜像提供
+        self._resync_task: Optional[asyncio.Task] = None
+        self._resync_lock = asyncio.Lock()
+
+        # 统计
+        self._started_at = time.monotonic()
+        self.resync_count = 0
+        self.local_reads = 0
+        self.round_trips_saved = {"rpc": 0, "http": 0}  # 本地读取省下的 Bot 服务往返，按原本会走的通道
+
+    async def start(self):
+        """开始订阅事件并定期完整同步"""
+        # 镜像只关心每类事件的最新值，积压时同类型事件直接合并
+        self.client.add_event_handler(self._handle_event, overflow="coalesce", name="world_state")
+        self.client.add_action_listener(self._on_action)
+        self._started_at = time.monotonic()
+        self._resync_task = asyncio.create_task(self._resync_loop())
+
+    async def stop(self):
+        """停止订阅"""
+        self.client.remove_event_handler(self._handle_event)
+        self.client.remove_action_listener(self._on_action)
+        if self._resync_task:
+            self._resync_task.cancel()
+            try:
+                await self._resync_task
+            except asyncio.CancelledError:
+                pass
+
+    # ========== 同步 ==========
+
+    async def _resync_loop(self):
+        """定期完整同步"""
+        while True:
+            try:
+                await self.resync()
+            except Exception:
+                # Bot 服务不可用时保持静默，下次再试
+                self._last_sync = None
+            await asyncio.sleep(settings.world_state_resync_interval)
+
+    async def resync(self) -> Dict[str, Any]:
+        """
+        向 Bot 服务完整同步一次（聊天和游戏事件收进镜像，见 snapshot()）
+
+        Returns:
+            Bot 服务返回的原始观察（未连接时为空字典）
+        """
+        async with self._resync_lock:
+            status = await self.client.get_status()
+            self.connected = bool(status.get("connected"))
+            observation: Dict[str, Any] = {}
+            if self.connected:
+                observation = await self._fetch_observation()
+                self._apply_observation(observation)
+            self._dirty.clear()
+            self._last_sync = time.monotonic()
+            self.resync_count += 1
+            return observation
+
+    async def _fetch_observation(self) -> Dict[str, Any]:
+        """读取 Bot 服务的观察，并收下其中的聊天和游戏事件（服务端读取后即清空）"""
+        observation = await self.client.get_observation()
+        self._stash_messages(observation)
+        return observation
+
+    def _stash_messages(self, observation: Dict[str, Any]):
+        """
+        保存观察中 WebSocket 没有送达的聊天和游戏事件
+
+        已经经 WebSocket 收到的条目（聊天由 Agent 收集，health 事件由 _handle_event 记录）
+        按内容和类型抵消，只保留漏掉的部分，如断线期间的聊天、entityHurt 产生的 took_damage。
+        """
+        ws_chat, self._ws_chat = self._ws_chat, Counter()
+        ws_events, self._ws_events = self._ws_events, Counter()
+        for message in observation.get("chatMessages") or []:
+            key = (message.get("username"), message.get("message"))
+            if ws_chat[key] > 0:
+                ws_chat[key] -= 1
+            else:
+                self._chat.append(message)
+        for event in observation.get("events") or []:
+            kind = event.split(":", 1)[0]
+            if ws_events[kind] > 0:
+                ws_events[kind] -= 1
+            else:
+                self._events.append(event)
+        del self._chat[:-settings.max_chat_messages]
+        del self._events[:-settings.max_events]
+
+    def _apply_observation(self, observation: Dict[str, Any]):
+        self.position = observation.get("position")
+        self.health = observation.get("health")
+        self.inventory = observation.get("inventory") or []
+        self.nearby_entities = observation.get("nearbyEntities") or []
+        self.time = observation.get("time")
+        self.weather = observation.get("weather")
+
+    def is_fresh(self, max_age: Optional[float] = None) -> bool:
+        """本地镜像是否可以直接使用"""
+        if self._last_sync is None or not self.client.ws_connected:
+            return False
+        if max_age is None:
+            max_age = settings.world_state_max_staleness
+        return time.monotonic() - self._last_sync <= max_age
+
+    # ========== 事件处理 ==========
+
+    def _handle_event(self, event: Dict[str, Any]):
+        event_type = event.get("type")
+
+        if event_type == "position":
+            self.position = event.get("position")
+        elif event_type == "health":
+            old_health = (self.health or {}).get("health")
+            self.health = {"health": event.get("health"), "food": event.get("food")}
+            self._events.append(f"health_change: Health: {event.get('health')}, Food: {event.get('food')}")
+            self._ws_events["health_change"] += 1
+            if old_health is not None and event.get("health") is not None and event["health"] < old_health:
+                self._events.append("took_damage: Bot took damage")
+                self._ws_events["took_damage"] += 1
+            del self._events[:-settings.max_events]
+        elif event_type == "chat":
+            self._ws_chat[(event.get("username"), event.get("message"))] += 1
+        elif event_type == "inventory":
+            self.inventory = event.get("inventory") or []
+        elif event_type == "entities":
+            self.nearby_entities = event.get("nearbyEntities") or []
+        elif event_type == "time":
+            self.time = event.get("time")
+            self.weather = event.get("weather", self.weather)
+
+    def _on_action(self, action: str, result: Dict[str, Any]):
+        """动作执行后，把受影响的字段标记为需要重新读取"""
+        fields = ACTION_INVALIDATES.get(action)
+        if fields:
+            self._dirty.update(fields)
+
+    # ========== 查询 ==========
+
+    def _count_local(self, saved_calls: int):
+        self.local_reads += 1
+        # 本地读取只在 WebSocket 在线时发生，此时请求原本会走 RPC（未启用时走 HTTP）
+        self.round_trips_saved["rpc" if settings.bot_ws_rpc else "http"] += saved_calls
+
+    @property
+    def has_pending_messages(self) -> bool:
+        """是否有还没交给 Agent 的聊天或游戏事件"""
+        return bool(self._events or self._chat)
+
+    async def get_observation(self) -> Dict[str, Any]:
+        """
+        获取观察（与 Bot 服务 /observation 的结构一致）
+
+        本地镜像可用时直接返回快照，省去 status 和 observation 两次往返；
+        否则完整同步一次后返回快照。两种情况返回的字段和来源相同。
+        调用方应先检查 connected（未连接时返回空字典）。
+        """
+        if self.is_fresh() and not self._dirty:
+            self._count_local(2)
+            self.last_observation_local = True
+            return self.snapshot()
+        self.last_observation_local = False
+        observation = await self.resync()
+        return self.snapshot() if self.connected else observation
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        当前镜像的快照，聊天和游戏事件读取后清空
+
+        chatMessages 只包含 WebSocket 没有送达的聊天，送达的聊天由 Agent 通过事件单独收集。
+        """
+        events, self._events = self._events, []
+        chat, self._chat = self._chat, []
+        return {
+            "timestamp": int(time.time() * 1000),
+            "position": self.position,
+            "health": self.health,
+            "nearbyEntities": list(self.nearby_entities),
+            "inventory": list(self.inventory),
+            "chatMessages": chat,
+            "events": events,
+            "time": self.time,
+            "weather": self.weather,
+        }
+
+    async def get_position(self) -> Dict[str, Any]:
+        """获取当前位置"""
+        if self.is_fresh() and "position" not in self._dirty and self.position is not None:
+            self._count_local(1)
+            return self.position
+        observation = await self._fetch_observation()
+        self.position = observation.get("position")
+        self._dirty.discard("position")
+        return observation.get("position", {"x": 0, "y": 0, "z": 0})
+
+    async def get_health(self) -> Dict[str, Any]:
+        """获取生命值和饥饿值"""
+        if self.is_fresh() and "health" not in self._dirty and self.health is not None:
+            self._count_local(1)
+            return self.health
+        observation = await self._fetch_observation()
+        self.health = observation.get("health")
+        self._dirty.discard("health")
+        return observation.get("health", {"health": 20, "food": 20})
+
+    async def view_inventory(self) -> Dict[str, Any]:
+        """查看背包（与 viewInventory 动作的返回结构一致）"""
+        if self.is_fresh() and "inventory" not in self._dirty:
+            self._count_local(1)
+            items = list(self.inventory)
+            if not items:
+                return {"success": True, "message": "Inventory is empty", "inventory": []}
+            items_text = ", ".join(f"{i.get('name')} x{i.get('count')}" for i in items)
+            return {
+                "success": True,
+                "message": f"Inventory ({len(items)} items): {items_text}",
+                "inventory": items
+            }
+        result = await self.client.execute_action("viewInventory", {})
+        if result.get("success"):
+            self.inventory = result.get("inventory") or []
+            self._dirty.discard("inventory")
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """镜像状态和节省的 Bot 服务往返统计"""
+        elapsed_min = max((time.monotonic() - self._started_at) / 60, 1 / 60)
+        age = None if self._last_sync is None else round(time.monotonic() - self._last_sync, 2)
+        return {
+            "connected": self.connected,
+            "fresh": self.is_fresh(),
+            "sync_age": age,
+            "dirty": sorted(self._dirty),
+            "resync_count": self.resync_count,
+            "local_reads": self.local_reads,
+            "round_trips_saved": dict(self.round_trips_saved),
+            "round_trips_saved_per_minute": round(sum(self.round_trips_saved.values()) / elapsed_min, 1),
+            "round_trips_per_minute": {
+                "rpc": round(self.client.rpc_request_count / elapsed_min, 1),
+                "http": round(self.client.http_request_count / elapsed_min, 1),
+            },
+        }
+
+
+# Singleton instance
+world_state = WorldState(bot_client)
@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, Any, List
 from pathlib import Path
 
 
@@ -14,9 +14,26 @@ class Settings(BaseSettings):
     # LLM Configuration
     llm_api_key: str = ""
     llm_base_url: str = "http://localhost:11434"
+    llm_endpoints: List[str] = []  # 多个 Ollama 地址（如 LLM_ENDPOINTS='["http://a:11434","http://b:11434"]'），为空时只用 llm_base_url
+    llm_timeout: float = 30.0  # 读取超时（秒）
+    llm_connect_timeout: float = 5.0  # 连接超时（秒），也是健康探测的超时
+    llm_retries: int = 2  # 请求未到达服务端（连接失败、503）时换地址重试的次数
+    llm_max_connections: int = 8  # 每个地址的连接池上限
+    llm_max_keepalive_connections: int = 4  # 每个地址保留的空闲连接数
+    llm_eject_after: int = 3  # 连续失败多少次后暂时移出该地址
+    llm_health_interval: float = 10.0  # 探测被移出地址的间隔（秒），0 表示不探测
     llm_model: str = "littlebread"
-    llm_max_tokens: int = 1024  # LLM响应最大token数
-    llm_temperature: float = 0.8  # 创造性参数 (0-1)
+    llm_max_tokens: int = 1024  # 决策调用最大生成 token 数（Ollama options.num_predict）
+    llm_temperature: float = 0.8  # 决策调用的创造性参数 (0-1)
+    llm_num_ctx: Optional[int] = None  # 上下文长度（options.num_ctx），为空时使用模型默认值
+    llm_keep_alive: Optional[str] = "30m"  # 模型在显存中保留的时间，避免空闲后重新加载
+    llm_warmup: bool = True  # 启动时预加载模型，并在空闲时发送心跳保持常驻
+    llm_warmup_timeout: float = 120.0  # 预加载请求超时（秒），自动启动 Agent 前最多等待这么久
+    llm_keepalive_interval: float = 240.0  # 空闲超过该时间（秒）时发送心跳，0 表示只预热不发心跳
+    llm_profiles: Dict[str, Dict[str, Any]] = {}  # 覆盖各类调用的生成参数，见 app/llm/profiles.py
+    llm_stream_decisions: bool = True  # 决策调用使用流式输出，JSON 闭合后立即中止生成
+    llm_structured_output: bool = True  # 决策调用通过 Ollama 的 format 参数把输出约束为动作 JSON schema
+    llm_triage_model: str = ""  # 分诊小模型（如 qwen2.5:1.5b），设置后启用两级决策，为空时只用 llm_model
     
     # Context/Memory Configuration
     max_history_length: int = 20  # 保留的对话历史条数
@@ -27,11 +44,43 @@ class Settings(BaseSettings):
     # Bot Service Configuration (Node.js mineflayer service)
     bot_service_url: str = "http://localhost:3001"
     bot_ws_url: str = "ws://localhost:3001/ws"
+    bot_ws_rpc: bool = True  # 动作/观察请求优先走 WebSocket RPC，不可用时回退到 HTTP
+    bot_rpc_timeout: float = 300.0  # WebSocket RPC 动作超时（秒），与 HTTP 读取超时一致
+    world_state_resync_interval: float = 10.0  # 世界状态镜像完整同步间隔（秒）
+    world_state_max_staleness: float = 15.0  # 距上次完整同步超过该时间（秒）后不再使用本地镜像
+    ws_subscriber_queue_size: int = 1000  # 每个 WebSocket 事件订阅者的队列上限
+    ws_overflow_policy: str = "drop_oldest"  # 队列满时的策略: drop_oldest / coalesce / block
+    ws_inbox_size: int = 10000  # block 策略订阅者等待区的事件总数上限，达到后暂停读取 WebSocket（RPC 结果也随之暂停）
     
     # Agent Configuration
-    agent_tick_rate: float = 2.0  # 空闲时的决策间隔（秒）
+    agent_tick_rate: float = 2.0  # 空闲心跳间隔（秒），聊天/受伤/任务结束会立即唤醒
+    agent_wake_debounce: float = 0.3  # 唤醒去抖窗口（秒），窗口内的多个事件合并为一次决策
     agent_task_tick_rate: float = 15.0  # 有后台任务时的决策间隔（秒），0 表示完全事件驱动
     auto_start_agent: bool = True  # 是否自动启动 Agent
+    agent_triage_answer: List[str] = ["idle", "chat"]  # 分诊模型可以直接处理的类别，其余类别交给主模型
+    agent_triage_min_confidence: float = 0.7  # 分诊置信度低于该值时交给主模型
+    max_concurrent_tasks: int = 3  # 同时运行的后台任务上限，超出的任务排队
+    task_journal_enabled: bool = True  # 是否把任务生命周期写入日志，重启后恢复未完成的技能任务
+    task_journal_path: str = "data/tasks.journal"  # 任务日志路径（相对路径相对于 backend 目录）
+    task_journal_flush_interval: float = 0.2  # 日志批量写入间隔（秒）
+    task_journal_compact_every: int = 1000  # 写入多少条事件后压缩日志
+    task_stream_history: int = 1000  # 保留多少条任务增量供断线重连补发
+    task_stream_client_buffer: int = 256  # 每个推送客户端的缓冲上限，超出时改发完整快照
+    
+    # Script Configuration
+    script_cache_size: int = 128  # 脚本编译缓存条数（LRU），0 表示不缓存
+    script_isolation: str = "inprocess"  # inprocess: 在后端进程中执行; process: 在独立的 worker 进程中执行
+    script_workers: int = 4  # 同时运行脚本的 worker 进程上限
+    script_warm_workers: int = 2  # 预先启动的 worker 数量
+    script_worker_max_jobs: int = 100  # 每个 worker 执行多少个脚本后重启
+    script_cpu_limit: Optional[float] = 60.0  # 单个脚本的 CPU 时间上限（秒，仅 Linux/macOS）
+    script_memory_limit_mb: Optional[int] = 1024  # worker 进程的内存上限（MB，仅 Linux/macOS）
+    
+    # Debug Configuration
+    loop_watchdog_enabled: bool = True  # 是否启用事件循环阻塞检测
+    loop_watchdog_interval: float = 0.05  # 心跳间隔（秒）
+    loop_stall_threshold: float = 0.1  # 事件循环延迟超过该值（秒）视为阻塞，记录调用栈
+    agent_trace_path: Optional[str] = None  # 启动时开始录制 Agent 运行（python -m app.debug.replay 回放），.gz 结尾时压缩
     
     # Server Configuration
     host: str = "0.0.0.0"
@@ -0,0 +1,9 @@
+from .metrics import MetricsRegistry, Counter, Histogram, metrics
+from .trace import TraceRecorder, trace_recorder
+from .watchdog import LoopWatchdog, loop_watchdog
+
+__all__ = [
+    "MetricsRegistry", "Counter", "Histogram", "metrics",
+    "TraceRecorder", "trace_recorder",
+    "LoopWatchdog", "loop_watchdog",
+]
\ No newline at end of file
@@ -0,0 +1,355 @@
+"""
+Agent Trace Replayer for LLM-MC
+
+Replays a trace written by TraceRecorder without a Minecraft server or an
+LLM. The real Agent, ScriptExecutor and skills run; bot_client, world_state
+and llm_client are patched to answer from the recording:
+
+- each recorded tick feeds its observation, pending chat and wake reasons
+  into Agent.tick()
+- the LLM returns the decision recorded for that tick, immediately
+  ("recorded") or after the recorded / a fixed latency ("simulated")
+- bot requests are answered from per-(method, action) queues in recorded
+  order, so a change that adds or removes round trips still replays
+
+The report has ticks/s, per-phase latency (from the metrics registry) and
+bot round-trip counts, and can be compared against a baseline report.
+
+用法（在 backend 目录下）:
+    python -m app.debug.replay trace.jsonl [--llm recorded|simulated] [--llm-latency 秒]
+                               [--report out.json] [--baseline base.json] [--verbose]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import time
+from collections import deque, Counter as TallyCounter
+from typing import Dict, Any, Optional, List, Tuple
+
+from app.agent.agent import Agent, TICK_PHASES
+from app.bot.client import bot_client
+from app.bot.world_state import world_state
+from app.config import settings
+from app.debug.metrics import metrics
+from app.debug.trace import read_trace, bot_call_key, RECORDED_METHODS
+from app.llm.client import llm_client
+from app.llm.schema import decode_json_object
+from app.script.executor import script_executor
+from app.task.manager import task_manager
+
+
+class LoadedTrace:
+    """读入内存的 trace"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.prompts: Dict[str, str] = {}
+        self.ticks: List[Dict[str, Any]] = []
+        self.bot_calls: List[Dict[str, Any]] = []
+        for record in read_trace(path):
+            kind = record.get("t")
+            if kind == "tick":
+                self.ticks.append(record)
+            elif kind == "bot":
+                self.bot_calls.append(record)
+            elif kind == "prompt":
+                self.prompts[record["id"]] = record["text"]
+
+    def recorded_phases(self) -> Dict[str, Dict[str, float]]:
+        """录制时各阶段的平均耗时（毫秒）"""
+        totals: Dict[str, List[float]] = {}
+        for tick in self.ticks:
+            for name, elapsed in tick.get("phases", {}).items():
+                totals.setdefault(name, []).append(elapsed)
+        return {
+            name: {"count": len(values), "avg_ms": round(sum(values) / len(values) * 1000, 3)}
+            for name, values in totals.items()
+        }
+
+
+class RecordedBot:
+    """按录制顺序回答 Bot 请求"""
+
+    def __init__(self, calls: List[Dict[str, Any]]):
+        self._queues: Dict[Tuple[str, Optional[str]], deque] = {}
+        self._last: Dict[Tuple[str, Optional[str]], Any] = {}
+        for call in calls:
+            self._queues.setdefault((call["m"], call["a"]), deque()).append(call)
+        self.recorded_calls = len(calls)
+        self.calls = 0
+        self.by_action: TallyCounter = TallyCounter()
+        self.param_mismatches = 0
+        self.exhausted = 0
+        self.missing = 0
+        self.fallback_observation: Dict[str, Any] = {}
+
+    def respond(self, method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        key = bot_call_key(method, args, kwargs)
+        slot = (key["m"], key["a"])
+        self.calls += 1
+        self.by_action[key["a"] or method] += 1
+
+        queue = self._queues.get(slot)
+        if queue:
+            call = queue.popleft()
+            if call["p"] != key["p"]:
+                self.param_mismatches += 1
+            self._last[slot] = call["r"]
+            return json.loads(json.dumps(call["r"]))
+        if slot in self._last:
+            # 录制中的结果已经用完，重复最后一个
+            self.exhausted += 1
+            return json.loads(json.dumps(self._last[slot]))
+
+        self.missing += 1
+        if method == "execute_action":
+            return {"success": True, "message": "replay: 没有录制结果"}
+        if method == "get_status":
+            return {"connected": True}
+        if method == "get_observation":
+            return dict(self.fallback_observation)
+        return None
+
+    def method(self, name: str):
+        async def replayed(*args, **kwargs):
+            return self.respond(name, args, kwargs)
+        return replayed
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "recorded_calls": self.recorded_calls,
+            "param_mismatches": self.param_mismatches,
+            "exhausted": self.exhausted,
+            "missing": self.missing,
+            "by_action": dict(self.by_action.most_common()),
+        }
+
+
+class TraceReplayer:
+    """
+    驱动 Agent 回放一个 trace
+
+    Args:
+        trace: 已读入的 trace
+        llm_mode: recorded（立即返回录制的决策）/ simulated（按延迟等待后返回）
+        llm_latency: simulated 模式的固定延迟（秒），为空时使用录制的耗时
+        drain_timeout: 回放结束后等待后台任务完成的最长时间（秒）
+    """
+
+    def __init__(self, trace: LoadedTrace, llm_mode: str = "recorded", llm_latency: Optional[float] = None,
+                 drain_timeout: float = 30.0):
+        self.trace = trace
+        self.llm_mode = llm_mode
+        self.llm_latency = llm_latency
+        self.drain_timeout = drain_timeout
+        self.bot = RecordedBot(trace.bot_calls)
+        self._tick: Optional[Dict[str, Any]] = None
+        self.llm_calls = 0
+        self.llm_unrecorded = 0
+
+    # ========== 替身 ==========
+
+    async def _observation(self) -> Dict[str, Any]:
+        observation = json.loads(json.dumps(self._tick["obs"]))
+        if not self._tick.get("local", True):
+            # 录制时这次观察是完整同步（/status + /observation）
+            self.bot.respond("get_status", (), {})
+            self.bot.respond("get_observation", (), {})
+        # 和 resync 一样用本次观察刷新本地镜像，tick 中的位置/生命值/背包查询由镜像回答
+        world_state._apply_observation(observation)
+        world_state._dirty.clear()
+        # 观察中的聊天和事件已经交给 Agent
+        world_state._events, world_state._chat = [], []
+        return observation
+
+    def _is_fresh(self, max_age: Optional[float] = None) -> bool:
+        """录制时镜像是否可用（旧 trace 没有记录，按可用处理）"""
+        return bool(self._tick and self._tick.get("fresh", True))
+
+    async def _execute_action(self, *args, **kwargs) -> Any:
+        result = self.bot.respond("execute_action", args, kwargs)
+        # 与 BotClient.execute_action 一样通知镜像，动作影响的字段之后重新读取
+        world_state._on_action(args[0] if args else kwargs.get("action"), result)
+        return result
+
+    async def _chat_json(self, system_prompt: str, user_message: str, schema=None) -> Dict[str, Any]:
+        self.llm_calls += 1
+        recorded = (self._tick or {}).get("llm")
+        if recorded is None:
+            self.llm_unrecorded += 1
+            llm_client.last_stats = {}
+            llm_client.last_response = None
+            return {"thought": "replay: 没有录制决策", "action": "wait", "parameters": {}}
+
+        if self.llm_mode == "simulated":
+            latency = self.llm_latency
+            if latency is None:
+                latency = recorded.get("stats", {}).get("time_to_action") or recorded.get("stats", {}).get("total_time") or 0
+            await asyncio.sleep(latency)
+
+        llm_client.last_stats = dict(recorded.get("stats") or {})
+        llm_client.last_response = recorded.get("raw")
+        decision = recorded.get("decision")
+        if decision is None and recorded.get("raw") is not None:
+            decision, _ = decode_json_object(recorded["raw"])
+        decision = json.loads(json.dumps(decision))
+        if schema is not None:
+            decision = schema.validate(decision)
+        return decision
+
+    @contextlib.contextmanager
+    def _patched(self):
+        """把 bot_client / world_state / llm_client 换成回放替身，结束后还原"""
+        saved_connected = world_state.connected
+        # 录制的是最终决策（不论由哪一层产生），回放时不再经过分诊
+        saved_triage_model = settings.llm_triage_model
+        settings.llm_triage_model = ""
+        for name in RECORDED_METHODS:
+            setattr(bot_client, name, self.bot.method(name))
+        bot_client.execute_action = self._execute_action
+        world_state.get_observation = self._observation
+        world_state.is_fresh = self._is_fresh
+        world_state.connected = True
+        llm_client.chat_json = self._chat_json
+        try:
+            yield
+        finally:
+            for name in RECORDED_METHODS:
+                bot_client.__dict__.pop(name, None)
+            world_state.__dict__.pop("get_observation", None)
+            world_state.__dict__.pop("is_fresh", None)
+            world_state.connected = saved_connected
+            settings.llm_triage_model = saved_triage_model
+            llm_client.__dict__.pop("chat_json", None)
+
+    # ========== 回放 ==========
+
+    async def run(self) -> Dict[str, Any]:
+        metrics.reset()
+        agent = Agent()
+        agent.is_running = True
+        await script_executor.start()
+
+        with self._patched():
+            start = time.perf_counter()
+            for record in self.trace.ticks:
+                self._tick = record
+                self.bot.fallback_observation = record["obs"]
+                agent._pending_chat = list(record.get("chat") or [])
+                agent._wake_reasons = set(record.get("wake") or [])
+                # 录制时观察中的聊天和事件在 tick 开始前就在镜像里，心跳 tick 据此决定是否跳过
+                world_state._events = list(record["obs"].get("events") or [])
+                world_state._chat = list(record["obs"].get("chatMessages") or [])
+                await agent.tick()
+                # 让后台任务在 tick 之间推进
+                await asyncio.sleep(0)
+            ticks_elapsed = time.perf_counter() - start
+
+            drained = await self._drain()
+            elapsed = time.perf_counter() - start
+
+        await script_executor.close()
+        return self._report(ticks_elapsed, elapsed, drained)
+
+    async def _drain(self) -> bool:
+        """等待回放中启动的后台任务结束"""
+        deadline = time.monotonic() + self.drain_timeout
+        while task_manager.has_active_tasks and time.monotonic() < deadline:
+            await asyncio.sleep(0.01)
+        drained = not task_manager.has_active_tasks
+        if not drained:
+            await task_manager.cancel_all_tasks()
+        return drained
+
+    def _report(self, ticks_elapsed: float, elapsed: float, drained: bool) -> Dict[str, Any]:
+        phases = metrics.get("agent_phase_seconds").snapshot()
+        ticks = len(self.trace.ticks)
+        return {
+            "trace": self.trace.path,
+            "llm_mode": self.llm_mode,
+            "ticks": ticks,
+            "tick_time": round(ticks_elapsed, 4),
+            "total_time": round(elapsed, 4),
+            "ticks_per_second": round(ticks / ticks_elapsed, 1) if ticks_elapsed > 0 else None,
+            "tasks_drained": drained,
+            "outcomes": metrics.get("agent_ticks_total").snapshot(),
+            "phases": {
+                name: {
+                    "count": phases.get(name, {}).get("count", 0),
+                    "avg_ms": round((phases.get(name, {}).get("avg") or 0) * 1000, 3),
+                }
+                for name in TICK_PHASES
+            },
+            "recorded_phases": self.trace.recorded_phases(),
+            "llm": {"calls": self.llm_calls, "unrecorded": self.llm_unrecorded},
+            "bot": self.bot.get_stats(),
+        }
+
+
+def _delta(current: Optional[float], baseline: Optional[float]) -> str:
+    if not current or not baseline:
+        return ""
+    return f"({(current - baseline) / baseline:+.1%})"
+
+
+def print_report(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """打印回放结果，提供 baseline 时附带变化百分比"""
+    base = baseline or {}
+    print(f"trace: {report['trace']} ({report['ticks']} ticks, LLM {report['llm_mode']})")
+    print(f"ticks/s:      {report['ticks_per_second']} {_delta(report['ticks_per_second'], base.get('ticks_per_second'))}")
+    print(f"tick 耗时:     {report['tick_time'] * 1000:.1f} ms，含后台任务 {report['total_time'] * 1000:.1f} ms"
+          + ("" if report["tasks_drained"] else "（后台任务超时未完成）"))
+    print(f"tick 结果:     {report['outcomes']}")
+    print("阶段平均耗时 (ms):")
+    for name, stats in report["phases"].items():
+        recorded = report["recorded_phases"].get(name, {}).get("avg_ms")
+        base_avg = base.get("phases", {}).get(name, {}).get("avg_ms")
+        print(f"  {name:<9} {stats['avg_ms']:>9.3f} x{stats['count']:<5}"
+              f" {_delta(stats['avg_ms'], base_avg):<10}"
+              f" 录制时 {recorded if recorded is not None else '-'}")
+    bot = report["bot"]
+    base_calls = base.get("bot", {}).get("calls")
+    print(f"Bot 往返:      {bot['calls']} {_delta(bot['calls'], base_calls)}（录制 {bot['recorded_calls']}，"
+          f"参数不同 {bot['param_mismatches']}，超出录制 {bot['exhausted']}，无录制 {bot['missing']}）")
+    top = ", ".join(f"{name} {count}" for name, count in list(bot["by_action"].items())[:8])
+    print(f"  {top}")
+    print(f"LLM 调用:      {report['llm']['calls']}（无录制决策 {report['llm']['unrecorded']}）")
+
+
+async def replay(path: str, llm_mode: str = "recorded", llm_latency: Optional[float] = None,
+                 verbose: bool = False) -> Dict[str, Any]:
+    """读入 trace 并回放，返回报告"""
+    replayer = TraceReplayer(LoadedTrace(path), llm_mode=llm_mode, llm_latency=llm_latency)
+    if verbose:
+        return await replayer.run()
+    with contextlib.redirect_stdout(io.StringIO()):
+        return await replayer.run()
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="回放 Agent trace 并输出性能报告")
+    parser.add_argument("trace", help="TraceRecorder 写入的 trace 文件")
+    parser.add_argument("--llm", choices=("recorded", "simulated"), default="recorded",
+                        help="recorded: 立即返回录制的决策; simulated: 按录制的（或 --llm-latency）延迟返回")
+    parser.add_argument("--llm-latency", type=float, default=None, help="simulated 模式的固定延迟（秒）")
+    parser.add_argument("--report", help="把报告写入 JSON 文件，可作为之后的 --baseline")
+    parser.add_argument("--baseline", help="与之前保存的报告对比")
+    parser.add_argument("--verbose", action="store_true", help="显示 Agent 和脚本的输出")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(replay(args.trace, args.llm, args.llm_latency, args.verbose))
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
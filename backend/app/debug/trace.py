@@ -0,0 +1,208 @@
+"""
+Agent Trace Recorder for LLM-MC
+
+Records what the agent saw and did so a run can be replayed offline
+(python -m app.debug.replay). The trace is an append-only JSON-lines file
+(gzip when the path ends with .gz) with these record types:
+
+    {"t": "start", "v": ..., "ts": ...}            one per recording session
+    {"t": "prompt", "id": ..., "text": ...}        system prompt, written once per distinct text
+    {"t": "tick", "n": ..., "wake": [...], "obs": ..., "local": ..., "fresh": ..., "chat": [...],
+     "sp": ..., "um": ..., "llm": {"raw", "decision", "stats"}, "result": ..., "phases": {...}, "outcome": ...}
+    {"t": "bot", "n": ..., "m": ..., "a": ..., "p": ..., "r": ..., "ms": ...}
+
+Bot records cover every request the backend sent to the bot service
+(status, observation, actions, batches, waited events), including the ones
+made by scripts and background skills; `n` is the tick that was current
+when the request was made. Reads served by the local world-state mirror
+make no request; `local` (the observation came from the mirror) and
+`fresh` (the mirror could serve reads during the tick) let the replay
+serve the same reads locally.
+"""
+import gzip
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterator, TextIO
+
+from app.bot.client import bot_client
+from app.bot.world_state import world_state
+
+
+TRACE_VERSION = 1
+
+# 被录制的 BotClient 方法
+RECORDED_METHODS = ("get_status", "get_observation", "execute_action", "wait_for_event")
+
+# 通过 HTTP 接口开始录制时 trace 文件所在的目录
+TRACE_DIR = Path(__file__).resolve().parent.parent.parent / "data"
+
+
+def resolve_trace_path(path: str) -> str:
+    """相对路径相对于 backend 目录"""
+    resolved = Path(path)
+    if not resolved.is_absolute():
+        resolved = Path(__file__).resolve().parent.parent.parent / resolved
+    return str(resolved)
+
+
+def resolve_trace_name(name: str) -> str:
+    """
+    HTTP 接口使用的 trace 路径：只接受文件名，文件放在 backend/data 下
+
+    Raises:
+        ValueError: 包含目录部分（绝对路径、..、子目录）
+    """
+    if not name or name in (".", "..") or any(sep in name for sep in ("/", "\\", ":", "\0")):
+        raise ValueError(f"trace 文件名不合法: {name!r}（只能是 {TRACE_DIR} 下的文件名）")
+    return str(TRACE_DIR / name)
+
+
+def open_trace(path: str, mode: str) -> TextIO:
+    """打开 trace 文件，.gz 结尾时使用 gzip"""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """逐条读取 trace 记录（跳过写了一半的最后一行）"""
+    with open_trace(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def bot_call_key(method: str, args: tuple, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    """把一次 BotClient 调用归一化为 {m, a, p}，录制和回放使用同一规则"""
+    if method == "execute_action":
+        action = args[0] if args else kwargs.get("action")
+        params = args[1] if len(args) > 1 else kwargs.get("parameters")
+        return {"m": method, "a": action, "p": params or {}}
+    if method == "wait_for_event":
+        event_type = args[0] if args else kwargs.get("event_type")
+        return {"m": method, "a": event_type, "p": kwargs.get("match") or {}}
+    return {"m": method, "a": None, "p": {}}
+
+
+class TraceRecorder:
+    """
+    Agent 运行录制
+
+    - start() 打开文件并包装 bot_client 的请求方法
+    - Agent 在每个 tick 调用 begin_tick() / end_tick()
+    - stop() 还原 bot_client 并关闭文件
+    """
+
+    def __init__(self):
+        self.path: Optional[str] = None
+        self._file: Optional[TextIO] = None
+        self._originals: Dict[str, Any] = {}
+        self._prompts: set = set()
+        self.tick_no = 0
+        self.ticks = 0
+        self.bot_calls = 0
+        self.started_at: Optional[float] = None
+
+    @property
+    def active(self) -> bool:
+        return self._file is not None
+
+    def start(self, path: str):
+        """开始录制（追加到 path）"""
+        if self.active:
+            self.stop()
+        path = resolve_trace_path(path)
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._file = open_trace(path, "a")
+        self._prompts.clear()
+        self.tick_no = 0
+        self.ticks = 0
+        self.bot_calls = 0
+        self.started_at = time.time()
+        self._write({"t": "start", "v": TRACE_VERSION, "ts": round(self.started_at, 3)})
+        for name in RECORDED_METHODS:
+            original = getattr(bot_client, name)
+            self._originals[name] = original
+            setattr(bot_client, name, self._wrap(name, original))
+        print(f"[TraceRecorder] 开始录制: {path}")
+
+    def stop(self):
+        """停止录制"""
+        if not self.active:
+            return
+        for name, original in self._originals.items():
+            setattr(bot_client, name, original)
+        self._originals.clear()
+        self._file.close()
+        self._file = None
+        print(f"[TraceRecorder] 录制结束: {self.ticks} 个 tick, {self.bot_calls} 次 Bot 请求")
+
+    def _write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n")
+
+    def _wrap(self, name: str, original):
+        async def recorded(*args, **kwargs):
+            start = time.perf_counter()
+            result = await original(*args, **kwargs)
+            if self.active:
+                record = {"t": "bot", "n": self.tick_no, **bot_call_key(name, args, kwargs), "r": result,
+                          "ms": round((time.perf_counter() - start) * 1000, 2)}
+                self._write(record)
+                self.bot_calls += 1
+            return result
+        return recorded
+
+    # ========== tick ==========
+
+    def prompt_id(self, text: str) -> str:
+        """系统提示词只在第一次出现时写入全文，tick 中引用它的 id"""
+        prompt_id = hashlib.sha1(text.encode("utf-8")).hexdigest()[:12]
+        if prompt_id not in self._prompts:
+            self._prompts.add(prompt_id)
+            self._write({"t": "prompt", "id": prompt_id, "text": text})
+        return prompt_id
+
+    def begin_tick(self, wake: List[str], observation: Dict[str, Any], chat: List[Any]) -> Dict[str, Any]:
+        """开始一个 tick 记录；observation 在 Agent 修改之前复制"""
+        self.tick_no += 1
+        return {
+            "t": "tick",
+            "n": self.tick_no,
+            "ts": round(time.time(), 3),
+            "wake": sorted(wake),
+            "obs": json.loads(json.dumps(observation, default=str)),
+            "local": world_state.last_observation_local,
+            "fresh": world_state.is_fresh(),
+            "chat": list(chat),
+            "phases": {},
+        }
+
+    def end_tick(self, record: Dict[str, Any], outcome: str):
+        """写入 tick 记录并刷新文件"""
+        if not self.active:
+            return
+        record["outcome"] = outcome
+        self._write(record)
+        self._file.flush()
+        self.ticks += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "active": self.active,
+            "path": self.path,
+            "ticks": self.ticks,
+            "bot_calls": self.bot_calls,
+            "started_at": self.started_at,
+        }
+
+
+# 全局录制实例
+trace_recorder = TraceRecorder()
@@ -0,0 +1,247 @@
+"""
+Event Loop Watchdog for LLM-MC
+
+A heartbeat coroutine wakes up every `interval` seconds and records how late
+it woke up (loop lag). A monitor thread watches the heartbeat; when the loop
+has not come back for longer than `threshold`, it grabs the loop thread's
+stack with sys._current_frames() while the blocking call is still running,
+and attributes it to the current asyncio task, the TaskManager task and the
+skill/script frame on the stack.
+"""
+import asyncio
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+from app.task.manager import task_manager
+
+
+# 延迟直方图的桶上限（毫秒），最后一个桶是 +inf
+LAG_BUCKETS_MS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000]
+
+# 标准库和第三方库的路径前缀，归因时跳过这些帧
+_LIBRARY_PREFIXES = tuple({sys.prefix, sys.base_prefix})
+
+
+def _attribute_frames(frames: List[traceback.FrameSummary]) -> Dict[str, Optional[str]]:
+    """从调用栈中找出技能 / 脚本帧和最内层的项目代码位置"""
+    skill = None
+    script = False
+    location = None
+    for frame in frames:
+        if frame.filename.startswith("<skill:"):
+            skill = frame.filename[len("<skill:"):-1]
+        elif frame.filename == "<script>":
+            script = True
+        if not frame.filename.startswith(_LIBRARY_PREFIXES):
+            location = f"{frame.filename}:{frame.lineno} in {frame.name}"
+    return {"skill": skill, "script": script, "location": location}
+
+
+class LoopWatchdog:
+    """
+    事件循环阻塞检测
+
+    - 持续测量事件循环延迟，维护直方图
+    - 延迟超过阈值时，在阻塞期间抓取事件循环线程的调用栈
+    - 把阻塞归因到 asyncio 任务、TaskManager 任务和技能名称
+    """
+
+    def __init__(self, interval: float = 0.05, threshold: float = 0.1, max_offenders: int = 50):
+        self.interval = interval
+        self.threshold = threshold
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._monitor_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._last_beat = time.monotonic()
+        # 监视线程抓到、心跳尚未确认结束的阻塞
+        self._pending_stall: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+
+        self.started_at: Optional[float] = None
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.offenders: deque = deque(maxlen=max_offenders)
+        # 按归因汇总：key -> {count, total_ms, max_ms}
+        self._by_source: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return self._heartbeat_task is not None and not self._heartbeat_task.done()
+
+    async def start(self):
+        """在当前事件循环上启动 watchdog"""
+        if self.is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self.started_at = time.time()
+        self._heartbeat_task = asyncio.create_task(self._heartbeat(), name="loop-watchdog")
+        self._monitor_thread = threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True)
+        self._monitor_thread.start()
+        print(f"[LoopWatchdog] 已启动 (间隔 {self.interval * 1000:.0f}ms, 阈值 {self.threshold * 1000:.0f}ms)")
+
+    async def stop(self):
+        """停止 watchdog"""
+        self._stop.set()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+            try:
+                await self._heartbeat_task
+            except asyncio.CancelledError:
+                pass
+            self._heartbeat_task = None
+        if self._monitor_thread:
+            self._monitor_thread.join(timeout=1.0)
+            self._monitor_thread = None
+
+    # ========== 测量 ==========
+
+    async def _heartbeat(self):
+        while True:
+            expected = time.monotonic() + self.interval
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            self._last_beat = now
+            self._record(max(0.0, now - expected))
+
+    def _record(self, lag: float):
+        lag_ms = lag * 1000
+        self.samples += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+        for i, bound in enumerate(LAG_BUCKETS_MS):
+            if lag_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+        with self._lock:
+            stall = self._pending_stall
+            self._pending_stall = None
+        if lag < self.threshold:
+            return
+
+        if stall is None:
+            # 阻塞时间接近阈值，监视线程没来得及抓栈
+            stall = {"time": time.time() - lag, "stack": [], "async_task": None,
+                     "task_id": None, "task_name": None, "skill": None, "script": False, "location": None}
+        stall["lag_ms"] = round(lag_ms, 1)
+        self.stalls += 1
+        self.stall_time += lag
+        self.offenders.append(stall)
+
+        source = self._source_key(stall)
+        entry = self._by_source.setdefault(source, {"source": source, "count": 0, "total_ms": 0.0, "max_ms": 0.0})
+        entry["count"] += 1
+        entry["total_ms"] = round(entry["total_ms"] + lag_ms, 1)
+        entry["max_ms"] = max(entry["max_ms"], round(lag_ms, 1))
+
+        print(f"[LoopWatchdog] 事件循环阻塞 {lag_ms:.0f}ms: {source}"
+              + (f" @ {stall['location']}" if stall.get("location") else ""))
+
+    @staticmethod
+    def _source_key(stall: Dict[str, Any]) -> str:
+        if stall.get("skill"):
+            return f"skill:{stall['skill']}"
+        if stall.get("script"):
+            return f"script:{stall.get('task_name') or stall.get('async_task') or 'unknown'}"
+        if stall.get("task_name"):
+            return f"task:{stall['task_name']}"
+        if stall.get("location"):
+            return stall["location"]
+        return stall.get("async_task") or "unknown"
+
+    # ========== 监视线程 ==========
+
+    def _monitor(self):
+        captured_for = None  # 已经抓过栈的心跳时间，同一次阻塞只抓一次
+        poll = min(self.interval, self.threshold) / 2
+        while not self._stop.wait(poll):
+            beat = self._last_beat
+            if time.monotonic() - beat - self.interval < self.threshold or captured_for == beat:
+                continue
+            captured_for = beat
+            stall = self._capture()
+            if stall is not None:
+                with self._lock:
+                    self._pending_stall = stall
+
+    def _capture(self) -> Optional[Dict[str, Any]]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        frames = traceback.extract_stack(frame)
+        attribution = _attribute_frames(frames)
+
+        async_task = None
+        try:
+            async_task = asyncio.current_task(self._loop)
+        except Exception:
+            pass
+        task = None
+        if async_task is not None:
+            task = task_manager.find_by_async_task(async_task)
+
+        return {
+            "time": time.time(),
+            "stack": [f"{f.filename}:{f.lineno} in {f.name}" for f in frames[-15:]],
+            "async_task": async_task.get_name() if async_task is not None else None,
+            "task_id": task.id if task else None,
+            "task_name": task.name if task else None,
+            **attribution,
+        }
+
+    # ========== 统计 ==========
+
+    def get_stats(self, offenders: int = 10) -> Dict[str, Any]:
+        """延迟直方图、阻塞次数和最近的阻塞来源"""
+        histogram = {f"<={bound}ms": count for bound, count in zip(LAG_BUCKETS_MS, self.buckets)}
+        histogram[f">{LAG_BUCKETS_MS[-1]}ms"] = self.buckets[-1]
+        top = sorted(self._by_source.values(), key=lambda e: e["total_ms"], reverse=True)
+        return {
+            "running": self.is_running,
+            "interval_ms": self.interval * 1000,
+            "threshold_ms": self.threshold * 1000,
+            "uptime": round(time.time() - self.started_at, 1) if self.started_at else None,
+            "samples": self.samples,
+            "avg_lag_ms": round(self.total_lag / self.samples * 1000, 2) if self.samples else None,
+            "max_lag_ms": round(self.max_lag * 1000, 1),
+            "histogram": histogram,
+            "stalls": self.stalls,
+            "stall_time_ms": round(self.stall_time * 1000, 1),
+            "top_sources": top[:10],
+            "recent_offenders": list(self.offenders)[-offenders:][::-1],
+        }
+
+    def reset(self):
+        """清空统计"""
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.buckets = [0] * (len(LAG_BUCKETS_MS) + 1)
+        self.stalls = 0
+        self.stall_time = 0.0
+        self.offenders.clear()
+        self._by_source.clear()
+
+
+# 全局 watchdog 实例
+loop_watchdog = LoopWatchdog(
+    interval=settings.loop_watchdog_interval,
+    threshold=settings.loop_stall_threshold
+)
@@ -1,4 +1,13 @@
 from .client import LLMClient, llm_client
+from .profiles import GenerationProfile, get_profile
+from .router import LLMRouter
 from .prompts import get_agent_system_prompt, format_observation
+from .schema import DecisionSchema, DecisionError, TriageSchema, decision_schema, triage_schema
 
-__all__ = ["LLMClient", "llm_client", "get_agent_system_prompt", "format_observation"]
\ No newline at end of file
+__all__ = [
+    "LLMClient", "llm_client",
+    "GenerationProfile", "get_profile",
+    "LLMRouter",
+    "get_agent_system_prompt", "format_observation",
+    "DecisionSchema", "DecisionError", "TriageSchema", "decision_schema", "triage_schema",
+]
\ No newline at end of file
@@ -1,9 +1,73 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple, Union
+import asyncio
 import json
-import re
-import httpx
+import time
 
 from app.config import settings
+from app.debug.metrics import metrics, TOKEN_BUCKETS
+from app.llm.json_stream import JsonObjectStream
+from app.llm.profiles import get_profile
+from app.llm.router import LLMRouter
+from app.llm.schema import DecisionSchema, DecisionError, TriageSchema, decode_json_object
+
+
+# LLM 调用指标（/api/metrics），按生成配置（decision / chat / summary / skill）区分
+_request_seconds = metrics.histogram("llm_request_seconds", "LLM request latency", ("profile", "mode"))
+_request_errors = metrics.counter("llm_request_errors_total", "Failed LLM requests", ("profile", "mode"))
+_prompt_tokens = metrics.histogram(
+    "llm_prompt_tokens", "Prompt tokens evaluated per request", ("profile",), buckets=TOKEN_BUCKETS
+)
+_completion_tokens = metrics.histogram(
+    "llm_completion_tokens", "Completion tokens generated per request (streamed chunks when aborted early)",
+    ("profile",), buckets=TOKEN_BUCKETS
+)
+_tokens_per_second = metrics.histogram(
+    "llm_generation_tokens_per_second", "Generation speed reported by the server", ("profile",),
+    buckets=(1, 2, 5, 10, 20, 30, 50, 75, 100, 150, 200, 300)
+)
+_truncated = metrics.counter(
+    "llm_truncated_total", "Responses cut off by the profile's num_predict limit", ("profile",)
+)
+_first_token_seconds = metrics.histogram(
+    "llm_first_token_seconds", "Time to first token with the model cold (loading) or warm (resident)", ("state",)
+)
+
+_json_parse = metrics.counter(
+    "llm_json_parse_total",
+    "Decision parse outcomes (stream / direct / extracted / failed / invalid) by output format (schema / free)",
+    ("result", "format", "profile")
+)
+_json_parse_seconds = metrics.histogram("llm_json_parse_seconds", "Time spent decoding and validating the decision")
+_wasted_seconds = metrics.counter(
+    "llm_wasted_seconds_total", "LLM time spent on decisions that failed to parse or validate", ("format", "profile")
+)
+
+
+# 服务端报告的 load_duration 超过该值（秒）视为冷启动（模型需要加载）
+COLD_LOAD_THRESHOLD = 0.5
+
+
+def parse_keep_alive(value: Optional[str]) -> Optional[float]:
+    """
+    把 Ollama 的 keep_alive（"30m" / "1h" / "300" / "-1"）转换为秒
+
+    Returns:
+        秒数，负数表示一直保留；未设置时按服务端默认的 5 分钟计算，无法解析时返回 None
+    """
+    if value is None:
+        return 300.0
+    text = str(value).strip().lower()
+    units = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+    for suffix in ("ms", "s", "m", "h"):
+        if text.endswith(suffix):
+            try:
+                return float(text[:-len(suffix)]) * units[suffix]
+            except ValueError:
+                return None
+    try:
+        return float(text)
+    except ValueError:
+        return None
 
 
 class LLMClient:
@@ -11,110 +75,465 @@ class LLMClient:
 
     This keeps the same public interface as the previous OpenAI client
     (`chat`, `chat_json`, `clear_history`, `get_history_length`).
+
+    Requests go through `/api/chat` with the system prompt as the first
+    message, so Ollama can reuse the KV cache of the unchanged system prefix
+    across ticks. Volatile state belongs in the user message.
+
+    With several servers in `llm_endpoints`, requests are spread over them
+    by LLMRouter (app/llm/router.py).
     """
 
     def __init__(self):
-        self.http = httpx.AsyncClient(base_url=settings.llm_base_url, timeout=30.0)
+        self.router = LLMRouter(settings.llm_endpoints or [settings.llm_base_url], retries=settings.llm_retries)
         self.model = settings.llm_model
         self.conversation_history: List[Dict[str, str]] = []
+        # 最近一次调用的耗时与 prompt 评估统计
+        self.last_stats: Dict[str, Any] = {}
+        # 最近一次 chat_json 收到的原始文本（流式提前中止时是截至动作就绪的部分）
+        self.last_response: Optional[str] = None
+
+        # 模型预热与常驻
+        self.ready = False  # 模型已加载到显存
+        self.warmups = 0
+        self.warmup_errors = 0
+        self.last_warmup_time: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._last_used: Optional[float] = None  # 最近一次成功请求的时间（monotonic）
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._ready_event = asyncio.Event()
+
+    @staticmethod
+    def _extract_content(data: Any) -> Optional[str]:
+        """Pull the assistant text out of a response body."""
+        if not isinstance(data, dict):
+            return None
+        # Ollama /api/chat
+        message = data.get("message")
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            return message["content"]
+        # Ollama /api/generate
+        if isinstance(data.get("response"), str):
+            return data["response"]
+        # Try several other response shapes for compatibility
+        if "generated" in data:
+            gen = data.get("generated")
+            if isinstance(gen, list) and gen:
+                first = gen[0]
+                if isinstance(first, dict):
+                    return first.get("content") or first.get("text") or json.dumps(first)
+                if isinstance(first, str):
+                    return first
+        if "choices" in data:
+            choices = data.get("choices")
+            if isinstance(choices, list) and choices:
+                c = choices[0]
+                if isinstance(c, dict):
+                    # Chat-like
+                    msg = c.get("message") or c.get("content") or c.get("text")
+                    if isinstance(msg, dict):
+                        return msg.get("content") or msg.get("text") or json.dumps(msg)
+                    if isinstance(msg, str):
+                        return msg
+        # Common fields
+        for key in ("content", "text", "output"):
+            val = data.get(key)
+            if isinstance(val, str):
+                return val
+        return None
 
-    async def _call_ollama(self, prompt: str) -> str:
-        endpoint = "/api/generate"
-        payload = {
+    @staticmethod
+    def _eval_stats(data: Dict[str, Any]) -> Dict[str, Any]:
+        """Prompt/generation counters from Ollama's final response (durations in seconds)."""
+        stats = {}
+        for key in ("prompt_eval_count", "eval_count"):
+            if key in data:
+                stats[key] = data[key]
+        for key in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+            if key in data:
+                stats[key] = round(data[key] / 1e9, 3)
+        if "done_reason" in data:
+            stats["done_reason"] = data["done_reason"]
+        return stats
+
+    async def _call_ollama(
+        self,
+        messages: List[Dict[str, str]],
+        format: Optional[Dict[str, Any]] = None,
+        profile: str = "decision",
+    ) -> str:
+        endpoint = "/api/chat"
+        payload = get_profile(profile).apply({
             "model": self.model,
-            "prompt": prompt,
-            "temperature": settings.llm_temperature,
-            "max_tokens": settings.llm_max_tokens,
+            "messages": messages,
             "stream": False
-        }
+        })
+        if format is not None:
+            payload["format"] = format
 
+        cold = self._expect_cold()
         try:
-            resp = await self.http.post(endpoint, json=payload)
+            start = time.perf_counter()
+            resp = await self.router.post(endpoint, json=payload)
             resp.raise_for_status()
             # print("LLM Response:", resp.text)
             data = resp.json()
-            # Try several possible response shapes for compatibility
-            if isinstance(data, dict):
-                if "generated" in data:
-                    gen = data.get("generated")
-                    if isinstance(gen, list) and gen:
-                        first = gen[0]
-                        if isinstance(first, dict):
-                            return first.get("content") or first.get("text") or json.dumps(first)
-                        if isinstance(first, str):
-                            return first
-                if "choices" in data:
-                    choices = data.get("choices")
-                    if isinstance(choices, list) and choices:
-                        c = choices[0]
-                        if isinstance(c, dict):
-                            # Chat-like
-                            msg = c.get("message") or c.get("content") or c.get("text")
-                            if isinstance(msg, dict):
-                                return msg.get("content") or msg.get("text") or json.dumps(msg)
-                            if isinstance(msg, str):
-                                return msg
-                # Common fields
-                for key in ("content", "text", "output"):
-                    if key in data:
-                        val = data.get(key)
-                        if isinstance(val, str):
-                            return val
-
+            self.last_stats = {
+                "profile": profile,
+                "cold": cold,
+                "total_time": round(time.perf_counter() - start, 3),
+                **(self._eval_stats(data) if isinstance(data, dict) else {}),
+            }
+            self._record_request("blocking", self.last_stats)
+            content = self._extract_content(data)
             # Fallback: raw text
-            return resp.text
+            return content if content is not None else resp.text
 
         except Exception as e:
+            _request_errors.labels(profile, "blocking").inc()
             raise Exception(f"LLM Error (Ollama): {e}")
 
-    def _build_prompt(self, system_prompt: str, user_message: str, use_history: bool) -> str:
-        parts = [f"System: {system_prompt}"]
+    def _record_request(self, mode: str, stats: Dict[str, Any]):
+        profile = stats["profile"]
+        _request_seconds.labels(profile, mode).observe(stats["total_time"])
+        if "prompt_eval_count" in stats:
+            _prompt_tokens.labels(profile).observe(stats["prompt_eval_count"])
+        completion = stats.get("eval_count", stats.get("chunks"))
+        if completion is not None:
+            _completion_tokens.labels(profile).observe(completion)
+        if stats.get("eval_count") and stats.get("eval_duration"):
+            _tokens_per_second.labels(profile).observe(stats["eval_count"] / stats["eval_duration"])
+        if stats.get("done_reason") == "length":
+            _truncated.labels(profile).inc()
+
+        # 服务端报告了加载耗时时以它为准，否则按空闲时间和 keep_alive 推断
+        if stats.get("load_duration") is not None:
+            stats["cold"] = stats["load_duration"] >= COLD_LOAD_THRESHOLD
+        first_token = stats.get("time_to_first_token")
+        if first_token is None and stats.get("eval_duration") is not None:
+            first_token = max(0.0, stats["total_time"] - stats["eval_duration"])
+        if first_token is not None:
+            _first_token_seconds.labels("cold" if stats.get("cold") else "warm").observe(first_token)
+        self._mark_loaded()
+
+    async def _stream_ollama(
+        self,
+        messages: List[Dict[str, str]],
+        format: Optional[Dict[str, Any]] = None,
+        profile: str = "decision",
+    ) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        以流式方式调用 Ollama，顶层 JSON 对象闭合时立即中止生成
+
+        Args:
+            format: 约束输出的 JSON schema（Ollama 的 format 参数）
+            profile: 生成配置名称（见 app/llm/profiles.py）
+
+        Returns:
+            (已收到的文本, 解析出的对象)；未能提前解析出对象时对象为 None
+        """
+        endpoint = "/api/chat"
+        payload = get_profile(profile).apply({
+            "model": self.model,
+            "messages": messages,
+            "stream": True
+        })
+        if format is not None:
+            payload["format"] = format
+
+        cold = self._expect_cold()
+        parser = JsonObjectStream()
+        parts: List[str] = []
+        decision: Optional[Dict[str, Any]] = None
+        eval_stats: Dict[str, Any] = {}
+        start = time.perf_counter()
+        first_token_at: Optional[float] = None
+        action_at: Optional[float] = None
+        aborted = False
+
+        try:
+            async with self.router.stream(endpoint, json=payload) as resp:
+                resp.raise_for_status()
+                async for line in resp.aiter_lines():
+                    if not line.strip():
+                        continue
+                    try:
+                        chunk = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+                    if chunk.get("error"):
+                        raise Exception(chunk["error"])
+
+                    token = self._extract_content(chunk) or ""
+                    if token:
+                        if first_token_at is None:
+                            first_token_at = time.perf_counter()
+                        parts.append(token)
+                        obj_text = parser.feed(token)
+                        if obj_text is not None:
+                            try:
+                                decision = json.loads(obj_text, strict=False)
+                            except json.JSONDecodeError:
+                                # 括号配平但内容不合法，读完剩余输出后走常规解析
+                                pass
+                            if decision is not None:
+                                action_at = time.perf_counter()
+                                aborted = not chunk.get("done", False)
+                                if not aborted:
+                                    eval_stats = self._eval_stats(chunk)
+                                # 退出 stream 上下文会关闭连接，Ollama 随之停止生成
+                                break
+
+                    if chunk.get("done"):
+                        eval_stats = self._eval_stats(chunk)
+                        break
+
+        except Exception as e:
+            _request_errors.labels(profile, "stream").inc()
+            raise Exception(f"LLM Error (Ollama stream): {e}")
+
+        end = time.perf_counter()
+        # 提前中止时拿不到 prompt_eval_* 统计，首 token 延迟基本就是 prompt 评估耗时
+        self.last_stats = {
+            "profile": profile,
+            "cold": cold,
+            "time_to_first_token": round(first_token_at - start, 3) if first_token_at else None,
+            "time_to_action": round(action_at - start, 3) if action_at else None,
+            "total_time": round(end - start, 3),
+            "aborted": aborted,
+            "chars": sum(len(p) for p in parts),
+            "chunks": len(parts),
+            **eval_stats,
+        }
+        self._record_request("stream", self.last_stats)
+        return "".join(parts), decision
+
+    # ========== 预热与常驻 ==========
+
+    def _mark_loaded(self):
+        self._last_used = time.monotonic()
+        if not self.ready:
+            self.ready = True
+            self._ready_event.set()
+
+    def _expect_cold(self) -> bool:
+        """模型是否可能已被卸载（未预热过，或空闲时间超过 keep_alive）"""
+        if not self.ready or self._last_used is None:
+            return True
+        ttl = parse_keep_alive(settings.llm_keep_alive)
+        return ttl is not None and ttl >= 0 and time.monotonic() - self._last_used > ttl
+
+    async def warm_up(self) -> bool:
+        """
+        预加载模型：向每个地址发送不含消息的请求，Ollama 会加载模型并按 keep_alive 保留在显存中
+        （配置了分诊模型时一并加载）
+
+        Returns:
+            是否至少有一个地址成功
+        """
+        models = list(dict.fromkeys(m for m in (self.model, settings.llm_triage_model) if m))
+        payloads = []
+        for model in models:
+            payload: Dict[str, Any] = {"model": model, "messages": []}
+            if settings.llm_keep_alive is not None:
+                payload["keep_alive"] = settings.llm_keep_alive
+            payloads.append(payload)
+        start = time.perf_counter()
+        errors = await asyncio.gather(*(
+            self._warm_endpoint(e, payload) for e in self.router.endpoints for payload in payloads
+        ))
+        failed = [error for error in errors if error]
+        self.warmup_errors += len(failed)
+        if len(failed) == len(errors):
+            self.last_error = failed[0]
+            if self.ready:
+                print(f"[LLM] 模型心跳失败: {self.last_error}")
+            self.ready = False
+            self._ready_event.clear()
+            return False
+        elapsed = time.perf_counter() - start
+        was_ready = self.ready
+        self.warmups += 1
+        self.last_warmup_time = round(elapsed, 3)
+        self.last_error = failed[0] if failed else None
+        self._mark_loaded()
+        if not was_ready:
+            print(f"[LLM] 模型 {', '.join(models)} 已就绪（预热耗时 {elapsed:.2f}s，"
+                  f"{len(errors) - len(failed)}/{len(errors)} 个地址/模型）")
+        return True
+
+    async def _warm_endpoint(self, endpoint, payload: Dict[str, Any]) -> Optional[str]:
+        """预热一个地址，失败时返回错误信息"""
+        try:
+            resp = await self.router.post("/api/chat", json=payload, timeout=settings.llm_warmup_timeout,
+                                          endpoint=endpoint, record_latency=False)
+            resp.raise_for_status()
+            return None
+        except Exception as e:
+            return f"{endpoint.url} {payload['model']}: {str(e) or type(e).__name__}"
+
+    def start(self):
+        """启动地址健康探测，并按配置在后台预热模型"""
+        self.router.start()
+        if settings.llm_warmup:
+            self.start_keepalive()
+
+    def start_keepalive(self):
+        """后台预热模型，之后在空闲时定期发送心跳，防止模型被服务端卸载"""
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop(), name="llm-keepalive")
+
+    async def _keepalive_loop(self):
+        retry_delay = 5.0
+        while not await self.warm_up():
+            # 服务尚未启动：逐步放宽重试间隔
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)
+
+        interval = settings.llm_keepalive_interval
+        if interval <= 0:
+            return
+        while True:
+            await asyncio.sleep(interval / 4)
+            idle = time.monotonic() - (self._last_used or 0.0)
+            if not self.ready or idle >= interval:
+                await self.warm_up()
+
+    async def wait_ready(self, timeout: float) -> bool:
+        """等待模型预热完成，超时返回 False"""
+        if self.ready:
+            return True
+        try:
+            await asyncio.wait_for(self._ready_event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def close(self):
+        """停止心跳并关闭连接"""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            try:
+                await self._keepalive_task
+            except asyncio.CancelledError:
+                pass
+            self._keepalive_task = None
+        await self.router.close()
+
+    def get_warmup_stats(self) -> Dict[str, Any]:
+        """模型就绪状态和冷/热首 token 延迟"""
+        first_token = _first_token_seconds.snapshot()
+        return {
+            "model": self.model,
+            "ready": self.ready,
+            "keep_alive": settings.llm_keep_alive,
+            "idle_seconds": round(time.monotonic() - self._last_used, 1) if self._last_used else None,
+            "warmups": self.warmups,
+            "warmup_errors": self.warmup_errors,
+            "last_warmup_time": self.last_warmup_time,
+            "last_error": self.last_error,
+            "first_token": {
+                state: first_token.get(state, {"count": 0, "sum": 0.0, "avg": None}) for state in ("cold", "warm")
+            },
+        }
+
+    def _build_messages(self, system_prompt: str, user_message: str, use_history: bool) -> List[Dict[str, str]]:
+        # The system message must stay first and byte-identical between calls
+        # so the server can reuse its cached prefix.
+        messages = [{"role": "system", "content": system_prompt}]
         if use_history and self.conversation_history:
             for m in self.conversation_history:
-                role = m.get("role", "user")
-                content = m.get("content", "")
-                parts.append(f"{role.capitalize()}: {content}")
-        parts.append(f"User: {user_message}")
-        parts.append("Assistant:")
-        return "\n\n".join(parts)
+                messages.append({
+                    "role": m.get("role", "user"),
+                    "content": m.get("content", "")
+                })
+        messages.append({"role": "user", "content": user_message})
+        return messages
 
     async def chat(
         self,
         system_prompt: str,
         user_message: str,
         use_history: bool = True,
+        format: Optional[Dict[str, Any]] = None,
+        profile: str = "chat",
     ) -> str:
-        """Send a message to Ollama and get a response (text)."""
-        prompt = self._build_prompt(system_prompt, user_message, use_history)
-        assistant_message = await self._call_ollama(prompt)
+        """Send a message to Ollama and get a response (text).
+
+        `profile` selects the generation settings (decision / chat / summary / skill).
+        """
+        messages = self._build_messages(system_prompt, user_message, use_history)
+        assistant_message = await self._call_ollama(messages, format, profile)
 
         # Update history
         if use_history:
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
-            if len(self.conversation_history) > settings.max_history_length:
-                self.conversation_history = self.conversation_history[-settings.max_history_length:]
+            self._append_history(user_message, assistant_message)
 
         return assistant_message
 
-    async def chat_json(self, system_prompt: str, user_message: str) -> Dict[str, Any]:
-        """Send a message and parse the LLM response as JSON if possible."""
-        response = await self.chat(system_prompt, user_message, use_history=settings.use_conversation_history)
-        response=json.loads(response)["response"]
+    def _append_history(self, user_message: str, assistant_message: str):
+        self.conversation_history.append({"role": "user", "content": user_message})
+        self.conversation_history.append({"role": "assistant", "content": assistant_message})
+        if len(self.conversation_history) > settings.max_history_length:
+            self.conversation_history = self.conversation_history[-settings.max_history_length:]
+
+    async def chat_json(
+        self,
+        system_prompt: str,
+        user_message: str,
+        schema: Optional[Union[DecisionSchema, TriageSchema]] = None,
+        profile: str = "decision",
+        use_history: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """Send a message and parse the LLM response as JSON.
+
+        When `llm_stream_decisions` is enabled the response is streamed and the
+        decision is returned as soon as the top-level JSON object closes.
+
+        With a decision `schema` and `llm_structured_output` enabled, the JSON
+        schema is sent as Ollama's `format` option so the model can only emit a
+        valid decision; the result is validated against the same action table.
+
+        `use_history` defaults to settings.use_conversation_history; the
+        triage call passes False so its classifications stay out of history.
+
+        Raises:
+            DecisionError: the response is not JSON or not a valid decision
+        """
+        if use_history is None:
+            use_history = settings.use_conversation_history
+        format = schema.schema if schema is not None and settings.llm_structured_output else None
+        format_label = "schema" if format is not None else "free"
+        decision = None
+        if settings.llm_stream_decisions:
+            messages = self._build_messages(system_prompt, user_message, use_history)
+            response, decision = await self._stream_ollama(messages, format, profile)
+            self.last_response = response
+            if use_history:
+                self._append_history(user_message, response)
+        else:
+            response = await self.chat(
+                system_prompt, user_message, use_history=use_history, format=format, profile=profile
+            )
+            self.last_response = response
+
+        start = time.perf_counter()
+        outcome = "stream"
         try:
-            return json.loads(response)
-        except json.JSONDecodeError:
-            patterns = [r'```json\s*([\s\S]*?)\s*```', r'```\s*([\s\S]*?)\s*```', r'\{[\s\S]*\}']
-            for pattern in patterns:
-                match = re.search(pattern, response)
-                if match:
-                    json_str = match.group(1) if match.lastindex else match.group(0)
-                    try:
-                        return json.loads(json_str)
-                    except json.JSONDecodeError:
-                        continue
-            print("Failed to parse JSON from LLM response.")
-            raise Exception("Failed to parse JSON from LLM response")
+            if decision is None:
+                decision, skipped_extra = decode_json_object(response)
+                outcome = "extracted" if skipped_extra else "direct"
+            if schema is not None:
+                decision = schema.validate(decision)
+        except DecisionError as e:
+            outcome = e.kind
+            _wasted_seconds.labels(format_label, profile).inc(self.last_stats.get("total_time") or 0.0)
+            print(f"[LLM] 决策无效 ({outcome}): {e}")
+            raise
+        finally:
+            _json_parse_seconds.observe(time.perf_counter() - start)
+            _json_parse.labels(outcome, format_label, profile).inc()
+        return decision
 
     def clear_history(self):
         self.conversation_history = []
@@ -124,4 +543,4 @@ class LLMClient:
 
 
 # Singleton instance
-llm_client = LLMClient()
\ No newline at end of file
+llm_client = LLMClient()
@@ -0,0 +1,79 @@
+"""
+增量 JSON 对象提取器
+
+LLM 以流的形式逐 token 返回内容，决策 JSON 的顶层对象往往在生成结束前就已经完整。
+JsonObjectStream 逐块接收文本，跟踪括号深度和字符串状态，一旦第一个顶层对象闭合
+就立即返回该对象的文本，调用方可以据此提前中止生成。
+"""
+from typing import List, Optional
+
+
+class JsonObjectStream:
+    """从流式文本中提取第一个完整的顶层 JSON 对象"""
+
+    def __init__(self):
+        self._parts: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self.text: Optional[str] = None  # 完整的对象文本（闭合后才有值）
+
+    @property
+    def done(self) -> bool:
+        """顶层对象是否已经闭合"""
+        return self.text is not None
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """
+        输入一段文本
+
+        Args:
+            chunk: 新收到的文本片段
+
+        Returns:
+            顶层对象在这段文本中闭合时返回对象文本，否则返回 None；
+            对象只返回一次，之后的输入都返回 None（完整文本见 self.text），
+            对象不合法时调用方不会对每个后续 token 重复解析
+        """
+        if self.text is not None or not chunk:
+            return None
+
+        start = 0
+        if self._depth == 0:
+            # 尚未进入对象：跳过前导文本（如 ```json 围栏、解释文字）
+            start = chunk.find("{")
+            if start < 0:
+                return None
+
+        depth = self._depth
+        in_string = self._in_string
+        escape = self._escape
+
+        for i in range(start, len(chunk)):
+            ch = chunk[i]
+            if in_string:
+                if escape:
+                    escape = False
+                elif ch == "\\":
+                    escape = True
+                elif ch == '"':
+                    in_string = False
+                continue
+            if ch == '"':
+                in_string = True
+            elif ch == "{":
+                depth += 1
+            elif ch == "}":
+                depth -= 1
+                if depth == 0:
+                    self._parts.append(chunk[start:i + 1])
+                    self.text = "".join(self._parts)
+                    self._parts = []
+                    self._depth = 0
+                    return self.text
+
+        self._parts.append(chunk[start:])
+        self._depth = depth
+        self._in_string = in_string
+        self._escape = escape
+        return None
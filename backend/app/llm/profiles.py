@@ -0,0 +1,106 @@
+"""
+Generation Profiles for LLM-MC
+
+Each kind of LLM call gets its own generation settings, sent in Ollama's
+request format: sampling and length limits go in `options`
+(num_predict, num_ctx, stop, temperature), `keep_alive` is a top-level
+field. Top-level `temperature` / `max_tokens` keys are ignored by Ollama,
+so they are not sent. A profile may also name its own `model` (the triage
+profile runs on the small llm_triage_model).
+
+Profiles can be overridden per name with the `llm_profiles` setting, e.g.
+LLM_PROFILES='{"decision": {"num_predict": 512}, "chat": {"temperature": 1.0}}'
+"""
+from dataclasses import dataclass, field, replace
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """一类 LLM 调用的生成参数"""
+    name: str
+    temperature: float
+    num_predict: int
+    num_ctx: Optional[int] = None  # 为空时使用模型默认的上下文长度
+    stop: List[str] = field(default_factory=list)
+    keep_alive: Optional[str] = None  # 模型在显存中保留多久（如 "30m"，"-1" 表示一直保留）
+    model: Optional[str] = None  # 为空时使用 settings.llm_model
+
+    def options(self) -> Dict[str, Any]:
+        """Ollama 请求的 options 字段"""
+        options: Dict[str, Any] = {"temperature": self.temperature, "num_predict": self.num_predict}
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        if self.stop:
+            options["stop"] = list(self.stop)
+        return options
+
+    def apply(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """把生成参数写入请求体"""
+        payload["options"] = self.options()
+        if self.model:
+            payload["model"] = self.model
+        if self.keep_alive is not None:
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "model": self.model or settings.llm_model,
+            "keep_alive": self.keep_alive,
+            **self.options(),
+        }
+
+
+def _default_profiles() -> Dict[str, GenerationProfile]:
+    keep_alive = settings.llm_keep_alive
+    return {
+        # Agent 决策：JSON 输出，长度需要容纳 executeScript 的脚本
+        "decision": GenerationProfile(
+            "decision", settings.llm_temperature, settings.llm_max_tokens,
+            num_ctx=settings.llm_num_ctx, keep_alive=keep_alive
+        ),
+        # 聊天回复：短文本，更随意
+        "chat": GenerationProfile(
+            "chat", 0.9, 256, num_ctx=settings.llm_num_ctx, stop=["\n\n"], keep_alive=keep_alive
+        ),
+        # 总结（任务结果、对话历史）：低温度，中等长度
+        "summary": GenerationProfile(
+            "summary", 0.3, 512, num_ctx=settings.llm_num_ctx, keep_alive=keep_alive
+        ),
+        # 编写技能代码：低温度，长输出，更大的上下文
+        "skill": GenerationProfile(
+            "skill", 0.2, 2048, num_ctx=max(settings.llm_num_ctx or 0, 8192), keep_alive=keep_alive
+        ),
+        # 两级决策的分诊：小模型，短 JSON 输出
+        "triage": GenerationProfile(
+            "triage", 0.2, 128, keep_alive=keep_alive, model=settings.llm_triage_model or None
+        ),
+    }
+
+
+def load_profiles() -> Dict[str, GenerationProfile]:
+    """默认配置加上 settings.llm_profiles 中的覆盖项"""
+    profiles = _default_profiles()
+    for name, overrides in (settings.llm_profiles or {}).items():
+        base = profiles.get(name) or replace(profiles["decision"], name=name)
+        try:
+            profiles[name] = replace(base, **overrides)
+        except TypeError as e:
+            print(f"[LLM] 忽略无效的生成配置 {name}: {e}")
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+def get_profile(name: str) -> GenerationProfile:
+    """按名称获取生成配置，未知名称使用 decision"""
+    profile = PROFILES.get(name)
+    if profile is None:
+        print(f"[LLM] 未知的生成配置 '{name}'，使用 decision")
+        profile = PROFILES["decision"]
+    return profile
@@ -1,6 +1,7 @@
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from pathlib import Path
 import json
+import time
 from ..skills.manager import skill_manager
 
 
@@ -28,6 +29,10 @@ ACTIONS_CONFIG_FILE = Path(__file__).parent.parent.parent / "actions.json"
 # 缓存动作列表
 _actions_cache: List[dict] = None
 _actions_cache_mtime: float = 0
+_actions_checked_at: float = 0
+
+# 两次检查 actions.json 修改时间的最小间隔（秒），避免每个 tick 都 stat 文件
+ACTIONS_CHECK_INTERVAL = 2.0
 
 
 def load_actions() -> List[dict]:
@@ -37,7 +42,12 @@ def load_actions() -> List[dict]:
     Returns:
         动作列表
     """
-    global _actions_cache, _actions_cache_mtime
+    global _actions_cache, _actions_cache_mtime, _actions_checked_at
+    
+    now = time.monotonic()
+    if _actions_cache is not None and now - _actions_checked_at < ACTIONS_CHECK_INTERVAL:
+        return _actions_cache
+    _actions_checked_at = now
     
     # 检查文件是否存在
     if not ACTIONS_CONFIG_FILE.exists():
@@ -65,6 +75,17 @@ def load_actions() -> List[dict]:
         return []
 
 
+def get_actions_version() -> float:
+    """
+    获取动作配置的版本（actions.json 的修改时间）
+    
+    Returns:
+        版本号，文件未加载时为 0
+    """
+    load_actions()
+    return _actions_cache_mtime
+
+
 def get_available_actions() -> List[dict]:
     """
     获取可用的动作列表（动态加载）
@@ -124,14 +145,18 @@ def get_skills_section() -> str:
     return "\n".join(lines)
 
 
-def get_executeScript_description() -> str:
+def get_executeScript_description(skills_section: Optional[str] = None) -> str:
     """
     生成 executeScript 动作的描述，动态包含技能库信息
     
+    Args:
+        skills_section: 已渲染的技能库部分，不传则重新生成
+    
     Returns:
         executeScript 动作的完整描述
     """
-    skills_section = get_skills_section()
+    if skills_section is None:
+        skills_section = get_skills_section()
     
     return f"""执行Python脚本完成复杂任务。使用此动作可以调用已保存的技能库或编写自定义逻辑。
 
@@ -143,6 +168,7 @@ def get_executeScript_description() -> str:
 - 方块交互: await bot.activateBlock(x,y,z)
 - 实体交互: await bot.mountEntity(type) / bot.dismount() / bot.useOnEntity(type)
 - 感知: await bot.viewInventory() / bot.findBlock(type,dist) / bot.scanEntities(range,type) / bot.listPlayers()
+- 批量查询: await bot.getBlocksAt([(x,y,z), ...]) / bot.batch([("findBlock", {{"blockType": t, "maxDistance": 32}}), ...]) - 多个只读查询一次往返，返回结果列表
 - 状态: await bot.getPosition() / bot.getHealth()
 - 其他: await bot.chat(msg) / bot.wait(sec) / bot.log(msg)
 
@@ -160,7 +186,7 @@ def get_executeScript_description() -> str:
 """
 
 
-def get_action_descriptions() -> str:
+def get_action_descriptions(skills_section: Optional[str] = None) -> str:
     """Format action list for prompt - 动态加载动作列表"""
     lines = []
     actions = get_available_actions()
@@ -168,7 +194,7 @@ def get_action_descriptions() -> str:
     for action in actions:
         # 对 executeScript 特殊处理，使用动态生成的描述
         if action['name'] == 'executeScript':
-            desc = get_executeScript_description()
+            desc = get_executeScript_description(skills_section)
             params = ", ".join(
                 f"{k}: {v}" for k, v in action["parameters"].items()
             )
@@ -183,27 +209,11 @@ def get_action_descriptions() -> str:
     return "\n".join(lines)
 
 
-def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
-    """Generate the system prompt for the Minecraft agent"""
-    
-    action_descriptions = get_action_descriptions()
-    task_actions = get_task_actions_description()
-    
-    state_json = ""
-    has_active_tasks = False
-    if bot_state:
-        import json
-        has_active_tasks = bot_state.get("has_active_tasks", False)
-        state_json = json.dumps(bot_state, indent=2, ensure_ascii=False)
-    
-    # 获取人格设定
-    persona_name = BOT_PERSONA.get("name", "Bot")
-    persona_desc = BOT_PERSONA.get("personality", "")
-    
-    # 任务状态提示
-    task_status_hint = ""
-    if has_active_tasks:
-        task_status_hint = """
+def get_task_status_hint(has_active_tasks: bool) -> str:
+    """后台任务运行中的提示段落"""
+    if not has_active_tasks:
+        return ""
+    return """
 ## ⚡ 后台任务运行中
 
 你当前有后台任务正在执行（详见观察信息中的"当前后台任务"）。
@@ -213,6 +223,14 @@ def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
 - 你可以继续与玩家互动，无需等待任务完成
 
 """
+
+
+def render_system_prompt(action_descriptions: str, task_actions: str, task_status_hint: str) -> str:
+    """用已渲染好的各个部分拼出完整的系统提示词"""
+    
+    # 获取人格设定
+    persona_name = BOT_PERSONA.get("name", "Bot")
+    persona_desc = BOT_PERSONA.get("personality", "")
     
     return f"""# 🎭 角色设定
 
@@ -279,12 +297,80 @@ async def main(bot):
 6. **启动长时间任务**：对于复杂/耗时任务（挖矿、采集等），优先使用 startSkill 启动后台任务
 7. **无事可做时**：提升自己的装备或探索世界，而不拘泥于收集木材
 8. **只输出JSON**：所有的输出都在JSON内，不要输出任何非JSON的内容
+9. **当前状态**：你的位置、生命值、时间等状态见每条用户消息中的观察信息
+"""
 
----
 
-# 📊 当前状态
-{state_json if state_json else "暂无状态信息"}
-"""
+class PromptCompiler:
+    """
+    系统提示词编译器
+    
+    按部分缓存渲染结果，每部分以其依赖的版本号为键：
+    - 技能库：skill_manager.version
+    - 动作描述：actions.json 版本 + 技能库版本（executeScript 描述内含技能库）
+    - 任务提示：has_active_tasks
+    只有键变化的部分会重新渲染，全部命中时直接返回上次的完整提示词。
+    """
+    
+    def __init__(self):
+        self._sections: Dict[str, Tuple[Any, str]] = {}
+        self.hits = 0
+        self.renders = 0
+    
+    def _section(self, name: str, key: Any, render: Callable[[], str]) -> str:
+        cached = self._sections.get(name)
+        if cached is not None and cached[0] == key:
+            self.hits += 1
+            return cached[1]
+        text = render()
+        self._sections[name] = (key, text)
+        self.renders += 1
+        return text
+    
+    def compile(self, has_active_tasks: bool = False) -> str:
+        """获取系统提示词（尽可能使用缓存）"""
+        actions_version = get_actions_version()
+        skills_version = skill_manager.version
+        
+        def render_actions() -> str:
+            skills_section = self._section("skills", skills_version, get_skills_section)
+            return get_action_descriptions(skills_section)
+        
+        def render_full() -> str:
+            return render_system_prompt(
+                self._section("actions", (actions_version, skills_version), render_actions),
+                self._section("task_actions", None, get_task_actions_description),
+                self._section("task_hint", has_active_tasks, lambda: get_task_status_hint(has_active_tasks)),
+            )
+        
+        return self._section(
+            "system", (actions_version, skills_version, has_active_tasks), render_full
+        )
+    
+    def invalidate(self):
+        """清空所有缓存的部分"""
+        self._sections.clear()
+    
+    def get_stats(self) -> Dict[str, int]:
+        """获取缓存命中统计"""
+        return {"hits": self.hits, "renders": self.renders}
+
+
+prompt_compiler = PromptCompiler()
+
+
+def get_agent_system_prompt(bot_state: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Generate the system prompt for the Minecraft agent
+    
+    系统提示词在各个 tick 之间保持字节级一致，便于 LLM 服务复用已缓存的前缀。
+    位置、生命值、时间等易变状态放在用户消息中（见 format_observation），
+    bot_state 只读取 has_active_tasks。
+    """
+    has_active_tasks = False
+    if bot_state:
+        has_active_tasks = bot_state.get("has_active_tasks", False)
+    return prompt_compiler.compile(has_active_tasks)
 
 
 def get_task_actions_description() -> str:
@@ -297,8 +383,9 @@ def get_task_actions_description() -> str:
 这些动作用于管理后台运行的技能任务，让你可以在执行长时间任务的同时响应玩家：
 
   - **startSkill**: 启动后台技能任务（非阻塞，技能在后台运行，你可以继续响应）
-    Parameters: skillName: 技能名称, kwargs: 技能参数字典（可选）
+    Parameters: skillName: 技能名称, kwargs: 技能参数字典（可选）, priority: 优先级（可选，默认0，越大越优先）
     示例: {"action": "startSkill", "parameters": {"skillName": "挖矿", "kwargs": {"oreType": "iron_ore", "count": 10}}}
+    注意: 需要移动/背包的技能不会同时运行，后启动的会排队；priority 更高的会打断正在运行的低优先级任务（被打断的稍后重新执行）
     
   - **cancelTask**: 取消正在运行的任务
     Parameters: taskId: 任务ID（可选，不填则取消当前任务）, all: 是否取消全部任务（可选）
@@ -315,6 +402,25 @@ def get_task_actions_description() -> str:
 """
 
 
+def get_triage_system_prompt() -> str:
+    """分诊小模型的系统提示词：判断本次 tick 能否不经过主模型直接处理"""
+    persona_name = BOT_PERSONA.get("name", "Bot")
+    greeting = BOT_PERSONA.get("greeting", "")
+    
+    return f"""你是 Minecraft 机器人 **{persona_name}** 的分诊助手，根据观察信息判断当前情况属于哪一类：
+
+- idle: 没有新的聊天、事件或需要处理的事情，继续等待即可
+- chat: 玩家只是打招呼、闲聊或提问，一句简短的回复就够了，不需要任何游戏动作
+- plan: 需要移动、采集、合成、战斗、使用物品，或启动/取消/查询任务；玩家要求做（或停止做）任何事情都属于这一类
+- emergency: 生命值或饥饿值很低、正在受到攻击等危险情况
+
+只输出 JSON：
+{{"category": "idle|chat|plan|emergency", "confidence": 0 到 1 之间的数字, "reply": "category 为 chat 时给玩家的回复，否则为空字符串"}}
+
+回复使用 {persona_name} 的口吻，例如：{greeting}
+不确定时选择 plan，并给出较低的 confidence。"""
+
+
 def get_greeting() -> str:
     """获取Bot的问候语"""
     return BOT_PERSONA.get("greeting", "你好！")
@@ -335,6 +441,10 @@ def format_observation(observation: Dict[str, Any]) -> str:
             f"Food: {health.get('food', '?')}/20"
         )
     
+    if game_time := observation.get("time"):
+        period = "day" if game_time.get("isDay") else "night"
+        lines.append(f"Time: {period} (timeOfDay={game_time.get('timeOfDay', '?')})")
+    
     if entities := observation.get("nearbyEntities"):
         if entities:
             lines.append("Nearby entities:")
@@ -0,0 +1,337 @@
+"""
+LLM Endpoint Router for LLM-MC
+
+Spreads LLM requests over several Ollama servers (settings.llm_endpoints,
+falling back to llm_base_url). Each request goes to the healthy endpoint
+with the lowest (in-flight + 1) x EWMA latency, so a slow or busy box gets
+less traffic instead of stalling every decision. Only real generation
+requests feed the EWMA (warm-up and keep-alive loads do not), and it
+decays while an endpoint is not picked, so a box that was slow once gets
+traffic again and a fresh sample.
+
+- Requests that never reached a server (connect errors, pool timeouts) or
+  were turned away with 503 are retried on another endpoint; nothing was
+  generated yet, so the retry is safe.
+- After llm_eject_after consecutive failures an endpoint is ejected. A
+  background probe (GET /api/version every llm_health_interval seconds)
+  re-admits it once it answers again.
+- Per-endpoint request counts, latency and ejections go to /api/metrics;
+  GET /api/llm/endpoints shows the live state.
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, List, Dict, Any, AsyncIterator, Set, Tuple
+
+import httpx
+
+from app.config import settings
+from app.debug.metrics import metrics
+
+
+_endpoint_requests = metrics.counter(
+    "llm_endpoint_requests_total",
+    "LLM requests per endpoint by result (ok / error / connect_error / unavailable)", ("endpoint", "result")
+)
+_endpoint_seconds = metrics.histogram("llm_endpoint_seconds", "LLM request latency per endpoint", ("endpoint",))
+_endpoint_ejections = metrics.counter("llm_endpoint_ejections_total", "Endpoints taken out of rotation", ("endpoint",))
+
+# 请求没有到达服务端，换一个地址重试不会重复生成
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+# 服务端排队已满（OLLAMA_MAX_QUEUE），请求被直接拒绝
+RETRY_STATUS = (503,)
+
+# 延迟 EWMA 的平滑系数
+EWMA_ALPHA = 0.3
+# 没有新样本时 EWMA 的半衰期（秒）：长时间未被选中的地址会重新得到请求
+EWMA_HALF_LIFE = 30.0
+
+
+class Endpoint:
+    """一个 Ollama 服务地址及其连接池和负载状态"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.http = httpx.AsyncClient(
+            base_url=self.url,
+            timeout=httpx.Timeout(
+                settings.llm_timeout,
+                connect=settings.llm_connect_timeout,
+                pool=settings.llm_timeout,  # 连接池满时最多等待一次请求的时间
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive_connections,
+                keepalive_expiry=60.0,
+            ),
+        )
+        self.healthy = True
+        self.inflight = 0
+        self.ewma: Optional[float] = None  # 请求耗时的指数加权平均（秒）
+        self.sampled_at = 0.0  # 最近一次延迟样本的时间（monotonic）
+        self.failures = 0  # 连续失败次数
+        self.requests = 0
+        self.errors = 0
+        self.ejections = 0
+        self.last_error: Optional[str] = None
+
+    def latency(self, now: float) -> Optional[float]:
+        """按距离上次样本的时间衰减后的 EWMA，没有样本时为 None"""
+        if self.ewma is None:
+            return None
+        return self.ewma * 0.5 ** ((now - self.sampled_at) / EWMA_HALF_LIFE)
+
+    def score(self, now: float, default_latency: float) -> Tuple[float, int]:
+        """
+        越小越优先：(in-flight + 1) x 延迟，相同时比较 in-flight
+
+        还没有样本的地址使用 default_latency（其他地址的平均值），
+        都没有样本时退化为比较 in-flight（least-outstanding）。
+        """
+        latency = self.latency(now)
+        if latency is None:
+            latency = default_latency
+        return (self.inflight + 1) * latency, self.inflight
+
+    def observe(self, seconds: float):
+        now = time.monotonic()
+        latency = self.latency(now)
+        self.ewma = seconds if latency is None else EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * latency
+        self.sampled_at = now
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "inflight": self.inflight,
+            "ewma_ms": round(self.latency(time.monotonic()) * 1000, 1) if self.ewma is not None else None,
+            "requests": self.requests,
+            "errors": self.errors,
+            "consecutive_failures": self.failures,
+            "ejections": self.ejections,
+            "last_error": self.last_error,
+        }
+
+
+class LLMRouter:
+    """
+    多个 Ollama 地址之间的负载均衡
+
+    - pick() 在健康的地址中选择 (in-flight + 1) x EWMA 延迟最小的一个
+    - post() / stream() 在请求未到达服务端时换地址重试
+    - start() 启动健康探测，close() 停止探测并关闭连接池
+    """
+
+    def __init__(self, urls: List[str], retries: int = 2):
+        # 去重并保持顺序
+        self.endpoints = [Endpoint(url) for url in dict.fromkeys(u.rstrip("/") for u in urls if u)]
+        if not self.endpoints:
+            raise ValueError("至少需要一个 LLM 地址")
+        self.retries = retries
+        self.retried = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def pick(self, exclude: Optional[Set[Endpoint]] = None) -> Endpoint:
+        """
+        选择下一个请求的地址
+
+        Args:
+            exclude: 本次请求已经失败过的地址，尽量避开
+
+        全部地址都不可用时仍然返回一个（失败次数最少的），让请求自己报错。
+        """
+        exclude = exclude or set()
+        candidates = [e for e in self.endpoints if e.healthy and e not in exclude]
+        if not candidates:
+            candidates = [e for e in self.endpoints if e.healthy] or \
+                sorted(self.endpoints, key=lambda e: e.failures)[:1]
+        now = time.monotonic()
+        latencies = [l for l in (e.latency(now) for e in candidates) if l is not None]
+        default_latency = sum(latencies) / len(latencies) if latencies else 0.0
+        scores = {e: e.score(now, default_latency) for e in candidates}
+        best = min(scores.values())
+        return random.choice([e for e, score in scores.items() if score == best])
+
+    # ========== 结果记录 ==========
+
+    def _record_success(self, endpoint: Endpoint, seconds: float, record_latency: bool = True):
+        endpoint.requests += 1
+        endpoint.failures = 0
+        _endpoint_requests.labels(endpoint.url, "ok").inc()
+        if record_latency:
+            endpoint.observe(seconds)
+            _endpoint_seconds.labels(endpoint.url).observe(seconds)
+        if not endpoint.healthy:
+            self._admit(endpoint)
+
+    def _record_failure(self, endpoint: Endpoint, error: Any, result: str = "error"):
+        endpoint.requests += 1
+        endpoint.errors += 1
+        endpoint.failures += 1
+        endpoint.last_error = str(error) or type(error).__name__
+        _endpoint_requests.labels(endpoint.url, result).inc()
+        if endpoint.healthy and endpoint.failures >= settings.llm_eject_after and len(self.endpoints) > 1:
+            self._eject(endpoint)
+
+    def _record_response(self, endpoint: Endpoint, status_code: int, seconds: float, record_latency: bool = True):
+        if status_code >= 500:
+            self._record_failure(endpoint, f"HTTP {status_code}")
+        else:
+            self._record_success(endpoint, seconds, record_latency)
+
+    def _eject(self, endpoint: Endpoint):
+        endpoint.healthy = False
+        endpoint.ejections += 1
+        _endpoint_ejections.labels(endpoint.url).inc()
+        print(f"[LLMRouter] 移出 {endpoint.url}（连续失败 {endpoint.failures} 次: {endpoint.last_error}）")
+
+    def _admit(self, endpoint: Endpoint):
+        endpoint.healthy = True
+        endpoint.failures = 0
+        print(f"[LLMRouter] 恢复 {endpoint.url}")
+
+    # ========== 请求 ==========
+
+    async def post(
+        self,
+        path: str,
+        json: Dict[str, Any],
+        timeout: Optional[float] = None,
+        endpoint: Optional[Endpoint] = None,
+        record_latency: bool = True,
+    ) -> httpx.Response:
+        """
+        发送 POST 请求
+
+        Args:
+            timeout: 覆盖默认的读取超时（秒）
+            endpoint: 指定地址（不重试），如逐个预热
+            record_latency: 是否计入延迟 EWMA；预热和心跳包含模型加载时间，不计入
+        """
+        tried: Set[Endpoint] = set()
+        attempts = 1 if endpoint else self.retries + 1
+        for attempt in range(attempts):
+            target = endpoint or self.pick(tried)
+            tried.add(target)
+            target.inflight += 1
+            start = time.perf_counter()
+            try:
+                resp = await target.http.post(
+                    path, json=json, timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT
+                )
+            except RETRY_ERRORS as e:
+                self._record_failure(target, e, "connect_error")
+                if attempt + 1 >= attempts:
+                    raise
+                self.retried += 1
+                continue
+            except Exception as e:
+                self._record_failure(target, e)
+                raise
+            finally:
+                target.inflight -= 1
+            if resp.status_code in RETRY_STATUS and attempt + 1 < attempts:
+                self._record_failure(target, f"HTTP {resp.status_code}", "unavailable")
+                self.retried += 1
+                continue
+            self._record_response(target, resp.status_code, time.perf_counter() - start, record_latency)
+            return resp
+
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict[str, Any]) -> AsyncIterator[httpx.Response]:
+        """
+        发送流式 POST 请求（async with）
+
+        只有在收到响应之前的失败会换地址重试；开始读取之后的错误直接抛出。
+        地址的健康状态只由连接错误、5xx 和读取时的传输错误决定；调用方在
+        async with 中抛出的异常（如 4xx 的 raise_for_status、Ollama 返回的
+        error）是请求本身的问题，原样抛出，不计入地址失败。
+        """
+        tried: Set[Endpoint] = set()
+        attempts = self.retries + 1
+        for attempt in range(attempts):
+            target = self.pick(tried)
+            tried.add(target)
+            opened = False
+            target.inflight += 1
+            start = time.perf_counter()
+            try:
+                async with target.http.stream("POST", path, json=json) as resp:
+                    if resp.status_code in RETRY_STATUS and attempt + 1 < attempts:
+                        self._record_failure(target, f"HTTP {resp.status_code}", "unavailable")
+                        self.retried += 1
+                        continue
+                    if resp.status_code >= 500:
+                        self._record_failure(target, f"HTTP {resp.status_code}")
+                    opened = True
+                    try:
+                        yield resp
+                    except httpx.TransportError as e:
+                        # 读取过程中连接断开或超时，是地址的问题
+                        self._record_failure(target, e)
+                        raise
+                    if resp.status_code < 500:
+                        self._record_success(target, time.perf_counter() - start)
+                return
+            except RETRY_ERRORS as e:
+                if opened:
+                    raise
+                self._record_failure(target, e, "connect_error")
+                if attempt + 1 >= attempts:
+                    raise
+                self.retried += 1
+            except Exception as e:
+                if not opened:
+                    self._record_failure(target, e)
+                raise
+            finally:
+                target.inflight -= 1
+
+    # ========== 健康探测 ==========
+
+    async def probe(self, endpoint: Endpoint) -> bool:
+        """探测一个地址是否可用"""
+        try:
+            resp = await endpoint.http.get("/api/version", timeout=settings.llm_connect_timeout)
+            resp.raise_for_status()
+        except Exception as e:
+            endpoint.last_error = str(e) or type(e).__name__
+            return False
+        if not endpoint.healthy:
+            self._admit(endpoint)
+        return True
+
+    async def _probe_loop(self):
+        interval = settings.llm_health_interval
+        while True:
+            await asyncio.sleep(interval)
+            # 只需要探测被移出的地址，正常的地址由实际请求反映状态
+            ejected = [e for e in self.endpoints if not e.healthy]
+            if ejected:
+                await asyncio.gather(*(self.probe(e) for e in ejected))
+
+    def start(self):
+        """启动健康探测（只有一个地址时不需要）"""
+        if len(self.endpoints) < 2 or settings.llm_health_interval <= 0:
+            return
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_loop(), name="llm-router-probe")
+
+    async def close(self):
+        if self._probe_task:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        for endpoint in self.endpoints:
+            await endpoint.http.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "endpoints": [e.get_stats() for e in self.endpoints],
+            "healthy": sum(1 for e in self.endpoints if e.healthy),
+            "retried": self.retried,
+        }
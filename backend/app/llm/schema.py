@@ -0,0 +1,278 @@
+"""
+Decision Schema for LLM-MC
+
+Builds the JSON schema of an agent decision ({thought, action, parameters})
+from actions.json plus the task actions handled by the agent itself. The
+schema is sent to Ollama as the `format` option so generation is
+constrained to a valid decision, and the same action table backs
+DecisionSchema.validate(), which together with decode_json_object() is the
+single decoder used for every decision response.
+
+TriageSchema does the same for the small triage model's classification
+({category, confidence, reply}) used by the decision cascade.
+"""
+import json
+from typing import Dict, Any, List, Optional, Tuple
+
+from app.llm.prompts import get_available_actions, get_actions_version
+
+
+# Agent 自己处理的任务动作（不在 actions.json 中），与 get_task_actions_description 保持一致
+TASK_ACTIONS: Dict[str, Dict[str, str]] = {
+    "startSkill": {
+        "skillName": "string - 技能名称",
+        "kwargs": "object - 可选：技能参数字典",
+        "priority": "integer - 可选：优先级（默认0）",
+    },
+    "cancelTask": {
+        "taskId": "string - 可选：任务ID",
+        "all": "boolean - 可选：是否取消全部任务",
+    },
+    "getTaskStatus": {},
+}
+
+# actions.json 参数说明中的类型 -> JSON schema 类型
+_TYPES = {
+    "string": "string",
+    "number": "number",
+    "integer": "integer",
+    "boolean": "boolean",
+    "object": "object",
+    "array": "array",
+}
+
+# 参数说明中包含这些词时视为可选参数
+_OPTIONAL_MARKERS = ("可选", "默认", "optional")
+
+
+class DecisionError(Exception):
+    """LLM 的决策无法解析或不符合动作定义"""
+
+    def __init__(self, message: str, kind: str = "invalid"):
+        super().__init__(message)
+        self.kind = kind  # failed: 不是 JSON; invalid: JSON 但不符合动作定义
+
+
+def parse_param_spec(spec: Any) -> Tuple[Dict[str, Any], bool]:
+    """
+    把 actions.json 的参数说明（如 "number - 最大距离（默认32）"）转换为 schema
+
+    Returns:
+        (参数 schema, 是否必填)
+    """
+    text = str(spec)
+    type_name, _, description = text.partition(" - ")
+    schema: Dict[str, Any] = {}
+    json_type = _TYPES.get(type_name.strip().lower())
+    if json_type:
+        schema["type"] = json_type
+    if description:
+        schema["description"] = description.strip()
+    required = not any(marker in text.lower() for marker in _OPTIONAL_MARKERS)
+    return schema, required
+
+
+class DecisionSchema:
+    """
+    决策 schema 和动作参数表
+
+    按 actions.json 的版本缓存，文件修改后下次访问时重新生成。
+    """
+
+    def __init__(self):
+        self._version: Optional[float] = None
+        self._schema: Dict[str, Any] = {}
+        # 动作名 -> (参数名 -> (schema, 是否必填))
+        self._params: Dict[str, Dict[str, Tuple[Dict[str, Any], bool]]] = {}
+        self.builds = 0
+
+    def _refresh(self):
+        version = get_actions_version()
+        if version == self._version and self._schema:
+            return
+        actions: Dict[str, Dict[str, Any]] = {}
+        for action in get_available_actions():
+            actions[action["name"]] = action.get("parameters") or {}
+        actions.update(TASK_ACTIONS)
+
+        self._params = {
+            name: {param: parse_param_spec(spec) for param, spec in params.items()}
+            for name, params in actions.items()
+        }
+        self._schema = self._build()
+        self._version = version
+        self.builds += 1
+
+    def _build(self) -> Dict[str, Any]:
+        variants = []
+        for name, params in self._params.items():
+            variants.append({
+                "type": "object",
+                "properties": {
+                    "thought": {"type": "string"},
+                    "action": {"type": "string", "enum": [name]},
+                    "parameters": {
+                        "type": "object",
+                        "properties": {param: schema for param, (schema, _) in params.items()},
+                        "required": [param for param, (_, required) in params.items() if required],
+                    },
+                },
+                "required": ["thought", "action", "parameters"],
+            })
+        return {"anyOf": variants}
+
+    @property
+    def schema(self) -> Dict[str, Any]:
+        """传给 Ollama format 参数的 JSON schema"""
+        self._refresh()
+        return self._schema
+
+    @property
+    def action_names(self) -> List[str]:
+        self._refresh()
+        return list(self._params)
+
+    def validate(self, decision: Any) -> Dict[str, Any]:
+        """
+        检查决策是否符合动作定义，数字字符串转换为数字
+
+        缺少的必填参数只由 schema 约束生成，这里不拒绝：动作本身会给出默认值或
+        返回明确的错误信息，和不使用 schema 时的行为一致。
+
+        Raises:
+            DecisionError: 不符合动作定义
+        """
+        self._refresh()
+        if not isinstance(decision, dict):
+            raise DecisionError(f"决策必须是 JSON 对象，收到 {type(decision).__name__}")
+        action = decision.get("action")
+        if action is None:
+            # 没有动作的回复由 Agent 按“无有效动作”处理
+            return decision
+        params_spec = self._params.get(action)
+        if params_spec is None:
+            raise DecisionError(f"未知动作 '{action}'，可用动作: {', '.join(self._params)}")
+        parameters = decision.get("parameters")
+        if parameters is None:
+            parameters = decision["parameters"] = {}
+        if not isinstance(parameters, dict):
+            raise DecisionError(f"动作 '{action}' 的 parameters 必须是对象")
+        for param, (schema, _) in params_spec.items():
+            if param not in parameters:
+                continue
+            value = parameters[param]
+            expected = schema.get("type")
+            if expected in ("number", "integer") and isinstance(value, str):
+                text = value.strip()
+                try:
+                    value = int(text) if expected == "integer" or text.lstrip("-").isdigit() else float(text)
+                    parameters[param] = value
+                except ValueError:
+                    pass
+            if expected and not _matches_type(value, expected):
+                raise DecisionError(f"动作 '{action}' 的参数 '{param}' 应为 {expected}")
+        return decision
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._refresh()
+        return {
+            "actions": len(self._params),
+            "schema_bytes": len(json.dumps(self._schema, ensure_ascii=False)),
+            "builds": self.builds,
+        }
+
+
+def _matches_type(value: Any, expected: str) -> bool:
+    if value is None:
+        return True
+    if expected == "number":
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    if expected == "integer":
+        return isinstance(value, int) and not isinstance(value, bool)
+    if expected == "string":
+        return isinstance(value, str)
+    if expected == "boolean":
+        return isinstance(value, bool)
+    if expected == "object":
+        return isinstance(value, dict)
+    if expected == "array":
+        return isinstance(value, list)
+    return True
+
+
+# 分诊类别：idle / chat 可由小模型直接处理，plan / emergency 需要主模型
+TRIAGE_CATEGORIES = ("idle", "chat", "plan", "emergency")
+
+
+class TriageSchema:
+    """分诊结果的 schema，接口与 DecisionSchema 相同，可直接传给 chat_json"""
+
+    schema: Dict[str, Any] = {
+        "type": "object",
+        "properties": {
+            "category": {"type": "string", "enum": list(TRIAGE_CATEGORIES)},
+            "confidence": {"type": "number", "minimum": 0, "maximum": 1},
+            "reply": {"type": "string"},
+        },
+        "required": ["category", "confidence", "reply"],
+    }
+
+    def validate(self, result: Any) -> Dict[str, Any]:
+        """
+        检查分诊结果，confidence 转换为 0-1 之间的数字（缺失时为 0）
+
+        Raises:
+            DecisionError: 不是对象或类别未知
+        """
+        if not isinstance(result, dict):
+            raise DecisionError(f"分诊结果必须是 JSON 对象，收到 {type(result).__name__}")
+        category = str(result.get("category") or "").strip().lower()
+        if category not in TRIAGE_CATEGORIES:
+            raise DecisionError(f"未知分诊类别 '{result.get('category')}'")
+        try:
+            confidence = float(result.get("confidence") or 0.0)
+        except (TypeError, ValueError):
+            confidence = 0.0
+        reply = result.get("reply")
+        return {
+            "category": category,
+            "confidence": min(max(confidence, 0.0), 1.0),
+            "reply": reply.strip() if isinstance(reply, str) else "",
+        }
+
+
+_decoder = json.JSONDecoder(strict=False)
+
+
+def decode_json_object(text: str) -> Tuple[Any, bool]:
+    """
+    从模型输出中解码第一个 JSON 值
+
+    受约束的输出是纯 JSON，一次 raw_decode 即可；自由输出时跳过前面的说明文字或
+    ``` 代码块标记，从第一个 '{' 开始解码，忽略后面多余的内容。
+
+    Returns:
+        (解码结果, 是否需要跳过多余内容)
+
+    Raises:
+        DecisionError: 找不到可解码的 JSON 对象
+    """
+    stripped = text.strip()
+    try:
+        value, end = _decoder.raw_decode(stripped)
+        return value, end != len(stripped)
+    except json.JSONDecodeError:
+        pass
+    start = stripped.find("{")
+    while start != -1:
+        try:
+            value, _ = _decoder.raw_decode(stripped, start)
+            return value, True
+        except json.JSONDecodeError:
+            start = stripped.find("{", start + 1)
+    raise DecisionError("Failed to parse JSON from LLM response", kind="failed")
+
+
+# 全局决策 schema
+decision_schema = DecisionSchema()
+triage_schema = TriageSchema()
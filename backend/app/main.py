@@ -5,7 +5,15 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.routes import router
 from app.bot.client import bot_client
+from app.bot.world_state import world_state
 from app.agent.agent import agent
+from app.script.executor import script_executor, run_skill_task
+from app.debug.trace import trace_recorder
+from app.debug.watchdog import loop_watchdog
+from app.llm.client import llm_client
+from app.task.journal import task_journal
+from app.task.manager import task_manager
+from app.task.stream import task_stream
 from app.config import settings
 
 
@@ -14,16 +22,40 @@ async def lifespan(app: FastAPI):
     """Application lifespan management"""
     # Startup
     print("🚀 Starting LLM-MC Backend...")
+    if settings.loop_watchdog_enabled:
+        await loop_watchdog.start()
+    
+    # Probe LLM endpoints and load the model in the background while the rest of the backend starts
+    llm_client.start()
     await bot_client.init()
     
     # Start WebSocket listener for bot events
     await bot_client.start_ws_listener()
+    
+    # Start the local world-state mirror (fed by WebSocket events)
+    await world_state.start()
+    
+    # Pre-start script workers (process isolation mode only)
+    await script_executor.start()
+    
+    # Push task changes to /api/tasks/stream clients
+    task_stream.attach()
+    
+    # Replay the task journal and resume unfinished skill tasks
+    if settings.task_journal_enabled:
+        await task_manager.recover(task_journal, run_skill_task)
+    # Record agent ticks and bot round trips for offline replay
+    if settings.agent_trace_path:
+        trace_recorder.start(settings.agent_trace_path)
     print("✅ Backend ready!")
     
     # Auto-start agent if enabled
     if settings.auto_start_agent:
         # Wait a bit for bot service to be ready
         await asyncio.sleep(2)
+        # The first decision should not pay the model load time
+        if settings.llm_warmup and not await llm_client.wait_ready(settings.llm_warmup_timeout):
+            print(f"⚠️ Model not ready after {settings.llm_warmup_timeout:.0f}s, starting Agent anyway")
         print("🤖 Auto-starting Agent...")
         await agent.start()
         print("✅ Agent started!")
@@ -32,9 +64,16 @@ async def lifespan(app: FastAPI):
     
     # Shutdown
     print("👋 Shutting down...")
+    # Close the journal first so unfinished tasks are resumed on next start
+    await task_manager.shutdown()
     if agent.is_running:
         await agent.stop()
+    await world_state.stop()
+    await script_executor.close()
+    trace_recorder.stop()
     await bot_client.close()
+    await llm_client.close()
+    await loop_watchdog.stop()
 
 
 app = FastAPI(
@@ -69,8 +108,12 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint"""
-    return {"status": "healthy"}
+    """Health check endpoint; `ready` turns true once the model is loaded"""
+    return {
+        "status": "healthy",
+        "ready": llm_client.ready or not settings.llm_warmup,
+        "llm": llm_client.get_warmup_stats(),
+    }
 
 
 if __name__ == "__main__":
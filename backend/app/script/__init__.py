@@ -1,3 +1,4 @@
 from .executor import ScriptExecutor, script_executor, BotAPI
+from .pool import ScriptWorkerPool
 
-__all__ = ["ScriptExecutor", "script_executor", "BotAPI"]
\ No newline at end of file
+__all__ = ["ScriptExecutor", "script_executor", "BotAPI", "ScriptWorkerPool"]
\ No newline at end of file
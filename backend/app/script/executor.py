@@ -3,17 +3,36 @@ Python Script Executor for LLM-MC
 Allows LLM to write and execute Python code to perform complex actions
 """
 import asyncio
+import hashlib
+import marshal
+import time
 import traceback
 import re
 import textwrap
+from collections import OrderedDict
+from types import CodeType
 from typing import Dict, Any, Optional, List
-from io import StringIO
-import sys
 
 from app.bot.client import bot_client
+from app.bot.world_state import world_state
+from app.config import settings
+from app.script.output import start_capture
+from app.script.pool import ScriptWorkerPool
+from app.script.sandbox import SCRIPT_BUILTINS, script_globals
+from app.skills.cache import skill_cache
 from app.skills.manager import skill_manager
 
 
+def _skill_globals() -> Dict[str, Any]:
+    """技能代码的执行环境：脚本的内置函数白名单，另外允许 import（技能可以导入模块）"""
+    builtins = dict(SCRIPT_BUILTINS)
+    builtins['__import__'] = __import__
+    return {
+        '__builtins__': builtins,
+        'asyncio': asyncio,
+    }
+
+
 class BotAPI:
     """
     Safe Bot API wrapper for script execution
@@ -86,7 +105,7 @@ class BotAPI:
     
     async def viewInventory(self) -> Dict[str, Any]:
         """查看背包"""
-        result = await bot_client.execute_action("viewInventory", {})
+        result = await world_state.view_inventory()
         self.results.append({"action": "viewInventory", "result": result})
         return result
     
@@ -164,6 +183,61 @@ class BotAPI:
         self.results.append({"action": "getBlockAt", "result": result})
         return result
     
+    async def batch(self, calls: List[Any]) -> List[Dict[str, Any]]:
+        """
+        一次往返执行多个只读查询，按顺序返回结果
+        
+        支持的动作: viewInventory, scanBlocks, findBlock, getBlockAt, scanEntities,
+        listPlayers, canReach, getPathTo, listRecipes, findCraftingTable,
+        findFurnace, findChest, getRecipeData
+        
+        Args:
+            calls: 查询列表，每一项为 {"action": 名称, "parameters": {...}}
+                   或 (名称, 参数字典) 元组
+            
+        Returns:
+            结果列表，与 calls 一一对应；某一项失败只影响该项（success=False）
+            
+        Example:
+            results = await bot.batch([
+                ("findBlock", {"blockType": "oak_log", "maxDistance": 32}),
+                ("findBlock", {"blockType": "birch_log", "maxDistance": 32}),
+            ])
+        """
+        actions = []
+        for call in calls:
+            if isinstance(call, dict):
+                actions.append({"action": call.get("action"), "parameters": call.get("parameters") or {}})
+            else:
+                name, params = call
+                actions.append({"action": name, "parameters": params or {}})
+        results = await bot_client.execute_batch(actions)
+        self.results.append({"action": "batch", "result": {"count": len(results)}})
+        return results
+    
+    async def getBlocksAt(self, positions: List[Any]) -> List[Dict[str, Any]]:
+        """
+        一次往返查询多个坐标的方块信息
+        
+        Args:
+            positions: 坐标列表，每一项为 (x, y, z) 或 {"x":, "y":, "z":}
+            
+        Returns:
+            与 positions 一一对应的 getBlockAt 结果列表
+            
+        Example:
+            results = await bot.getBlocksAt([(10, 64, 5), (10, 65, 5)])
+            names = [r.get("block", {}).get("name") for r in results]
+        """
+        calls = []
+        for pos in positions:
+            if isinstance(pos, dict):
+                x, y, z = pos.get("x"), pos.get("y"), pos.get("z")
+            else:
+                x, y, z = pos
+            calls.append(("getBlockAt", {"x": x, "y": y, "z": z}))
+        return await self.batch(calls)
+    
     async def scanEntities(self, range: int = 16, entityType: str = None) -> Dict[str, Any]:
         """扫描实体"""
         params = {"range": range}
@@ -465,14 +539,12 @@ class BotAPI:
         return await bot_client.get_status()
     
     async def getPosition(self) -> Dict[str, Any]:
-        """获取当前位置"""
-        observation = await bot_client.get_observation()
-        return observation.get("position", {"x": 0, "y": 0, "z": 0})
+        """获取当前位置（优先使用本地世界状态镜像）"""
+        return await world_state.get_position()
     
     async def getHealth(self) -> Dict[str, Any]:
-        """获取生命值和饥饿值"""
-        observation = await bot_client.get_observation()
-        return observation.get("health", {"health": 20, "food": 20})
+        """获取生命值和饥饿值（优先使用本地世界状态镜像）"""
+        return await world_state.get_health()
     
     # ===== 事件等待方法 =====
     
@@ -480,7 +552,8 @@ class BotAPI:
         self,
         event_type: str,
         filter_func = None,
-        timeout: float = 30.0
+        timeout: float = 30.0,
+        match: Optional[Dict[str, Any]] = None
     ) -> Optional[Dict[str, Any]]:
         """
         等待特定类型的游戏事件
@@ -496,11 +569,20 @@ class BotAPI:
                 - 'entitySpawn': 实体生成
             filter_func: 可选的过滤函数，接收事件数据，返回 True 表示匹配
             timeout: 超时时间（秒），默认 30 秒
+            match: 可选的键值匹配条件（比过滤函数更快），键为点分隔的字段路径，
+                   值为期望值，值为列表/集合时匹配其中任意一个
             
         Returns:
             匹配的事件数据，超时返回 None
             
         Example:
+            # 等待指定实体被捡起（键值匹配）
+            event = await bot.waitForEvent(
+                "playerCollect",
+                match={"collected.id": [entity_id]},
+                timeout=10.0
+            )
+            
             # 等待某个玩家捡起物品
             event = await bot.waitForEvent(
                 "playerCollect",
@@ -520,7 +602,7 @@ class BotAPI:
             )
         """
         self.log(f"等待事件: {event_type} (超时: {timeout}秒)")
-        result = await bot_client.wait_for_event(event_type, filter_func, timeout)
+        result = await bot_client.wait_for_event(event_type, filter_func, timeout, match=match)
         
         if result:
             self.log(f"收到事件: {event_type}")
@@ -555,12 +637,8 @@ class BotAPI:
             # 等待任意玩家捡起
             event = await bot.waitForPlayerCollect(timeout=15.0)
         """
-        if player_name:
-            filter_func = lambda e: e.get("collector", {}).get("name") == player_name
-        else:
-            filter_func = None
-        
-        return await self.waitForEvent("playerCollect", filter_func, timeout)
+        match = {"collector.name": player_name} if player_name else None
+        return await self.waitForEvent("playerCollect", timeout=timeout, match=match)
     
     async def waitForChat(
         self,
@@ -586,14 +664,12 @@ class BotAPI:
             # 等待包含 "yes" 的消息
             event = await bot.waitForChat(contains="yes", timeout=30.0)
         """
-        def filter_func(e):
-            if from_player and e.get("username") != from_player:
-                return False
-            if contains and contains.lower() not in e.get("message", "").lower():
-                return False
-            return True
+        match = {"username": from_player} if from_player else None
+        filter_func = None
+        if contains:
+            filter_func = lambda e: contains.lower() in e.get("message", "").lower()
         
-        return await self.waitForEvent("chat", filter_func, timeout)
+        return await self.waitForEvent("chat", filter_func, timeout, match=match)
     
     # ===== 技能库相关方法 =====
     
@@ -689,8 +765,15 @@ return "没找到木头"
         Example:
             result = await bot.useSkill("采集木头")
         """
-        skill = skill_manager.get_skill(name)
-        if not skill:
+        try:
+            # 编译结果按文件内容缓存，文件不变时不再读取和编译
+            compiled = skill_cache.load(name, _skill_globals)
+        except Exception as e:
+            error_msg = f"技能执行失败: {str(e)}"
+            self.log(error_msg)
+            return {"success": False, "error": error_msg, "traceback": traceback.format_exc()}
+        
+        if compiled is None:
             error_msg = f"技能 '{name}' 不存在"
             self.log(error_msg)
             return {"success": False, "error": error_msg}
@@ -698,53 +781,11 @@ return "没找到木头"
         self.log(f"执行技能: {name}")
         
         try:
-            # 获取技能代码
-            full_code = skill.get('full_code', '')
-            
-            # 动态执行技能代码
-            skill_globals = {
-                '__builtins__': {
-                    '__import__': __import__,
-                    'print': print,
-                    'len': len,
-                    'range': range,
-                    'str': str,
-                    'int': int,
-                    'float': float,
-                    'bool': bool,
-                    'list': list,
-                    'dict': dict,
-                    'tuple': tuple,
-                    'set': set,
-                    'abs': abs,
-                    'min': min,
-                    'max': max,
-                    'sum': sum,
-                    'round': round,
-                    'sorted': sorted,
-                    'enumerate': enumerate,
-                    'zip': zip,
-                    'map': map,
-                    'filter': filter,
-                    'isinstance': isinstance,
-                    'True': True,
-                    'False': False,
-                    'None': None,
-                },
-                'asyncio': asyncio,
-            }
-            
-            # 使用单一命名空间执行技能代码，确保模块级定义（helper 函数等）
-            # 可被技能函数正常访问
-            skill_namespace = skill_globals
-            exec(compile(full_code, f'<skill:{name}>', 'exec'), skill_namespace, skill_namespace)
-
             # 找到技能函数
-            func_name = skill_manager._safe_func_name(name)
-            if func_name not in skill_namespace:
+            skill_func = compiled.func
+            if skill_func is None:
+                func_name = skill_manager._safe_func_name(name)
                 return {"success": False, "error": f"技能函数 {func_name} 未定义"}
-
-            skill_func = skill_namespace[func_name]
             
             # 执行技能
             result = await skill_func(self, **kwargs)
@@ -758,36 +799,41 @@ return "没找到木头"
             return {"success": False, "error": error_msg, "traceback": traceback.format_exc()}
 
 
+async def run_skill_task(skill_name: str, kwargs: Optional[Dict[str, Any]] = None) -> Any:
+    """用新的 BotAPI 执行技能（后台任务和重启恢复使用）"""
+    bot_api = BotAPI()
+    return await bot_api.useSkill(skill_name, **(kwargs or {}))
+
+
 class ScriptExecutor:
     """
     Safe Python script executor with timeout and restrictions
     """
     
-    def __init__(self, timeout: float = 120.0):
+    def __init__(self, timeout: float = 120.0, cache_size: Optional[int] = None,
+                 isolation: Optional[str] = None):
         self.timeout = timeout
         self.allowed_modules = {
             'asyncio', 'math', 'random', 'json', 'time', 're'
         }
-    
-    async def execute(self, script: str, timeout: Optional[float] = None) -> Dict[str, Any]:
-        """
-        Execute Python script code
-        
-        The code should define an async function called 'main' that takes 'bot' as parameter:
         
-        async def main(bot):
-            result = await bot.findBlock('diamond_ore')
-            if result['found']:
-                await bot.goTo(result['x'], result['y'], result['z'])
-            return "Done!"
+        # 编译缓存：清理后脚本的哈希 -> (code, 清理+编译耗时)，原始脚本的哈希 -> 清理后脚本的哈希
+        self.cache_size = settings.script_cache_size if cache_size is None else cache_size
+        self._code_cache: "OrderedDict[bytes, tuple]" = OrderedDict()
+        self._raw_index: "OrderedDict[bytes, bytes]" = OrderedDict()
+        self.cache_raw_hits = 0
+        self.cache_normalized_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.cache_time_saved = 0.0
         
-        Args:
-            script: The Python code to execute
-            timeout: Execution timeout in seconds (uses default if not provided)
-        """
-        bot_api = BotAPI()
-        effective_timeout = timeout if timeout is not None else self.timeout
-        # Clean script input: remove Markdown fences (``` or ```python) and dedent
+        # 执行模式：inprocess 在后端事件循环中执行，process 在独立的 worker 进程中执行
+        self.isolation = settings.script_isolation if isolation is None else isolation
+        self._pool: Optional[ScriptWorkerPool] = None
+    
+    @staticmethod
+    def _normalize_script(script: str) -> str:
+        """Clean script input: remove Markdown fences (``` or ```python) and dedent"""
         try:
             if isinstance(script, str):
                 m = re.search(r'```(?:python)?\s*([\s\S]*?)\s*```', script, re.IGNORECASE)
@@ -821,49 +867,134 @@ class ScriptExecutor:
         except Exception:
             # If any issue during cleanup, proceed with original script
             pass
+        return script
+    
+    def _compile_script(self, script: str) -> CodeType:
+        """
+        清理并编译脚本，结果按原始脚本和清理后脚本的哈希缓存（LRU）
         
-        # 捕获stdout
-        old_stdout = sys.stdout
-        sys.stdout = mystdout = StringIO()
+        LLM 经常在不同 tick 重复输出相同或只差围栏/缩进的脚本，
+        原始文本命中时跳过清理和编译，清理后命中时跳过编译。
+        
+        Raises:
+            SyntaxError: 脚本无法编译（不会被缓存）
+        """
+        if not isinstance(script, str) or self.cache_size <= 0:
+            return compile(self._normalize_script(script), '<script>', 'exec')
+        
+        start = time.perf_counter()
+        raw_key = hashlib.sha1(script.encode('utf-8')).digest()
+        norm_key = self._raw_index.get(raw_key)
+        if norm_key is not None and norm_key in self._code_cache:
+            self._raw_index.move_to_end(raw_key)
+            self._code_cache.move_to_end(norm_key)
+            code, cost = self._code_cache[norm_key]
+            self.cache_raw_hits += 1
+            self.cache_time_saved += max(0.0, cost - (time.perf_counter() - start))
+            return code
+        
+        normalized = self._normalize_script(script)
+        norm_key = hashlib.sha1(normalized.encode('utf-8')).digest()
+        cached = self._code_cache.get(norm_key)
+        if cached is not None:
+            self._code_cache.move_to_end(norm_key)
+            code, cost = cached
+            self.cache_normalized_hits += 1
+            self.cache_time_saved += max(0.0, cost - (time.perf_counter() - start))
+        else:
+            code = compile(normalized, '<script>', 'exec')
+            self.cache_misses += 1
+            self._code_cache[norm_key] = (code, time.perf_counter() - start)
+            while len(self._code_cache) > self.cache_size:
+                self._code_cache.popitem(last=False)
+                self.cache_evictions += 1
+        
+        self._raw_index[raw_key] = norm_key
+        # 多个原始脚本可能对应同一份清理后的代码，索引上限取缓存大小的两倍
+        while len(self._raw_index) > self.cache_size * 2:
+            self._raw_index.popitem(last=False)
+        return code
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """脚本编译缓存统计"""
+        hits = self.cache_raw_hits + self.cache_normalized_hits
+        total = hits + self.cache_misses
+        return {
+            "entries": len(self._code_cache),
+            "max_size": self.cache_size,
+            "raw_hits": self.cache_raw_hits,
+            "normalized_hits": self.cache_normalized_hits,
+            "misses": self.cache_misses,
+            "evictions": self.cache_evictions,
+            "hit_rate": round(hits / total, 3) if total else None,
+            "time_saved_ms": round(self.cache_time_saved * 1000, 2),
+        }
+    
+    def clear_cache(self):
+        """清空脚本编译缓存"""
+        self._code_cache.clear()
+        self._raw_index.clear()
+    
+    def _get_pool(self) -> ScriptWorkerPool:
+        if self._pool is None:
+            self._pool = ScriptWorkerPool(
+                size=settings.script_workers,
+                warm=settings.script_warm_workers,
+                max_jobs=settings.script_worker_max_jobs,
+                cpu_limit=settings.script_cpu_limit,
+                memory_limit_mb=settings.script_memory_limit_mb
+            )
+        return self._pool
+    
+    async def start(self):
+        """进程隔离模式下预先启动 worker"""
+        if self.isolation == "process":
+            await self._get_pool().start()
+    
+    async def close(self):
+        """关闭 worker 进程"""
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+    
+    def get_worker_stats(self) -> Dict[str, Any]:
+        """worker 进程池统计"""
+        stats = {"isolation": self.isolation}
+        if self._pool is not None:
+            stats.update(self._pool.get_stats())
+        return stats
+    
+    async def execute(self, script: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Execute Python script code
+        
+        The code should define an async function called 'main' that takes 'bot' as parameter:
+        
+        async def main(bot):
+            result = await bot.findBlock('diamond_ore')
+            if result['found']:
+                await bot.goTo(result['x'], result['y'], result['z'])
+            return "Done!"
+        
+        Args:
+            script: The Python code to execute
+            timeout: Execution timeout in seconds (uses default if not provided)
+        """
+        bot_api = BotAPI()
+        effective_timeout = timeout if timeout is not None else self.timeout
+        if self.isolation == "process":
+            return await self._execute_in_worker(script, bot_api, effective_timeout)
+        # 捕获stdout：按执行上下文隔离，并发的脚本和后台任务互不干扰
+        mystdout = start_capture()
         
         try:
             # 创建安全的执行环境
-            safe_globals = {
-                '__builtins__': {
-                    'print': print,
-                    'len': len,
-                    'range': range,
-                    'str': str,
-                    'int': int,
-                    'float': float,
-                    'bool': bool,
-                    'list': list,
-                    'dict': dict,
-                    'tuple': tuple,
-                    'set': set,
-                    'abs': abs,
-                    'min': min,
-                    'max': max,
-                    'sum': sum,
-                    'round': round,
-                    'sorted': sorted,
-                    'enumerate': enumerate,
-                    'zip': zip,
-                    'map': map,
-                    'filter': filter,
-                    'isinstance': isinstance,
-                    'True': True,
-                    'False': False,
-                    'None': None,
-                },
-                'asyncio': asyncio,
-                'bot': bot_api,
-            }
+            safe_globals = script_globals(bot_api)
             
             safe_locals = {}
             
             # 编译并执行代码
-            exec(compile(script, '<script>', 'exec'), safe_globals, safe_locals)
+            exec(self._compile_script(script), safe_globals, safe_locals)
             
             # 检查是否定义了main函数
             if 'main' not in safe_locals:
@@ -876,7 +1007,6 @@ class ScriptExecutor:
             main_func = safe_locals['main']
             
             # 执行main函数，带超时
-            import time
             start_time = time.time()
             try:
                 result = await asyncio.wait_for(
@@ -921,7 +1051,60 @@ class ScriptExecutor:
                 "actions": bot_api.results
             }
         finally:
-            sys.stdout = old_stdout
+            mystdout.close()
+    
+    async def _execute_in_worker(self, script: str, bot_api: BotAPI, timeout: float) -> Dict[str, Any]:
+        """
+        在 worker 进程中执行脚本，bot 调用通过管道转发给本进程的 bot_api
+        
+        脚本即使长时间不 await 也不会阻塞后端事件循环；超时或超出 CPU/内存限制时 worker 被杀掉。
+        返回值格式与进程内执行相同。
+        """
+        try:
+            code = self._compile_script(script)
+        except SyntaxError as e:
+            return {
+                "success": False,
+                "error": f"Syntax error: {str(e)}",
+                "logs": bot_api.logs
+            }
+        
+        start_time = time.time()
+        # bot 调用（包括 useSkill 中的技能代码）在本进程中执行，它们的输出也属于这个脚本
+        local_output = start_capture()
+        try:
+            reply = await self._get_pool().run(marshal.dumps(code), bot_api, timeout)
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Execution error: failed to start script worker: {str(e)}",
+                "logs": bot_api.logs,
+                "actions": bot_api.results
+            }
+        finally:
+            local_output.close()
+        execution_time = time.time() - start_time
+        
+        if reply.get("success"):
+            return {
+                "success": True,
+                "result": reply.get("result"),
+                "output": local_output.getvalue() + reply.get("output", ""),
+                "logs": bot_api.logs,
+                "actions": bot_api.results,
+                "action_count": len(bot_api.results),
+                "execution_time": round(execution_time, 2)
+            }
+        
+        result = {
+            "success": False,
+            "error": reply.get("error", "Execution error"),
+            "logs": bot_api.logs,
+            "actions": bot_api.results
+        }
+        if reply.get("traceback"):
+            result["traceback"] = reply["traceback"]
+        return result
 
 
 # 全局执行器实例，默认超时5分钟
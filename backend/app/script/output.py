@@ -0,0 +1,105 @@
+"""
+Per-script stdout capture for LLM-MC
+
+sys.stdout is replaced once by a thin proxy that looks up the current
+capture in a ContextVar. Each script execution sets its own capture, and
+asyncio tasks inherit the context they were created in, so concurrent
+scripts (and the skills they call) each get only their own output while
+the agent loop, background tasks and uvicorn keep printing to the console.
+"""
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from io import StringIO
+from typing import Iterator, Optional, TextIO
+
+
+class ScriptOutput:
+    """一次脚本执行的输出缓冲"""
+
+    def __init__(self):
+        self._buffer = StringIO()
+        self._token: Optional[Token] = None
+        # 捕获结束后置为 False，之后仍在运行的子任务的输出回到控制台
+        self.active = True
+
+    def write(self, text: str) -> int:
+        return self._buffer.write(text)
+
+    def getvalue(self) -> str:
+        return self._buffer.getvalue()
+
+    def close(self):
+        """结束捕获（必须在调用 start_capture 的同一上下文中调用）"""
+        self.active = False
+        if self._token is not None:
+            _current_output.reset(self._token)
+            self._token = None
+
+
+_current_output: ContextVar[Optional[ScriptOutput]] = ContextVar("script_output", default=None)
+
+
+class _RoutedStdout:
+    """把写入路由到当前上下文的 ScriptOutput，没有捕获时写到原始 stdout"""
+
+    def __init__(self, stream: TextIO):
+        self._stream = stream
+
+    def _target(self):
+        output = _current_output.get()
+        if output is not None and output.active:
+            return output
+        return None
+
+    def write(self, text: str) -> int:
+        output = self._target()
+        if output is not None:
+            return output.write(text)
+        return self._stream.write(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        if self._target() is None:
+            self._stream.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def install():
+    """安装 stdout 代理（可重复调用）"""
+    if not isinstance(sys.stdout, _RoutedStdout):
+        sys.stdout = _RoutedStdout(sys.stdout)
+
+
+def start_capture() -> ScriptOutput:
+    """
+    在当前上下文中开始捕获 print 输出，结束时调用返回对象的 close()
+
+    之后在这个上下文中创建的 asyncio 任务也会写入同一个缓冲。
+    """
+    install()
+    output = ScriptOutput()
+    output._token = _current_output.set(output)
+    return output
+
+
+@contextmanager
+def capture_output() -> Iterator[ScriptOutput]:
+    """
+    start_capture 的上下文管理器形式
+
+    Example:
+        with capture_output() as output:
+            await run_script()
+        text = output.getvalue()
+    """
+    output = start_capture()
+    try:
+        yield output
+    finally:
+        output.close()
@@ -0,0 +1,256 @@
+"""
+Script Worker Pool for LLM-MC
+Keeps pre-started worker processes (app/script/worker.py) and serves their
+bot calls with a BotAPI instance in the backend process
+"""
+import asyncio
+import base64
+import inspect
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Set
+
+
+WORKER_SCRIPT = Path(__file__).resolve().parent / "worker.py"
+
+# 超时后给 worker 自己结束的宽限时间（秒），之后直接杀掉进程
+KILL_GRACE = 1.0
+
+
+class _Worker:
+    """一个 worker 进程"""
+
+    def __init__(self, proc: asyncio.subprocess.Process):
+        self.proc = proc
+        self.pid = proc.pid
+        self.jobs = 0
+
+    @property
+    def alive(self) -> bool:
+        return self.proc.returncode is None
+
+    async def send(self, message: Dict[str, Any]):
+        line = json.dumps(message, ensure_ascii=False, default=str) + "\n"
+        self.proc.stdin.write(line.encode("utf-8"))
+        await self.proc.stdin.drain()
+
+    async def read(self) -> Dict[str, Any]:
+        line = await self.proc.stdout.readline()
+        if not line:
+            raise EOFError("worker exited")
+        return json.loads(line)
+
+    async def kill(self):
+        if self.alive:
+            self.proc.kill()
+        await self.proc.wait()
+
+
+class ScriptWorkerPool:
+    """
+    脚本 worker 进程池
+
+    - 预先启动 warm 个 worker，避免每次执行都付出 Python 启动开销
+    - 同时最多 size 个脚本在 worker 中运行
+    - 超时、崩溃或超出 CPU/内存限制的 worker 会被杀掉并在后台补充
+    - 每个 worker 最多执行 max_jobs 个脚本后退役，防止状态累积
+    """
+
+    def __init__(
+        self,
+        size: int = 4,
+        warm: int = 2,
+        max_jobs: int = 100,
+        cpu_limit: Optional[float] = None,
+        memory_limit_mb: Optional[int] = None
+    ):
+        self.size = max(1, size)
+        self.warm = min(max(0, warm), self.size)
+        self.max_jobs = max_jobs
+        self.cpu_limit = cpu_limit
+        self.memory_limit_mb = memory_limit_mb
+
+        self._idle: List[_Worker] = []
+        self._busy: Set[_Worker] = set()
+        self._slots = asyncio.Semaphore(self.size)
+        self._warming: Optional[asyncio.Task] = None
+        self._job_ids = 0
+        self._closed = False
+
+        # 统计
+        self.spawned = 0
+        self.killed = 0
+        self.jobs = 0
+        self.timeouts = 0
+        self.crashes = 0
+        self.cold_starts = 0
+
+    # ========== 进程管理 ==========
+
+    async def _spawn(self) -> _Worker:
+        args = [sys.executable, str(WORKER_SCRIPT)]
+        if self.memory_limit_mb:
+            args += ["--memory-limit", str(self.memory_limit_mb)]
+        proc = await asyncio.create_subprocess_exec(
+            *args,
+            cwd=str(WORKER_SCRIPT.parent),
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            env={**os.environ, "PYTHONIOENCODING": "utf-8"},
+        )
+        worker = _Worker(proc)
+        try:
+            ready = await asyncio.wait_for(worker.read(), timeout=30.0)
+        except BaseException:
+            await worker.kill()
+            raise
+        if ready.get("type") != "ready":
+            await worker.kill()
+            raise RuntimeError(f"Unexpected worker handshake: {ready}")
+        self.spawned += 1
+        return worker
+
+    async def start(self):
+        """预先启动 warm 个 worker"""
+        await self._fill_warm()
+
+    async def _fill_warm(self):
+        while not self._closed and len(self._idle) + len(self._busy) < self.warm:
+            try:
+                self._idle.append(await self._spawn())
+            except Exception as e:
+                print(f"[ScriptPool] Failed to start worker: {e}")
+                return
+
+    def _schedule_warm(self):
+        if self._closed or (self._warming and not self._warming.done()):
+            return
+        self._warming = asyncio.create_task(self._fill_warm())
+
+    async def _retire(self, worker: _Worker):
+        self.killed += 1
+        await worker.kill()
+
+    async def close(self):
+        """关闭所有 worker"""
+        self._closed = True
+        if self._warming:
+            self._warming.cancel()
+        workers = self._idle + list(self._busy)
+        self._idle.clear()
+        for worker in workers:
+            try:
+                await worker.send({"type": "exit"})
+                await asyncio.wait_for(worker.proc.wait(), timeout=1.0)
+            except Exception:
+                pass
+            await worker.kill()
+
+    # ========== 执行 ==========
+
+    async def run(self, code: bytes, bot_api: Any, timeout: float) -> Dict[str, Any]:
+        """
+        在 worker 中执行编译好的脚本（marshal 序列化的 code 对象）
+
+        Returns:
+            worker 的 done 消息（success / result / output / error / traceback / timed_out）
+        """
+        async with self._slots:
+            if self._idle:
+                worker = self._idle.pop()
+            else:
+                self.cold_starts += 1
+                worker = await self._spawn()
+            self._busy.add(worker)
+            self._job_ids += 1
+            self.jobs += 1
+            worker.jobs += 1
+            job = {
+                "type": "run",
+                "job": self._job_ids,
+                "code": base64.b64encode(code).decode("ascii"),
+                "timeout": timeout,
+                "cpu_limit": self.cpu_limit,
+            }
+
+            healthy = False
+            try:
+                reply = await asyncio.wait_for(self._drive(worker, job, bot_api), timeout=timeout + KILL_GRACE)
+                healthy = True
+                return reply
+            except asyncio.TimeoutError:
+                # 脚本没有让出控制权，worker 自己的超时无法生效
+                self.timeouts += 1
+                return {"success": False, "timed_out": True,
+                        "error": f"Script execution timed out after {timeout} seconds"}
+            except (EOFError, ConnectionError, json.JSONDecodeError):
+                self.crashes += 1
+                await worker.proc.wait()
+                return {"success": False,
+                        "error": f"Script worker exited unexpectedly (exit code {worker.proc.returncode}); "
+                                 f"the script may have exceeded its CPU or memory limit"}
+            finally:
+                self._busy.discard(worker)
+                if healthy and worker.alive and worker.jobs < self.max_jobs and not self._closed:
+                    self._idle.append(worker)
+                else:
+                    await self._retire(worker)
+                self._schedule_warm()
+
+    async def _drive(self, worker: _Worker, job: Dict[str, Any], bot_api: Any) -> Dict[str, Any]:
+        await worker.send(job)
+        calls: Set[asyncio.Task] = set()
+        try:
+            while True:
+                message = await worker.read()
+                kind = message.get("type")
+                if kind == "call":
+                    # 脚本可能并发发起多个调用（asyncio.gather），每个调用单独处理
+                    task = asyncio.create_task(self._handle_call(worker, bot_api, message))
+                    calls.add(task)
+                    task.add_done_callback(calls.discard)
+                elif kind == "log":
+                    bot_api.logs.append(message.get("message", ""))
+                elif kind == "done":
+                    return message
+        finally:
+            for task in calls:
+                task.cancel()
+
+    async def _handle_call(self, worker: _Worker, bot_api: Any, message: Dict[str, Any]):
+        name = message.get("method", "")
+        reply: Dict[str, Any] = {"type": "reply", "id": message.get("id")}
+        try:
+            method = getattr(bot_api, name, None) if not name.startswith("_") else None
+            if method is None or not callable(method):
+                raise AttributeError(f"BotAPI has no method '{name}'")
+            result = method(*message.get("args", []), **message.get("kwargs", {}))
+            if inspect.isawaitable(result):
+                result = await result
+            reply["result"] = result
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            reply["error"] = str(e)
+        try:
+            await worker.send(reply)
+        except Exception:
+            pass  # worker 已经退出
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.size,
+            "warm": self.warm,
+            "idle": len(self._idle),
+            "busy": len(self._busy),
+            "jobs": self.jobs,
+            "cold_starts": self.cold_starts,
+            "spawned": self.spawned,
+            "killed": self.killed,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+            "cpu_limit": self.cpu_limit,
+            "memory_limit_mb": self.memory_limit_mb,
+        }
@@ -0,0 +1,45 @@
+"""
+Script sandbox globals for LLM-MC
+Shared by the in-process executor and the isolated worker processes
+"""
+import asyncio
+from typing import Any, Dict
+
+
+# 脚本中可用的内置函数
+SCRIPT_BUILTINS: Dict[str, Any] = {
+    'print': print,
+    'len': len,
+    'range': range,
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': bool,
+    'list': list,
+    'dict': dict,
+    'tuple': tuple,
+    'set': set,
+    'abs': abs,
+    'min': min,
+    'max': max,
+    'sum': sum,
+    'round': round,
+    'sorted': sorted,
+    'enumerate': enumerate,
+    'zip': zip,
+    'map': map,
+    'filter': filter,
+    'isinstance': isinstance,
+    'True': True,
+    'False': False,
+    'None': None,
+}
+
+
+def script_globals(bot: Any) -> Dict[str, Any]:
+    """创建脚本的执行环境"""
+    return {
+        '__builtins__': dict(SCRIPT_BUILTINS),
+        'asyncio': asyncio,
+        'bot': bot,
+    }
@@ -0,0 +1,250 @@
+"""
+Script Worker Process for LLM-MC
+
+Runs LLM-authored scripts outside the backend process, so a script that
+spins without awaiting cannot freeze the backend's event loop.
+
+The parent talks to the worker with JSON lines over stdin/stdout:
+    worker -> parent  {"type": "ready", "pid": ...}
+    parent -> worker  {"type": "run", "job": id, "code": base64(marshal(code)), "timeout": s, "cpu_limit": s}
+    worker -> parent  {"type": "call", "id": n, "method": "goTo", "args": [...], "kwargs": {...}}
+    parent -> worker  {"type": "reply", "id": n, "result": ...} / {"type": "reply", "id": n, "error": "..."}
+    worker -> parent  {"type": "log", "message": "..."}
+    worker -> parent  {"type": "done", "job": id, "success": bool, "result"/"error"/"traceback": ..., "output": "..."}
+
+Usage (started by ScriptWorkerPool as a plain file, so the worker does not
+import the whole app package):
+    python app/script/worker.py [--memory-limit MB]
+"""
+import argparse
+import asyncio
+import base64
+import io
+import itertools
+import json
+import marshal
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Any, Dict, Optional
+
+if __package__:
+    from app.script.sandbox import script_globals
+else:
+    from sandbox import script_globals
+
+try:
+    import resource
+except ImportError:  # Windows：没有 rlimit，只保留墙钟超时
+    resource = None
+
+
+# 同步方法（脚本中不 await），调用时阻塞等待父进程回复
+SYNC_METHODS = {"listSkills", "getSkill", "saveSkill", "deleteSkill"}
+
+
+class Channel:
+    """与父进程之间的 JSON 行通道"""
+
+    def __init__(self, out):
+        self._out = out
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Any] = {}
+
+    def send(self, message: Dict[str, Any]):
+        line = json.dumps(message, ensure_ascii=False, default=str)
+        with self._lock:
+            self._out.write(line + "\n")
+            self._out.flush()
+
+    async def call(self, method: str, args: tuple, kwargs: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        call_id = next(self._ids)
+        self._pending[call_id] = (loop, future)
+        self.send({"type": "call", "id": call_id, "method": method, "args": list(args), "kwargs": kwargs})
+        return self._unwrap(await future)
+
+    def call_sync(self, method: str, args: tuple, kwargs: Dict[str, Any], timeout: float = 30.0) -> Any:
+        done = threading.Event()
+        box: Dict[str, Any] = {}
+        call_id = next(self._ids)
+        self._pending[call_id] = (None, (done, box))
+        self.send({"type": "call", "id": call_id, "method": method, "args": list(args), "kwargs": kwargs})
+        if not done.wait(timeout):
+            self._pending.pop(call_id, None)
+            raise TimeoutError(f"{method} timed out")
+        return self._unwrap(box["reply"])
+
+    def resolve(self, message: Dict[str, Any]):
+        """由读取线程调用"""
+        entry = self._pending.pop(message.get("id"), None)
+        if entry is None:
+            return
+        loop, target = entry
+        if loop is None:
+            done, box = target
+            box["reply"] = message
+            done.set()
+        else:
+            loop.call_soon_threadsafe(lambda: target.done() or target.set_result(message))
+
+    @staticmethod
+    def _unwrap(reply: Dict[str, Any]) -> Any:
+        if "error" in reply:
+            raise Exception(reply["error"])
+        return reply.get("result")
+
+
+class WorkerBotAPI:
+    """
+    脚本看到的 bot 对象：方法调用转发给父进程中的 BotAPI 执行
+
+    过滤函数无法跨进程传递，waitForEvent 的 filter_func 在本进程中检查。
+    """
+
+    def __init__(self, channel: Channel):
+        self._channel = channel
+        self.logs = []
+
+    def log(self, message: str):
+        """记录日志"""
+        self.logs.append(str(message))
+        print(f"[Script] {message}")
+        self._channel.send({"type": "log", "message": str(message)})
+
+    async def waitForEvent(self, event_type: str, filter_func=None, timeout: float = 30.0,
+                           match: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """等待特定类型的游戏事件（filter_func 在本进程中检查）"""
+        if match is not None:
+            match = {k: list(v) if isinstance(v, (set, frozenset, tuple)) else v for k, v in match.items()}
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            event = await self._channel.call("waitForEvent", (event_type,), {"timeout": remaining, "match": match})
+            if event is None or filter_func is None or filter_func(event):
+                return event
+
+    def __getattr__(self, name: str):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        channel = self._channel
+        if name in SYNC_METHODS:
+            def sync_method(*args, **kwargs):
+                return channel.call_sync(name, args, kwargs)
+            return sync_method
+
+        async def method(*args, **kwargs):
+            return await channel.call(name, args, kwargs)
+        return method
+
+
+def _set_cpu_limit(seconds: Optional[float]):
+    """本次任务最多再使用 seconds 秒 CPU，超出时内核发送 SIGXCPU 结束进程"""
+    if resource is None or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    used = usage.ru_utime + usage.ru_stime
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = int(used + seconds) + 1
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _set_memory_limit(megabytes: Optional[int]):
+    if resource is None or not megabytes:
+        return
+    limit = megabytes * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+async def run_job(channel: Channel, message: Dict[str, Any]) -> Dict[str, Any]:
+    """执行一个脚本，返回 done 消息"""
+    job = message.get("job")
+    output = io.StringIO()
+    sys.stdout = output
+    bot = WorkerBotAPI(channel)
+    _set_cpu_limit(message.get("cpu_limit"))
+    timeout = message.get("timeout") or 300.0
+
+    try:
+        code = marshal.loads(base64.b64decode(message["code"]))
+        safe_globals = script_globals(bot)
+        safe_locals: Dict[str, Any] = {}
+        exec(code, safe_globals, safe_locals)
+
+        if 'main' not in safe_locals:
+            return {"type": "done", "job": job, "success": False,
+                    "error": "Script must define an async function 'main(bot)'"}
+
+        try:
+            result = await asyncio.wait_for(safe_locals['main'](bot), timeout=timeout)
+        except asyncio.TimeoutError:
+            return {"type": "done", "job": job, "success": False, "timed_out": True,
+                    "error": f"Script execution timed out after {timeout} seconds"}
+
+        return {"type": "done", "job": job, "success": True, "result": result, "output": output.getvalue()}
+
+    except MemoryError:
+        return {"type": "done", "job": job, "success": False,
+                "error": "Execution error: script exceeded the memory limit"}
+    except Exception as e:
+        return {"type": "done", "job": job, "success": False,
+                "error": f"Execution error: {str(e)}", "traceback": traceback.format_exc()}
+    finally:
+        sys.stdout = sys.__stderr__
+
+
+def _reader(stdin, channel: Channel, loop: asyncio.AbstractEventLoop, jobs: asyncio.Queue):
+    """读取线程：回复直接交给通道，任务放进队列"""
+    for line in stdin:
+        try:
+            message = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if message.get("type") == "reply":
+            channel.resolve(message)
+        else:
+            try:
+                loop.call_soon_threadsafe(jobs.put_nowait, message)
+            except RuntimeError:  # 事件循环已关闭
+                return
+    try:
+        loop.call_soon_threadsafe(jobs.put_nowait, None)
+    except RuntimeError:
+        pass
+
+
+async def main(memory_limit: Optional[int] = None):
+    # 协议使用原始 stdout；fd 1 重定向到 stderr，避免脚本或库的输出混入协议
+    proto_out = io.TextIOWrapper(os.fdopen(os.dup(1), "wb"), encoding="utf-8")
+    os.dup2(2, 1)
+    sys.stdout = sys.__stderr__
+    stdin = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8")
+
+    _set_memory_limit(memory_limit)
+    channel = Channel(proto_out)
+    jobs: asyncio.Queue = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=_reader, args=(stdin, channel, loop, jobs), daemon=True).start()
+
+    channel.send({"type": "ready", "pid": os.getpid()})
+    while True:
+        message = await jobs.get()
+        if message is None or message.get("type") == "exit":
+            break
+        if message.get("type") == "run":
+            channel.send(await run_job(channel, message))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="LLM-MC script worker")
+    parser.add_argument("--memory-limit", type=int, default=None, help="address space limit in MB")
+    args = parser.parse_args()
+    asyncio.run(main(args.memory_limit))
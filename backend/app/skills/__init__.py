@@ -2,5 +2,6 @@
 Skills module for reusable code
 """
 from .manager import SkillManager, skill_manager
+from .cache import SkillCache, skill_cache
 
-__all__ = ['SkillManager', 'skill_manager']
\ No newline at end of file
+__all__ = ['SkillManager', 'skill_manager', 'SkillCache', 'skill_cache']
\ No newline at end of file
@@ -0,0 +1,126 @@
+"""
+Compiled Skill Cache - 缓存编译后的技能代码和函数对象
+
+技能文件只有在内容变化时才重新读取和编译：
+- 先比较文件的 mtime 和大小，没变则直接命中（只有一次 stat）
+- mtime 变了再比较内容哈希，内容相同只更新 mtime
+- save_skill / delete_skill / 重新加载索引时通过 SkillManager 的监听器失效
+"""
+
+import hashlib
+from typing import Any, Callable, Dict, Optional
+from types import CodeType
+
+from .manager import SkillManager, skill_manager
+
+
+class CompiledSkill:
+    """一个已编译的技能"""
+
+    __slots__ = ("name", "digest", "mtime_ns", "size", "code", "namespace", "func")
+
+    def __init__(self, name: str, digest: str, mtime_ns: int, size: int,
+                 code: CodeType, namespace: Dict[str, Any], func: Optional[Callable]):
+        self.name = name
+        self.digest = digest
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.code = code
+        self.namespace = namespace
+        self.func = func  # 技能函数，技能文件没有定义同名函数时为 None
+
+
+class SkillCache:
+    """进程级的技能编译缓存"""
+
+    def __init__(self, manager: SkillManager):
+        self.manager = manager
+        self._entries: Dict[str, CompiledSkill] = {}
+
+        # 统计
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0  # mtime 变了但内容没变
+        self.invalidations = 0
+
+        manager.add_listener(self._on_skill_event)
+
+    def load(self, name: str, build_globals: Callable[[], Dict[str, Any]]) -> Optional[CompiledSkill]:
+        """
+        获取编译好的技能
+
+        同一个技能的多次调用共享同一个模块命名空间（和 import 的模块一样），
+        模块级变量在调用之间保留，内容变化后重新执行。
+
+        Args:
+            name: 技能名称
+            build_globals: 生成技能执行环境的函数，只在需要重新执行模块代码时调用
+
+        Returns:
+            编译好的技能，技能不存在时返回 None
+
+        Raises:
+            SyntaxError 等：技能代码无法编译或模块代码执行出错（不会被缓存）
+        """
+        path = self.manager.get_skill_file(name)
+        if path is None:
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            self._entries.pop(name, None)
+            return None
+
+        entry = self._entries.get(name)
+        if entry is not None and entry.mtime_ns == stat.st_mtime_ns and entry.size == stat.st_size:
+            self.hits += 1
+            return entry
+
+        with open(path, 'r', encoding='utf-8') as f:
+            source = f.read()
+        digest = hashlib.sha1(source.encode('utf-8')).hexdigest()
+        if entry is not None and entry.digest == digest:
+            entry.mtime_ns = stat.st_mtime_ns
+            entry.size = stat.st_size
+            self.hits += 1
+            self.revalidations += 1
+            return entry
+
+        self.misses += 1
+        code = compile(source, f'<skill:{name}>', 'exec')
+        # 使用单一命名空间执行技能代码，确保模块级定义（helper 函数等）
+        # 可被技能函数正常访问
+        namespace = build_globals()
+        exec(code, namespace, namespace)
+        func = namespace.get(self.manager._safe_func_name(name))
+        entry = CompiledSkill(name, digest, stat.st_mtime_ns, stat.st_size, code, namespace, func)
+        self._entries[name] = entry
+        return entry
+
+    def invalidate(self, name: Optional[str] = None):
+        """使某个技能（不传则全部）的缓存失效"""
+        if name is None:
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+        elif self._entries.pop(name, None) is not None:
+            self.invalidations += 1
+
+    def _on_skill_event(self, event: str, name: Optional[str]):
+        self.invalidate(None if event == "reloaded" else name)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """缓存命中统计"""
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "skills": sorted(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 3) if total else None,
+            "revalidations": self.revalidations,
+            "invalidations": self.invalidations,
+        }
+
+
+# 全局技能编译缓存
+skill_cache = SkillCache(skill_manager)
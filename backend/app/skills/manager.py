@@ -13,9 +13,11 @@ Skill Manager - 管理可复用的技能代码
 import os
 import json
 import re
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from pathlib import Path
 
+from app.task.manager import RESOURCES
+
 
 class SkillManager:
     """技能管理器 - 保存、加载、执行技能"""
@@ -41,6 +43,12 @@ class SkillManager:
         # 内存中的技能索引
         self._index: Dict[str, dict] = {}
         
+        # 索引版本号：每次技能增删改时递增，供提示词缓存等判断是否需要重新渲染
+        self.version = 0
+        
+        # 技能变更监听器：callback(event, name)，event 为 saved / deleted / reloaded
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+        
         # 加载索引
         self._load_index()
     
@@ -55,6 +63,25 @@ class SkillManager:
                 self._index = {}
         else:
             self._index = {}
+        self.version += 1
+        self._notify("reloaded", None)
+    
+    def add_listener(self, callback: Callable[[str, Optional[str]], None]):
+        """注册技能变更监听器"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[str, Optional[str]], None]):
+        """移除技能变更监听器"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _notify(self, event: str, name: Optional[str]):
+        for callback in list(self._listeners):
+            try:
+                callback(event, name)
+            except Exception as e:
+                print(f"[SkillManager] 监听器出错: {e}")
     
     def _save_index(self):
         """保存技能索引到文件"""
@@ -71,7 +98,7 @@ class SkillManager:
         return self.skills_dir / f"{safe_name}.py"
     
     def save_skill(self, name: str, description: str, code: str, 
-                   params: List[str] = None) -> dict:
+                   params: List[str] = None, resources: List[str] = None) -> dict:
         """
         保存技能
         
@@ -80,6 +107,8 @@ class SkillManager:
             description: 技能描述
             code: 技能代码（Python函数体）
             params: 参数列表
+            resources: 作为后台任务运行时占用的资源（movement / inventory / hands / chat），
+                       不填则使用默认值
             
         Returns:
             保存结果
@@ -92,6 +121,15 @@ class SkillManager:
         
         name = name.strip()
         
+        # 验证资源名，避免保存后每次启动任务都失败
+        if resources is not None:
+            unknown = sorted(set(resources) - set(RESOURCES))
+            if unknown:
+                return {
+                    "success": False,
+                    "error": f"未知的资源: {', '.join(unknown)}，可用资源: {', '.join(RESOURCES)}"
+                }
+        
         # 生成完整的函数代码
         param_str = ", ".join(params) if params else ""
         full_code = self._wrap_skill_code(name, description, code, param_str)
@@ -111,7 +149,11 @@ class SkillManager:
             "params": params,
             "file": skill_file.name
         }
+        if resources is not None:
+            self._index[name]["resources"] = list(resources)
+        self.version += 1
         self._save_index()
+        self._notify("saved", name)
         
         return {
             "success": True, 
@@ -188,6 +230,20 @@ async def {self._safe_func_name(name)}(bot{", " + param_str if param_str else ""
         
         return skill_info
     
+    def get_skill_file(self, name: str) -> Optional[Path]:
+        """
+        获取技能代码文件路径（不读取文件）
+        
+        Args:
+            name: 技能名称
+            
+        Returns:
+            代码文件路径，技能不存在时返回 None
+        """
+        if name not in self._index:
+            return None
+        return self._skill_file(name)
+    
     def get_skill_code(self, name: str) -> Optional[str]:
         """
         获取可直接执行的技能代码
@@ -235,7 +291,9 @@ async def {self._safe_func_name(name)}(bot{", " + param_str if param_str else ""
         
         # 从索引中移除
         del self._index[name]
+        self.version += 1
         self._save_index()
+        self._notify("deleted", name)
         
         return {"success": True, "message": f"技能 '{name}' 已删除"}
     
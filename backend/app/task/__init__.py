@@ -1,3 +1,9 @@
 from app.task.manager import TaskManager, Task, TaskStatus, task_manager
+from app.task.journal import TaskJournal, task_journal
+from app.task.stream import TaskEventStream, task_stream
 
-__all__ = ['TaskManager', 'Task', 'TaskStatus', 'task_manager']
\ No newline at end of file
+__all__ = [
+    'TaskManager', 'Task', 'TaskStatus', 'task_manager',
+    'TaskJournal', 'task_journal',
+    'TaskEventStream', 'task_stream',
+]
\ No newline at end of file
@@ -0,0 +1,218 @@
+"""
+Task Journal for LLM-MC
+
+Append-only JSON-lines journal of task lifecycle events, so background
+tasks survive a backend restart. Each line is one event:
+    {"event": "create", "id": ..., "ts": ..., "name": ..., "resume": {...}, ...}
+    {"event": "queue" | "start" | "progress" | "completed" | "failed" | "cancelled", "id": ..., <changed fields>}
+Replaying the events in order (later fields overwrite earlier ones) gives the
+last known state of every task.
+
+Writes go through a queue to a writer thread that batches them, so the
+event loop never touches the disk. The writer also keeps the folded state
+and periodically rewrites the file as one snapshot line per task.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, List
+
+from app.config import settings
+
+
+# 未结束的任务状态，重启后需要恢复或标记为中断
+ACTIVE_STATUSES = ("pending", "running")
+
+
+def fold_event(state: Dict[str, Dict[str, Any]], event: Dict[str, Any]):
+    """把一条事件合并进任务状态"""
+    task_id = event.get("id")
+    if not task_id:
+        return
+    kind = event.get("event")
+    fields = {k: v for k, v in event.items() if k not in ("event", "id", "ts")}
+    if kind in ("create", "snapshot") or task_id not in state:
+        state[task_id] = {"id": task_id, **fields}
+    else:
+        state[task_id].update(fields)
+
+
+class TaskJournal:
+    """
+    任务日志
+
+    - append() 只把事件放进队列，由写线程批量写入（每 flush_interval 秒或攒够一批）
+    - 写入的事件数超过 compact_every 时压缩为快照，已结束的任务只保留最近 keep_history 个
+    """
+
+    def __init__(
+        self,
+        path: str,
+        flush_interval: float = 0.2,
+        compact_every: int = 1000,
+        keep_history: int = 20,
+        batch_size: int = 256
+    ):
+        self.path = Path(path)
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self.keep_history = keep_history
+        self.batch_size = batch_size
+
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._since_compact = 0
+
+        # 统计
+        self.events_written = 0
+        self.batches = 0
+        self.compactions = 0
+        self.write_errors = 0
+        self.last_write_ms = 0.0
+
+    # ========== 读取 ==========
+
+    def load(self) -> Dict[str, Dict[str, Any]]:
+        """
+        读取并回放日志，返回 任务ID -> 最后状态（阻塞 IO，在 start() 之前调用）
+        """
+        state: Dict[str, Dict[str, Any]] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        fold_event(state, json.loads(line))
+                    except json.JSONDecodeError:
+                        # 崩溃时最后一行可能只写了一半
+                        continue
+        self._state = state
+        self._trim_history()
+        return {task_id: dict(record) for task_id, record in state.items()}
+
+    # ========== 写入 ==========
+
+    def start(self):
+        """启动写线程"""
+        if self._thread is not None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._thread = threading.Thread(target=self._writer, name="task-journal", daemon=True)
+        self._thread.start()
+
+    def append(self, event: str, task_id: str, **fields):
+        """记录一条事件（不阻塞）"""
+        self._queue.put({"event": event, "id": task_id, "ts": round(time.time(), 3), **fields})
+
+    def close(self, timeout: float = 5.0):
+        """写完队列中剩余的事件并停止写线程（阻塞）"""
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _writer(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            self._write(batch)
+            if self._since_compact >= self.compact_every:
+                self._compact()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        start = time.perf_counter()
+        lines = []
+        for event in batch:
+            fold_event(self._state, event)
+            lines.append(json.dumps(event, ensure_ascii=False, default=str))
+        try:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except OSError as e:
+            self.write_errors += 1
+            print(f"[TaskJournal] 写入失败: {e}")
+            return
+        self.events_written += len(batch)
+        self.batches += 1
+        self._since_compact += len(batch)
+        self.last_write_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    def _trim_history(self):
+        """已结束的任务只保留最近 keep_history 个"""
+        finished = [r for r in self._state.values() if r.get("status") not in ACTIVE_STATUSES]
+        if len(finished) <= self.keep_history:
+            return
+        finished.sort(key=lambda r: r.get("completed_at") or 0)
+        for record in finished[:-self.keep_history]:
+            del self._state[record["id"]]
+
+    def _compact(self):
+        """把日志重写为每个任务一行快照"""
+        self._trim_history()
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                for record in self._state.values():
+                    event = {"event": "snapshot", **record}
+                    f.write(json.dumps(event, ensure_ascii=False, default=str) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            self.write_errors += 1
+            print(f"[TaskJournal] 压缩失败: {e}")
+            return
+        self._since_compact = 0
+        self.compactions += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "path": str(self.path),
+            "queued": self._queue.qsize(),
+            "events_written": self.events_written,
+            "batches": self.batches,
+            "compactions": self.compactions,
+            "write_errors": self.write_errors,
+            "last_write_ms": self.last_write_ms,
+            "tasks": len(self._state),
+        }
+
+
+def _journal_path() -> Path:
+    path = Path(settings.task_journal_path)
+    if not path.is_absolute():
+        path = Path(__file__).resolve().parent.parent.parent / path
+    return path
+
+
+# 全局任务日志实例
+task_journal = TaskJournal(
+    str(_journal_path()),
+    flush_interval=settings.task_journal_flush_interval,
+    compact_every=settings.task_journal_compact_every
+)
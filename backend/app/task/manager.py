@@ -3,12 +3,25 @@ Task Manager for LLM-MC
 Manages background skill/script execution without blocking LLM decisions
 """
 import asyncio
+import heapq
+import itertools
 import time
 import traceback
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, List, FrozenSet, Iterable
 from enum import Enum
 from dataclasses import dataclass, field
 import uuid
+from collections import deque
+
+from app.config import settings
+from app.task.journal import TaskJournal, ACTIVE_STATUSES
+
+
+# 任务可以声明占用的资源，占用相同资源的任务不会同时运行
+RESOURCES = ("movement", "inventory", "hands", "chat")
+
+# 技能没有在 index.json 中声明 resources 时的默认占用
+DEFAULT_SKILL_RESOURCES = ("movement", "inventory", "hands")
 
 
 class TaskStatus(Enum):
@@ -34,9 +47,19 @@ class Task:
     started_at: Optional[float] = None
     completed_at: Optional[float] = None
     logs: List[str] = field(default_factory=list)
+    priority: int = 0            # 优先级，数字越大越优先
+    resources: FrozenSet[str] = frozenset()  # 占用的资源
+    queued_at: Optional[float] = None  # 最近一次进入等待队列的时间
+    wait_time: float = 0.0       # 累计排队时间（秒）
+    preemptions: int = 0         # 被抢占次数
+    resume: Optional[Dict[str, Any]] = None  # 重启后恢复执行的方式，如 {"skill": 名称, "kwargs": {...}}
     
     # asyncio 任务引用
     _async_task: Optional[asyncio.Task] = field(default=None, repr=False)
+    # 创建协程的工厂（被抢占后重新执行时再次调用）
+    _factory: Optional[Callable[[], Any]] = field(default=None, repr=False)
+    # 正在抢占本任务的任务ID
+    _preempted_by: Optional[str] = field(default=None, repr=False)
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -52,6 +75,11 @@ class Task:
             "started_at": self.started_at,
             "completed_at": self.completed_at,
             "duration": self._get_duration(),
+            "priority": self.priority,
+            "resources": sorted(self.resources),
+            "wait_time": round(self._get_wait_time(), 2),
+            "preemptions": self.preemptions,
+            "resumable": self.resume is not None,
             "logs": self.logs[-10:]  # 只返回最近10条日志
         }
     
@@ -61,6 +89,12 @@ class Task:
             return None
         end_time = self.completed_at or time.time()
         return round(end_time - self.started_at, 2)
+    
+    def _get_wait_time(self) -> float:
+        """获取累计排队时间（包括当前这次排队）"""
+        if self.status == TaskStatus.PENDING and self.queued_at is not None:
+            return self.wait_time + time.time() - self.queued_at
+        return self.wait_time
 
 
 class TaskManager:
@@ -69,6 +103,9 @@ class TaskManager:
     
     功能：
     - 管理后台任务的生命周期
+    - 按优先级调度，同时运行的任务不超过 max_concurrent_tasks
+    - 占用相同资源（movement / inventory / hands / chat）的任务排队执行，
+      高优先级任务会抢占低优先级任务（被抢占的任务回到队列，稍后重新执行）
     - 支持任务状态查询
     - 支持任务取消
     - 提供任务进度更新接口
@@ -76,27 +113,89 @@ class TaskManager:
     
     def __init__(self, max_concurrent_tasks: int = 3):
         self.max_concurrent_tasks = max_concurrent_tasks
-        self._tasks: Dict[str, Task] = {}
-        self._task_history: List[Task] = []  # 已完成的任务历史
+        self._tasks: Dict[str, Task] = {}  # 活跃任务（等待中 / 运行中）
+        # 按状态索引的活跃任务，状态变化时维护，查询时不再扫描 _tasks
+        self._by_status: Dict[TaskStatus, Dict[str, Task]] = {
+            TaskStatus.PENDING: {},
+            TaskStatus.RUNNING: {},
+        }
+        self._queue: List[tuple] = []  # 等待队列（堆）：(-priority, 序号, task_id)
+        self._seq = itertools.count()
+        self._holders: Dict[str, str] = {}  # 资源 -> 占用它的任务ID
+        self.total_preemptions = 0
         self._max_history = 20  # 最多保留20条历史
+        self._task_history: deque = deque(maxlen=self._max_history)  # 已完成的任务历史
+        self._history_index: Dict[str, Task] = {}  # 历史任务ID -> 任务
+        self._listeners: List[Callable[[str, Task], None]] = []  # 任务事件监听器
+        
+        # 任务状态版本号：状态、进度或日志变化时递增，状态摘要按版本缓存
+        self.version = 0
+        self._summary_cache: Optional[Dict[str, Any]] = None
+        self._summary_version = -1
+        self._summary_built_at = 0.0
+        # 有活跃任务时摘要中的已执行/已等待时间会变，缓存最多保留这么久（秒）
+        self._summary_max_age = 1.0
+        
+        # 任务日志（持久化），由 recover() 打开，shutdown() 关闭
+        self._journal: Optional[TaskJournal] = None
+        self._change_listeners: List[Callable[[str, Task, Dict[str, Any]], None]] = []
+    
+    def add_listener(self, callback: Callable[[str, Task], None]):
+        """
+        添加任务事件监听器
+        
+        Args:
+            callback: 回调函数 callback(event, task)，event 为任务结束时的状态值
+                      （completed / failed / cancelled）
+        """
+        self._listeners.append(callback)
+    
+    def remove_listener(self, callback: Callable[[str, Task], None]):
+        """移除任务事件监听器"""
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+    
+    def _notify(self, event: str, task: Task):
+        """通知所有监听器"""
+        for callback in self._listeners:
+            try:
+                callback(event, task)
+            except Exception as e:
+                print(f"[TaskManager] 监听器错误: {e}")
+    
+    def _set_status(self, task: Task, status: TaskStatus):
+        """修改任务状态并维护状态索引"""
+        bucket = self._by_status.get(task.status)
+        if bucket is not None:
+            bucket.pop(task.id, None)
+        task.status = status
+        bucket = self._by_status.get(status)
+        if bucket is not None and task.id in self._tasks:
+            bucket[task.id] = task
+        self.version += 1
     
     @property
     def current_task(self) -> Optional[Task]:
         """获取当前正在运行的主要任务（最新创建的运行中任务）"""
-        running_tasks = [t for t in self._tasks.values() if t.status == TaskStatus.RUNNING]
+        running_tasks = self._by_status[TaskStatus.RUNNING]
         if running_tasks:
-            return max(running_tasks, key=lambda t: t.created_at)
+            return max(running_tasks.values(), key=lambda t: t.created_at)
         return None
     
     @property
     def running_tasks(self) -> List[Task]:
         """获取所有正在运行的任务"""
-        return [t for t in self._tasks.values() if t.status == TaskStatus.RUNNING]
+        return list(self._by_status[TaskStatus.RUNNING].values())
     
     @property
     def pending_tasks(self) -> List[Task]:
         """获取所有等待中的任务"""
-        return [t for t in self._tasks.values() if t.status == TaskStatus.PENDING]
+        return list(self._by_status[TaskStatus.PENDING].values())
+    
+    @property
+    def has_active_tasks(self) -> bool:
+        """是否有等待中或运行中的任务"""
+        return bool(self._tasks)
     
     def create_task(
         self,
@@ -104,96 +203,253 @@ class TaskManager:
         description: str,
         coroutine_func: Callable,
         *args,
+        priority: int = 0,
+        resources: Optional[Iterable[str]] = None,
+        resume: Optional[Dict[str, Any]] = None,
         **kwargs
     ) -> Task:
         """
-        创建并启动一个后台任务
+        创建一个后台任务并放入调度队列
+        
+        资源空闲且未达到并发上限时立即开始执行，否则以 PENDING 状态排队。
         
         Args:
             name: 任务名称
             description: 任务描述
             coroutine_func: 异步函数
             *args, **kwargs: 传递给异步函数的参数
+            priority: 优先级，数字越大越优先；资源冲突时可抢占优先级更低的任务
+            resources: 占用的资源（movement / inventory / hands / chat），默认不占用
+            resume: 后端重启后如何恢复执行，目前支持 {"skill": 技能名, "kwargs": {...}}；
+                    不填则重启后任务被标记为中断
             
         Returns:
             创建的任务对象
         """
+        resources = frozenset(resources or ())
+        unknown = resources - set(RESOURCES)
+        if unknown:
+            raise ValueError(f"未知的资源: {', '.join(sorted(unknown))}，可用资源: {', '.join(RESOURCES)}")
+        
         task_id = str(uuid.uuid4())[:8]
         task = Task(
             id=task_id,
             name=name,
-            description=description
+            description=description,
+            priority=priority,
+            resources=resources,
+            resume=resume
         )
+        self._submit(task, lambda: coroutine_func(*args, **kwargs))
+        return task
+    
+    def _submit(self, task: Task, factory: Callable[[], Any]):
+        """登记任务并放入调度队列"""
+        task._factory = factory
+        self._tasks[task.id] = task
+        self._record_event("create", task, status=task.status.value, name=task.name, description=task.description,
+                            priority=task.priority, resources=sorted(task.resources),
+                            created_at=task.created_at, resume=task.resume)
+        self._enqueue(task)
+        self._schedule()
+    
+    # ========== 调度 ==========
+    
+    def _enqueue(self, task: Task):
+        """放入等待队列"""
+        self._set_status(task, TaskStatus.PENDING)
+        task.queued_at = time.time()
+        heapq.heappush(self._queue, (-task.priority, next(self._seq), task.id))
+        self._record_state("queue", task)
+    
+    def _schedule(self):
+        """
+        按优先级启动可以运行的等待任务
         
-        self._tasks[task_id] = task
-        
-        # 创建包装后的协程
-        async def wrapped_coroutine():
-            try:
-                task.status = TaskStatus.RUNNING
-                task.started_at = time.time()
-                task.progress = "开始执行..."
-                
-                # 执行实际任务
-                result = await coroutine_func(*args, **kwargs)
-                
-                task.status = TaskStatus.COMPLETED
-                task.result = result
-                task.progress = "执行完成"
-                task.completed_at = time.time()
-                
-            except asyncio.CancelledError:
-                task.status = TaskStatus.CANCELLED
-                task.progress = "已取消"
-                task.completed_at = time.time()
-                raise
-                
-            except Exception as e:
-                task.status = TaskStatus.FAILED
-                task.error = str(e)
-                task.progress = f"执行失败: {str(e)[:50]}"
-                task.completed_at = time.time()
-                task.logs.append(f"错误详情: {traceback.format_exc()}")
-                
-            finally:
-                # 移动到历史
-                self._move_to_history(task_id)
+        - 资源被占用时，如果占用者的优先级都更低则抢占它们，否则继续等待
+        - 排队中的高优先级任务会预留它需要的资源，避免被后面的低优先级任务插队
+        """
+        slots = self.max_concurrent_tasks - len(self._by_status[TaskStatus.RUNNING])
+        reserved = set()
+        deferred = []
         
-        # 启动异步任务
-        task._async_task = asyncio.create_task(wrapped_coroutine())
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            task = self._tasks.get(entry[2])
+            if task is None or task.status != TaskStatus.PENDING:
+                continue  # 已取消的任务留下的过期条目
+            
+            holders = {self._holders[r] for r in task.resources if r in self._holders}
+            if not holders and not (task.resources & reserved) and slots > 0:
+                self._start(task)
+                slots -= 1
+                continue
+            
+            deferred.append(entry)
+            reserved |= task.resources
+            if holders:
+                victims = [self._tasks[h] for h in holders if h in self._tasks]
+                if victims and all(v.priority < task.priority for v in victims):
+                    for victim in victims:
+                        self._preempt(victim, task)
         
-        return task
+        for entry in deferred:
+            heapq.heappush(self._queue, entry)
+    
+    def _start(self, task: Task):
+        """占用资源并开始执行"""
+        now = time.time()
+        if task.queued_at is not None:
+            task.wait_time += now - task.queued_at
+            task.queued_at = None
+        for resource in task.resources:
+            self._holders[resource] = task.id
+        self._set_status(task, TaskStatus.RUNNING)
+        task.started_at = now
+        task.progress = "开始执行..."
+        task._async_task = asyncio.create_task(self._run(task), name=f"task:{task.id}:{task.name}")
+        task._async_task.add_done_callback(lambda async_task: self._on_cancelled_before_start(task, async_task))
+        self._record_state("start", task)
+    
+    def _release(self, task: Task):
+        """释放任务占用的资源"""
+        for resource in task.resources:
+            if self._holders.get(resource) == task.id:
+                del self._holders[resource]
+    
+    def _preempt(self, victim: Task, by: Task):
+        """取消低优先级任务，它结束后会回到等待队列"""
+        if victim._preempted_by is not None or victim._async_task is None:
+            return
+        victim._preempted_by = by.id
+        victim._async_task.cancel()
+        print(f"[TaskManager] 任务 {victim.name}({victim.id}) 被 {by.name}({by.id}) 抢占")
+    
+    async def _run(self, task: Task):
+        """执行任务并维护状态"""
+        # 被抢占后重新排队的任务可能在 _requeue_preempted 中立即重新开始，
+        # 此时 task 已属于新一轮执行，不能再按本轮结束处理
+        requeued = False
+        try:
+            # 执行实际任务
+            result = await task._factory()
+            
+            self._set_status(task, TaskStatus.COMPLETED)
+            task.result = result
+            task.progress = "执行完成"
+            task.completed_at = time.time()
+            
+        except asyncio.CancelledError:
+            if task._preempted_by is not None:
+                requeued = True
+                self._requeue_preempted(task)
+                return
+            self._set_status(task, TaskStatus.CANCELLED)
+            task.progress = "已取消"
+            task.completed_at = time.time()
+            raise
+            
+        except Exception as e:
+            self._set_status(task, TaskStatus.FAILED)
+            task.error = str(e)
+            task.progress = f"执行失败: {str(e)[:50]}"
+            task.completed_at = time.time()
+            task.logs.append(f"错误详情: {traceback.format_exc()}")
+            
+        finally:
+            if not requeued:
+                self._finish(task)
+    
+    def _finish(self, task: Task):
+        """任务结束：释放资源、移入历史、通知监听器并调度下一个任务"""
+        self._record_state(task.status.value, task)
+        self._release(task)
+        # 移动到历史
+        self._move_to_history(task.id)
+        self._notify(task.status.value, task)
+        self._schedule()
+    
+    def _requeue_preempted(self, task: Task):
+        """被抢占：释放资源，回到队列等待重新执行"""
+        by = self._tasks.get(task._preempted_by)
+        task._preempted_by = None
+        task.preemptions += 1
+        self.total_preemptions += 1
+        task.progress = f"被 {by.name if by else '其他任务'} 抢占，等待重新执行"
+        task.logs.append(task.progress)
+        self._release(task)
+        self._enqueue(task)
+        self._schedule()
+    
+    def _on_cancelled_before_start(self, task: Task, async_task: asyncio.Task):
+        """协程还没开始执行就被取消时 _run 不会运行，在这里补做清理（可重复调用）"""
+        if not async_task.cancelled() or task._async_task is not async_task or task.status != TaskStatus.RUNNING:
+            return
+        if task._preempted_by is not None:
+            self._requeue_preempted(task)
+            return
+        self._set_status(task, TaskStatus.CANCELLED)
+        task.progress = "已取消"
+        task.completed_at = time.time()
+        self._finish(task)
+    
+    def get_wait_reason(self, task: Task) -> str:
+        """等待中的任务为什么还没有开始"""
+        holders = {self._holders[r] for r in task.resources if r in self._holders}
+        if holders:
+            names = [self._tasks[h].name for h in holders if h in self._tasks]
+            return f"等待 {', '.join(names)} 释放资源"
+        if len(self._by_status[TaskStatus.RUNNING]) >= self.max_concurrent_tasks:
+            return "并发任务已满"
+        return "等待更高优先级的任务"
     
     def _move_to_history(self, task_id: str):
         """将任务移动到历史记录"""
-        if task_id in self._tasks:
-            task = self._tasks.pop(task_id)
-            self._task_history.append(task)
-            
-            # 限制历史数量
-            if len(self._task_history) > self._max_history:
-                self._task_history = self._task_history[-self._max_history:]
+        task = self._tasks.pop(task_id, None)
+        if task is None:
+            return
+        for bucket in self._by_status.values():
+            bucket.pop(task_id, None)
+        self._add_history(task)
+    
+    def _add_history(self, task: Task):
+        # 限制历史数量：deque 满时最旧的一条被挤出，同时从索引中删除
+        if len(self._task_history) == self._task_history.maxlen:
+            self._history_index.pop(self._task_history[0].id, None)
+        self._task_history.append(task)
+        self._history_index[task.id] = task
+        self.version += 1
     
     def get_task(self, task_id: str) -> Optional[Task]:
         """获取任务"""
-        if task_id in self._tasks:
-            return self._tasks[task_id]
-        # 在历史中查找
-        for task in self._task_history:
-            if task.id == task_id:
+        task = self._tasks.get(task_id)
+        if task is None:
+            task = self._history_index.get(task_id)
+        return task
+    
+    def find_by_async_task(self, async_task: asyncio.Task) -> Optional[Task]:
+        """根据 asyncio 任务查找对应的任务（用于事件循环阻塞归因，可在其他线程调用）"""
+        for task in list(self._by_status[TaskStatus.RUNNING].values()):
+            if task._async_task is async_task:
                 return task
         return None
     
     def update_progress(self, task_id: str, progress: str):
         """更新任务进度"""
-        if task_id in self._tasks:
-            self._tasks[task_id].progress = progress
-            self._tasks[task_id].logs.append(progress)
+        task = self._tasks.get(task_id)
+        if task is not None:
+            task.progress = progress
+            task.logs.append(progress)
+            self.version += 1
+            self._record_event("progress", task, progress=progress)
     
     def add_log(self, task_id: str, log: str):
         """添加任务日志"""
-        if task_id in self._tasks:
-            self._tasks[task_id].logs.append(log)
+        task = self._tasks.get(task_id)
+        if task is not None:
+            task.logs.append(log)
+            self.version += 1
+            self._record_event("log", task, persist=False, log=log)
     
     async def cancel_task(self, task_id: str) -> bool:
         """
@@ -206,20 +462,36 @@ class TaskManager:
             return False
         
         task = self._tasks[task_id]
+        if task.status == TaskStatus.PENDING:
+            # 还在队列中：直接标记取消，队列中的条目会在调度时被跳过
+            self._set_status(task, TaskStatus.CANCELLED)
+            task.progress = "已取消"
+            task.completed_at = time.time()
+            if task.queued_at is not None:
+                task.wait_time += task.completed_at - task.queued_at
+                task.queued_at = None
+            self._finish(task)
+            return True
+        
         if task.status != TaskStatus.RUNNING:
             return False
         
+        # 正在被抢占的任务也按取消处理，不再回到队列
+        task._preempted_by = None
         if task._async_task:
             task._async_task.cancel()
             try:
                 await task._async_task
             except asyncio.CancelledError:
                 pass
+            self._on_cancelled_before_start(task, task._async_task)
         
         return True
     
     async def cancel_all_tasks(self):
-        """取消所有正在运行的任务"""
+        """取消所有任务（先取消等待中的，避免运行中的任务结束后它们被启动）"""
+        for task in self.pending_tasks:
+            await self.cancel_task(task.id)
         for task_id in list(self._tasks.keys()):
             await self.cancel_task(task_id)
     
@@ -227,9 +499,22 @@ class TaskManager:
         """
         获取任务状态摘要（用于 LLM 提示词）
         
+        结果按 version 缓存：任务状态没有变化时直接返回缓存（调用方不要修改它）；
+        有活跃任务时最多每 _summary_max_age 秒重建一次，刷新已执行/已等待时间。
+        
         Returns:
             包含当前任务状态的摘要信息
         """
+        if (self._summary_cache is not None and self._summary_version == self.version and
+                (not self._tasks or time.monotonic() - self._summary_built_at < self._summary_max_age)):
+            return self._summary_cache
+        
+        self._summary_cache = self._build_status_summary()
+        self._summary_version = self.version
+        self._summary_built_at = time.monotonic()
+        return self._summary_cache
+    
+    def _build_status_summary(self) -> Dict[str, Any]:
         running = self.running_tasks
         pending = self.pending_tasks
         
@@ -247,8 +532,10 @@ class TaskManager:
                 f"[运行中] {task.name}: {task.progress} (已执行 {duration}秒)"
             )
         
-        for task in pending:
-            summaries.append(f"[等待中] {task.name}")
+        for task in sorted(pending, key=lambda t: (-t.priority, t.queued_at or 0)):
+            summaries.append(
+                f"[等待中] {task.name}: {self.get_wait_reason(task)} (已等待 {task._get_wait_time():.0f}秒)"
+            )
         
         return {
             "has_active_tasks": True,
@@ -258,11 +545,163 @@ class TaskManager:
             "tasks": [t.to_dict() for t in running + pending]
         }
     
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """调度器状态：并发、资源占用、排队时间和抢占次数"""
+        running = self.running_tasks
+        pending = self.pending_tasks
+        finished = [t for t in self._task_history if t.started_at is not None]
+        return {
+            "max_concurrent_tasks": self.max_concurrent_tasks,
+            "running": len(running),
+            "pending": len(pending),
+            "resources": {
+                r: {"task_id": tid, "task_name": self._tasks[tid].name}
+                for r, tid in self._holders.items() if tid in self._tasks
+            },
+            "total_preemptions": self.total_preemptions,
+            "avg_wait_time": round(sum(t.wait_time for t in finished) / len(finished), 2) if finished else None,
+            "queue": [
+                {"id": t.id, "name": t.name, "priority": t.priority,
+                 "wait_time": round(t._get_wait_time(), 2), "preemptions": t.preemptions,
+                 "reason": self.get_wait_reason(t)}
+                for t in sorted(pending, key=lambda t: (-t.priority, t.queued_at or 0))
+            ],
+        }
+    
+    # ========== 变更记录（持久化 / 推送） ==========
+    
+    def add_change_listener(self, callback: Callable[[str, Task, Dict[str, Any]], None]):
+        """
+        添加任务变更监听器（创建、排队、开始、进度、日志、结束）
+        
+        Args:
+            callback: 回调函数 callback(event, task, fields)，fields 为本次变更的字段
+        """
+        self._change_listeners.append(callback)
+    
+    def remove_change_listener(self, callback: Callable[[str, Task, Dict[str, Any]], None]):
+        """移除任务变更监听器"""
+        if callback in self._change_listeners:
+            self._change_listeners.remove(callback)
+    
+    def _record_event(self, event: str, task: Task, persist: bool = True, **fields):
+        """写入任务日志并通知变更监听器"""
+        if persist and self._journal is not None:
+            self._journal.append(event, task.id, **fields)
+        for callback in self._change_listeners:
+            try:
+                callback(event, task, fields)
+            except Exception as e:
+                print(f"[TaskManager] 变更监听器错误: {e}")
+    
+    def _record_state(self, event: str, task: Task):
+        """记录任务的可变状态"""
+        if self._journal is None and not self._change_listeners:
+            return
+        result = task.result
+        if result is not None and not isinstance(result, (str, int, float, bool, dict, list)):
+            result = str(result)
+        self._record_event(
+            event, task,
+            status=task.status.value,
+            progress=task.progress,
+            started_at=task.started_at,
+            completed_at=task.completed_at,
+            error=task.error,
+            result=result,
+            wait_time=round(task.wait_time, 3),
+            preemptions=task.preemptions
+        )
+    
+    async def recover(self, journal: TaskJournal,
+                      start_skill: Callable[[str, Dict[str, Any]], Any]) -> Dict[str, int]:
+        """
+        回放任务日志并开始记录新的事件
+        
+        - 重启前未结束、且可恢复（resume 为技能调用）的任务以原ID重新排队执行
+        - 其余未结束的任务标记为失败（后端重启中断）
+        - 已结束的任务恢复到历史记录
+        
+        Args:
+            journal: 任务日志
+            start_skill: start_skill(技能名, 参数) 返回执行技能的协程
+            
+        Returns:
+            {"resumed": 恢复执行数, "interrupted": 中断数, "history": 恢复的历史数}
+        """
+        records = await asyncio.to_thread(journal.load)
+        journal.start()
+        self._journal = journal
+        
+        stats = {"resumed": 0, "interrupted": 0, "history": 0}
+        for record in sorted(records.values(), key=lambda r: r.get("created_at") or 0):
+            if record["id"] in self._tasks or record["id"] in self._history_index:
+                continue
+            task = Task(
+                id=record["id"],
+                name=record.get("name", record["id"]),
+                description=record.get("description", ""),
+                progress=record.get("progress", ""),
+                result=record.get("result"),
+                error=record.get("error"),
+                created_at=record.get("created_at") or time.time(),
+                started_at=record.get("started_at"),
+                completed_at=record.get("completed_at"),
+                priority=record.get("priority", 0),
+                resources=frozenset(record.get("resources") or ()),
+                wait_time=record.get("wait_time", 0.0),
+                preemptions=record.get("preemptions", 0),
+                resume=record.get("resume")
+            )
+            
+            if record.get("status") not in ACTIVE_STATUSES:
+                try:
+                    task.status = TaskStatus(record.get("status"))
+                except ValueError:
+                    task.status = TaskStatus.FAILED
+                self._add_history(task)
+                stats["history"] += 1
+                continue
+            
+            skill = (task.resume or {}).get("skill")
+            if skill:
+                kwargs = (task.resume or {}).get("kwargs") or {}
+                task.logs.append("后端重启后恢复执行")
+                self._submit(task, lambda skill=skill, kwargs=kwargs: start_skill(skill, kwargs))
+                stats["resumed"] += 1
+            else:
+                task.status = TaskStatus.FAILED
+                task.error = "后端重启，任务中断"
+                task.progress = "已中断"
+                task.completed_at = time.time()
+                self._record_state(task.status.value, task)
+                self._add_history(task)
+                stats["interrupted"] += 1
+        
+        if stats["resumed"] or stats["interrupted"]:
+            print(f"[TaskManager] 从任务日志恢复: {stats['resumed']} 个任务重新执行, "
+                  f"{stats['interrupted']} 个任务中断")
+        return stats
+    
+    async def shutdown(self):
+        """
+        关闭任务日志（写完剩余事件）
+        
+        在取消任务之前调用：之后的取消不再写入日志，未结束的任务下次启动时会被恢复。
+        """
+        journal, self._journal = self._journal, None
+        if journal is not None:
+            await asyncio.to_thread(journal.close)
+    
+    def get_journal_stats(self) -> Optional[Dict[str, Any]]:
+        """任务日志统计，未启用时返回 None"""
+        return self._journal.get_stats() if self._journal is not None else None
+    
     def get_recent_history(self, limit: int = 5) -> List[Dict[str, Any]]:
         """获取最近的任务历史"""
-        recent = self._task_history[-limit:]
-        return [t.to_dict() for t in reversed(recent)]
+        recent = itertools.islice(reversed(self._task_history), limit)
+        return [t.to_dict() for t in recent]
 
 
 # 全局任务管理器实例
-task_manager = TaskManager()
\ No newline at end of file
+task_manager = TaskManager(max_concurrent_tasks=settings.max_concurrent_tasks)
\ No newline at end of file
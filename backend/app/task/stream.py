@@ -0,0 +1,194 @@
+"""
+Task Event Stream for LLM-MC
+
+Turns TaskManager changes into compact, numbered deltas and fans them out
+to streaming clients (Server-Sent Events on /api/tasks/stream).
+
+- Every delta gets a sequence number; the last `history` deltas are kept so
+  a client can reconnect with the last seq it saw and only get what it missed
+- Each delta only carries fields that changed since the previous delta of
+  the same task
+- Every client has its own bounded buffer; a client that falls behind is
+  sent a full snapshot instead of an unbounded backlog
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+from app.config import settings
+from app.task.manager import Task, TaskManager, task_manager
+
+
+class StreamClient:
+    """一个推送客户端的缓冲"""
+
+    def __init__(self, max_buffer: int):
+        self.buffer: deque = deque()
+        self.max_buffer = max_buffer
+        self.overflowed = False
+        self.dropped = 0
+        self.sent = 0
+        self.connected_at = time.time()
+        self._ready = asyncio.Event()
+
+    def push(self, delta: Dict[str, Any]):
+        if len(self.buffer) >= self.max_buffer:
+            # 客户端跟不上：丢掉缓冲，之后补发一次完整快照
+            self.dropped += len(self.buffer)
+            self.buffer.clear()
+            self.overflowed = True
+        self.buffer.append(delta)
+        self._ready.set()
+
+    async def wait(self, timeout: float) -> bool:
+        """等待新的数据，超时返回 False"""
+        if self.buffer or self.overflowed:
+            return True
+        self._ready.clear()
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+class TaskEventStream:
+    """
+    任务变更推送
+
+    - attach() 后作为 TaskManager 的变更监听器接收事件
+    - stream() 为单个客户端生成 SSE 文本
+    """
+
+    def __init__(self, manager: TaskManager, history: int = 1000, client_buffer: int = 256,
+                 keepalive: float = 15.0):
+        self.manager = manager
+        self.client_buffer = client_buffer
+        self.keepalive = keepalive
+        self.seq = 0
+        self._history: deque = deque(maxlen=history)
+        self._last_sent: Dict[str, Dict[str, Any]] = {}  # 任务ID -> 已推送的字段值
+        self._clients: List[StreamClient] = []
+        self._attached = False
+
+        # 统计
+        self.published = 0
+        self.resyncs = 0
+
+    def attach(self):
+        if not self._attached:
+            self.manager.add_change_listener(self.publish)
+            self._attached = True
+
+    def detach(self):
+        if self._attached:
+            self.manager.remove_change_listener(self.publish)
+            self._attached = False
+
+    # ========== 发布 ==========
+
+    def publish(self, event: str, task: Task, fields: Dict[str, Any]):
+        """TaskManager 变更回调：生成只含变化字段的增量并分发给所有客户端"""
+        last = self._last_sent.setdefault(task.id, {})
+        changes = {}
+        for key, value in fields.items():
+            if key == "log" or last.get(key, ...) != value:
+                changes[key] = value
+                if key != "log":
+                    last[key] = value
+        if event == "create":
+            changes.setdefault("name", task.name)
+        if not changes and event not in ("start", "queue"):
+            return
+        if fields.get("status") in ("completed", "failed", "cancelled"):
+            self._last_sent.pop(task.id, None)
+
+        self.seq += 1
+        delta = {"seq": self.seq, "type": event, "id": task.id, "ts": round(time.time(), 3), **changes}
+        self._history.append(delta)
+        self.published += 1
+        for client in self._clients:
+            client.push(delta)
+
+    # ========== 订阅 ==========
+
+    def snapshot(self) -> Dict[str, Any]:
+        """当前活跃任务的完整状态"""
+        return {
+            "seq": self.seq,
+            "type": "snapshot",
+            "tasks": [t.to_dict() for t in self.manager.running_tasks + self.manager.pending_tasks],
+        }
+
+    def _replay_from(self, since: Optional[int]) -> Optional[List[Dict[str, Any]]]:
+        """since 之后的增量；缓存中已经没有这么早的事件时返回 None"""
+        if since is None or since > self.seq:
+            return None
+        if since == self.seq:
+            return []
+        if not self._history or self._history[0]["seq"] > since + 1:
+            return None
+        return [d for d in self._history if d["seq"] > since]
+
+    @staticmethod
+    def _format(message: Dict[str, Any]) -> str:
+        data = json.dumps(message, ensure_ascii=False, default=str)
+        return f"id: {message['seq']}\nevent: {message['type']}\ndata: {data}\n\n"
+
+    async def stream(self, since: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        为一个客户端生成 SSE 文本
+
+        Args:
+            since: 客户端收到的最后一个序号（重连时使用），为空时先发送快照
+        """
+        client = StreamClient(self.client_buffer)
+        # 注册客户端和计算补发内容之间没有 await，不会漏掉事件
+        self._clients.append(client)
+        try:
+            backlog = self._replay_from(since)
+            if backlog is None:
+                yield self._format(self.snapshot())
+            else:
+                for delta in backlog:
+                    yield self._format(delta)
+
+            while True:
+                if not await client.wait(self.keepalive):
+                    yield ": keepalive\n\n"
+                    continue
+                if client.overflowed:
+                    client.overflowed = False
+                    client.buffer.clear()
+                    self.resyncs += 1
+                    yield self._format(self.snapshot())
+                    continue
+                while client.buffer:
+                    delta = client.buffer.popleft()
+                    client.sent += 1
+                    yield self._format(delta)
+        finally:
+            self._clients.remove(client)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "seq": self.seq,
+            "published": self.published,
+            "history": len(self._history),
+            "resyncs": self.resyncs,
+            "clients": [
+                {"buffered": len(c.buffer), "sent": c.sent, "dropped": c.dropped,
+                 "connected_for": round(time.time() - c.connected_at, 1)}
+                for c in self._clients
+            ],
+        }
+
+
+# 全局任务推送实例
+task_stream = TaskEventStream(
+    task_manager,
+    history=settings.task_stream_history,
+    client_buffer=settings.task_stream_client_buffer
+)
@@ -0,0 +1,97 @@
+"""
+决策循环指标的开销
+
+用桩替换 Bot 服务和 LLM（立即返回 wait 动作），运行真实的 Agent.tick，
+测量一次 tick 的耗时；再单独测量一次 tick 中所有指标记录操作的耗时，
+给出开销占比。桩 LLM 不耗时，这是最坏情况，实际 tick 还要加上模型推理时间。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_agent_metrics [tick 次数]
+"""
+import asyncio
+import sys
+import time
+
+from app.agent import triage
+from app.agent.agent import Agent, TICK_PHASES, _phases, _tick_outcomes, _tick_seconds, _action_seconds, _action_results
+from app.debug.metrics import metrics
+
+
+OBSERVATION = {
+    "position": {"x": 12.5, "y": 64.0, "z": -30.2},
+    "health": {"health": 20, "food": 18},
+    "inventory": [{"name": "oak_log", "count": 12}, {"name": "stone", "count": 40}],
+    "nearbyEntities": [{"name": "cow", "type": "animal", "position": {"x": 15.0, "y": 64.0, "z": -28.0}}],
+    "time": {"timeOfDay": 6000, "isDay": True},
+}
+
+# 本地模型一次决策的典型耗时下限（秒），用于估算实际 tick 中的开销占比
+LLM_LATENCY = 0.1
+
+
+class FakeWorldState:
+    connected = True
+
+    async def get_observation(self):
+        return dict(OBSERVATION)
+
+
+class FakeLLM:
+    last_stats = {}
+
+    async def chat_json(self, system_prompt, user_message, schema=None):
+        return {"thought": "等待", "action": "lookAt", "parameters": {}}
+
+
+class FakeBot:
+    async def execute_action(self, action, parameters=None):
+        return {"success": True, "message": "ok"}
+
+
+def record_once():
+    """一次 LLM tick 中 Agent 记录的全部指标"""
+    now = time.perf_counter()
+    for name in TICK_PHASES:
+        _phases[name].observe(time.perf_counter() - now)
+    _action_seconds.labels("lookAt").observe(0.001)
+    _action_results.labels("lookAt", "success").inc()
+    _tick_outcomes.labels("decided").inc()
+    _tick_seconds.observe(time.perf_counter() - now)
+
+
+async def run(ticks: int = 5000):
+    # app.agent 包导出的 agent 是实例，这里要替换的是模块里的全局对象
+    agent_module = sys.modules[Agent.__module__]
+    agent_module.world_state = FakeWorldState()
+    agent_module.llm_client = triage.llm_client = FakeLLM()
+    agent_module.bot_client = FakeBot()
+    agent_module.print = lambda *args, **kwargs: None
+
+    agent = Agent()
+    agent.is_running = True
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        agent._wake_reasons.add("manual")
+        await agent.tick()
+    tick_time = (time.perf_counter() - start) / ticks
+
+    start = time.perf_counter()
+    for _ in range(ticks):
+        record_once()
+    record_time = (time.perf_counter() - start) / ticks
+
+    start = time.perf_counter()
+    body = metrics.render()
+    render_time = time.perf_counter() - start
+
+    print(f"Agent.tick (桩 LLM):       {tick_time * 1e6:8.1f} µs")
+    print(f"每次 tick 的指标记录:      {record_time * 1e6:8.2f} µs ({record_time / tick_time:.2%} 桩 tick, "
+          f"{record_time / (tick_time + LLM_LATENCY):.4%} 含 {LLM_LATENCY * 1e3:.0f}ms 推理的 tick)")
+    print(f"渲染 /api/metrics:         {render_time * 1e3:8.2f} ms ({len(body.splitlines())} 行)")
+    print(f"tick 结果: {metrics.get('agent_ticks_total').snapshot()}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    asyncio.run(run(*args))
@@ -0,0 +1,83 @@
+"""
+决策解码耗时基准
+
+对比两种解析方式在同一组模型输出上的耗时和成功率：
+- regex:  json.loads 失败后依次尝试 ```json 代码块、``` 代码块、贪婪 {...} 三个正则
+          （等价于引入 decode_json_object 之前的 chat_json）
+- decoder: decode_json_object 一次 raw_decode（必要时从第一个 '{' 开始）+ 按动作定义校验
+
+样本包含受约束输出（纯 JSON）和常见的自由输出（带说明文字、代码块、多个对象）。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_decision_decode [迭代次数]
+"""
+import json
+import re
+import sys
+import time
+
+from app.llm.schema import decision_schema, decode_json_object, DecisionError
+
+
+DECISION = {"thought": "附近有橡木，先去砍树做工具", "action": "collectBlock", "parameters": {"blockType": "oak_log"}}
+SCRIPT = {
+    "thought": "写个脚本连续采集",
+    "action": "executeScript",
+    "parameters": {"script": "async def main(bot):\n    for i in range(5):\n        await bot.collectBlock('oak_log')\n",
+                   "description": "采集 5 个木头"},
+}
+
+SAMPLES = {
+    "schema": json.dumps(DECISION, ensure_ascii=False),
+    "schema_script": json.dumps(SCRIPT, ensure_ascii=False),
+    "fenced": "好的，我来处理：\n```json\n" + json.dumps(DECISION, ensure_ascii=False, indent=2) + "\n```\n",
+    "prose": "我决定这样做 " + json.dumps(DECISION, ensure_ascii=False) + " 然后再看看。",
+    "two_objects": json.dumps(DECISION, ensure_ascii=False) + "\n" + json.dumps(SCRIPT, ensure_ascii=False),
+    "truncated": json.dumps(SCRIPT, ensure_ascii=False)[:-20],
+}
+
+
+def regex_parse(response: str):
+    try:
+        return json.loads(response)
+    except json.JSONDecodeError:
+        patterns = [r'```json\s*([\s\S]*?)\s*```', r'```\s*([\s\S]*?)\s*```', r'\{[\s\S]*\}']
+        for pattern in patterns:
+            match = re.search(pattern, response)
+            if match:
+                json_str = match.group(1) if match.lastindex else match.group(0)
+                try:
+                    return json.loads(json_str)
+                except json.JSONDecodeError:
+                    continue
+        return None
+
+
+def decoder_parse(response: str):
+    try:
+        decision, _ = decode_json_object(response)
+        return decision_schema.validate(decision)
+    except DecisionError:
+        return None
+
+
+def run(iterations: int = 20000):
+    decision_schema.schema  # 预先生成 schema
+    print(f"{'样本':<14}{'regex µs':>10}{'decoder µs':>12}  regex  decoder")
+    for name, text in SAMPLES.items():
+        timings = []
+        results = []
+        for parse in (regex_parse, decoder_parse):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                result = parse(text)
+            timings.append((time.perf_counter() - start) / iterations * 1e6)
+            results.append("ok" if result is not None else "fail")
+        print(f"{name:<14}{timings[0]:>10.2f}{timings[1]:>12.2f}  {results[0]:<6} {results[1]}")
+    stats = decision_schema.get_stats()
+    print(f"schema: {stats['actions']} 个动作, {stats['schema_bytes']} 字节")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    run(*args)
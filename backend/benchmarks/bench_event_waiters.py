@@ -0,0 +1,115 @@
+"""
+事件等待器分发耗时基准
+
+注册 N 个等待 playerCollect 的等待器（每个等待一个不同的实体ID），
+然后以 10k 条事件的速度分发混合事件（position / health / playerCollect），对比：
+- before: 旧实现，所有等待器放在一个列表中，每个事件线性扫描并调用过滤函数
+- after:  BotClient 按事件类型分桶、按 match 字段建立索引
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_event_waiters [等待器数量] [事件数量]
+"""
+import asyncio
+import sys
+import time
+
+from app.bot.client import BotClient
+
+
+def make_events(count: int, waiter_count: int):
+    """生成事件流：大部分是高频的 position/health，少量 playerCollect 不命中任何等待器"""
+    events = []
+    for i in range(count):
+        kind = i % 10
+        if kind < 6:
+            events.append({"type": "position", "position": {"x": i, "y": 64, "z": 0}})
+        elif kind < 9:
+            events.append({"type": "health", "health": 20, "food": 20})
+        else:
+            # 实体ID不在等待范围内，所有等待器都要保持挂起
+            events.append({
+                "type": "playerCollect",
+                "collector": {"name": "Steve"},
+                "collected": {"id": waiter_count + i},
+            })
+    return events
+
+
+class LinearWaiters:
+    """旧实现：单个列表，每个事件扫描全部等待器"""
+
+    def __init__(self):
+        self.waiters = []
+
+    def add(self, event_type, filter_func, future):
+        self.waiters.append({"event_type": event_type, "filter": filter_func, "future": future})
+
+    def check(self, event):
+        event_type = event.get("type")
+        to_remove = []
+        for waiter in self.waiters:
+            if waiter["future"].done():
+                continue
+            if waiter["event_type"] != event_type:
+                continue
+            filter_func = waiter.get("filter")
+            if filter_func:
+                try:
+                    if not filter_func(event):
+                        continue
+                except Exception:
+                    continue
+            waiter["future"].set_result(event)
+            to_remove.append(waiter)
+        for waiter in to_remove:
+            self.waiters.remove(waiter)
+
+
+async def run(waiter_count: int = 1000, event_count: int = 10000):
+    loop = asyncio.get_running_loop()
+    events = make_events(event_count, waiter_count)
+
+    # before
+    linear = LinearWaiters()
+    for i in range(waiter_count):
+        linear.add(
+            "playerCollect",
+            lambda e, eid=i: e.get("collected", {}).get("id") == eid,
+            loop.create_future(),
+        )
+    start = time.perf_counter()
+    for event in events:
+        linear.check(event)
+    before = time.perf_counter() - start
+
+    # after
+    client = BotClient()
+    tasks = [
+        asyncio.create_task(client.wait_for_event("playerCollect", match={"collected.id": i}, timeout=60))
+        for i in range(waiter_count)
+    ]
+    await asyncio.sleep(0)
+    assert client.get_waiter_count() == waiter_count
+    start = time.perf_counter()
+    for event in events:
+        client._check_event_waiters(event)
+    after = time.perf_counter() - start
+
+    # 命中一个等待器后应立即被移除
+    client._check_event_waiters({"type": "playerCollect", "collected": {"id": 0}})
+    await asyncio.sleep(0)
+    resolved = await tasks[0]
+    assert resolved is not None and client.get_waiter_count() == waiter_count - 1
+    client.cancel_all_waiters()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"等待器: {waiter_count}, 事件: {event_count}")
+    print(f"before (线性扫描): {before * 1e3:8.1f} ms, {before / event_count * 1e6:7.2f} µs/事件")
+    print(f"after  (分桶索引): {after * 1e3:8.1f} ms, {after / event_count * 1e6:7.2f} µs/事件")
+    print(f"加速比: {before / after:.1f}x；10k 事件/秒时分发占用 CPU "
+          f"{before / event_count * 1e4 * 100:.1f}% -> {after / event_count * 1e4 * 100:.2f}%")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(run(*args))
@@ -0,0 +1,54 @@
+"""
+系统提示词构建耗时基准
+
+在临时目录中生成 N 个技能，对比每个 tick 构建系统提示词的耗时：
+- before: 每次都完整渲染（等价于引入 PromptCompiler 之前的行为）
+- after:  通过 PromptCompiler 按版本缓存
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_prompt_build [技能数量] [迭代次数]
+"""
+import sys
+import tempfile
+import time
+
+from app.llm import prompts
+from app.skills.manager import SkillManager
+
+
+def run(skill_count: int = 120, iterations: int = 2000):
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = SkillManager(skills_dir=tmp)
+        for i in range(skill_count):
+            manager.save_skill(
+                name=f"技能{i}",
+                description=f"第 {i} 个测试技能，用于基准测试",
+                code="return True",
+                params=["count", "target"],
+            )
+        prompts.skill_manager = manager
+
+        compiler = prompts.PromptCompiler()
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            compiler.invalidate()
+            compiler.compile(has_active_tasks=False)
+        before = (time.perf_counter() - start) / iterations
+
+        compiler.invalidate()
+        start = time.perf_counter()
+        for i in range(iterations):
+            compiler.compile(has_active_tasks=(i % 50 == 0))
+        after = (time.perf_counter() - start) / iterations
+
+        prompt_len = len(compiler.compile(has_active_tasks=False))
+        print(f"技能数: {skill_count}, 提示词长度: {prompt_len} 字符, 迭代: {iterations}")
+        print(f"before (完整渲染): {before * 1e6:9.1f} µs/tick")
+        print(f"after  (分段缓存): {after * 1e6:9.1f} µs/tick  (每 50 tick 切换一次任务状态)")
+        print(f"加速比: {before / after:.1f}x, 缓存统计: {compiler.get_stats()}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    run(*args)
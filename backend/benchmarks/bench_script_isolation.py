@@ -0,0 +1,119 @@
+"""
+脚本执行模式对比：进程内（inprocess） vs worker 进程（process）
+
+1. 每次 bot 调用的开销：脚本连续调用 N 次 bot.chat（模拟的 Bot 立即返回）
+2. 单个脚本的端到端耗时（warm worker）
+3. CPU 密集、不 await 的脚本运行期间，后端事件循环的最大延迟
+4. 死循环脚本：超时后 worker 被杀掉，后端不受影响
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_script_isolation [调用次数]
+"""
+import asyncio
+import statistics
+import sys
+import time
+
+from app.bot.client import bot_client
+from app.script.executor import ScriptExecutor
+
+
+async def fake_execute_action(action, parameters=None, timeout=None):
+    return {"success": True, "message": f"{action} done"}
+
+
+CALLS_SCRIPT = '''
+async def main(bot):
+    for i in range({calls}):
+        await bot.chat("hi")
+    return {calls}
+'''
+
+EMPTY_SCRIPT = '''
+async def main(bot):
+    return 1
+'''
+
+CPU_SCRIPT = '''
+async def main(bot):
+    total = 0
+    for i in range(3000000):
+        total += i * i
+    return total
+'''
+
+SPIN_SCRIPT = '''
+async def main(bot):
+    while True:
+        pass
+'''
+
+
+async def measure_lag(stop: asyncio.Event) -> float:
+    """每 5ms 醒来一次，记录实际延迟的最大值"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.005)
+        worst = max(worst, time.perf_counter() - start - 0.005)
+    return worst
+
+
+async def run_with_lag(executor: ScriptExecutor, script: str, timeout: float = None):
+    stop = asyncio.Event()
+    probe = asyncio.create_task(measure_lag(stop))
+    await asyncio.sleep(0.02)
+    start = time.perf_counter()
+    result = await executor.execute(script, timeout=timeout)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return result, elapsed, await probe
+
+
+async def bench_mode(isolation: str, calls: int):
+    executor = ScriptExecutor(timeout=60, isolation=isolation)
+    await executor.start()
+    try:
+        # 预热（编译缓存、worker 启动）
+        await executor.execute(CALLS_SCRIPT.format(calls=10))
+
+        start = time.perf_counter()
+        result = await executor.execute(CALLS_SCRIPT.format(calls=calls))
+        per_call = (time.perf_counter() - start) / calls
+        assert result["success"] and result["action_count"] == calls, result
+
+        samples = []
+        for _ in range(50):
+            start = time.perf_counter()
+            result = await executor.execute(EMPTY_SCRIPT)
+            samples.append(time.perf_counter() - start)
+            assert result["success"], result
+
+        cpu_result, cpu_elapsed, cpu_lag = await run_with_lag(executor, CPU_SCRIPT)
+        assert cpu_result["success"], cpu_result
+
+        print(f"[{isolation}]")
+        print(f"  每次 bot 调用:        {per_call * 1e6:8.1f} µs")
+        print(f"  空脚本端到端 (中位数): {statistics.median(samples) * 1e3:8.2f} ms")
+        print(f"  CPU 密集脚本:         {cpu_elapsed * 1e3:8.1f} ms, 事件循环最大延迟 {cpu_lag * 1e3:.1f} ms")
+
+        if isolation == "process":
+            spin_result, spin_elapsed, spin_lag = await run_with_lag(executor, SPIN_SCRIPT, timeout=1.0)
+            print(f"  死循环脚本 (超时 1s):  {spin_elapsed * 1e3:8.1f} ms, 事件循环最大延迟 {spin_lag * 1e3:.1f} ms, "
+                  f"error={spin_result.get('error')!r}")
+            after = await executor.execute(EMPTY_SCRIPT)
+            assert after["success"], after
+            print(f"  worker 池: {executor.get_worker_stats()}")
+    finally:
+        await executor.close()
+
+
+async def run(calls: int = 2000):
+    bot_client.execute_action = fake_execute_action
+    for isolation in ("inprocess", "process"):
+        await bench_mode(isolation, calls)
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    asyncio.run(run(*args))
@@ -0,0 +1,132 @@
+"""
+技能往返次数统计
+
+用一个模拟的 Bot 服务（只记录请求、按固定场景返回结果）运行内置技能，
+统计每个技能发往 Bot 服务的请求次数：
+- 逐个请求: Bot 服务不支持 batch，BotAPI.batch / getBlocksAt 退化为逐个请求
+- batch:    合并为一次往返
+
+传入另一个技能目录（比如从旧版本导出的技能文件）可以对比迁移前后的请求次数。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_skill_round_trips [技能目录]
+"""
+import asyncio
+import contextlib
+import io
+import math
+import sys
+from pathlib import Path
+
+from app.bot.client import bot_client
+from app.script.executor import BotAPI
+
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / "skills"
+BOT_POS = {"x": 0, "y": 64, "z": 0}
+
+
+class FakeBotService:
+    """按场景返回固定结果的 Bot 服务替身，统计请求次数"""
+
+    def __init__(self, supports_batch: bool, far_ore: bool = False, free_spot=None):
+        self.supports_batch = supports_batch
+        self.far_ore = far_ore
+        self.free_spot = free_spot  # 唯一的空气方块（用于放置位置检查）
+        self.round_trips = 0
+        self._failed_collect = set()
+        self._goto_calls = 0
+
+    def _block(self, x, y, z):
+        if self.free_spot is not None:
+            name = "air" if (x, y, z) == self.free_spot else "stone"
+        elif self.far_ore:
+            name = "dirt"
+        else:
+            name = "air"
+        return {"success": True, "block": {"name": name, "x": x, "y": y, "z": z}}
+
+    def _find(self, block_type, max_distance):
+        if block_type in ("oak_log", "stone"):
+            pos = {"x": 2, "y": 64, "z": 2}
+        elif block_type in ("iron_ore", "deepslate_iron_ore") and self.far_ore:
+            pos = {"x": 20, "y": 60, "z": 5 if block_type == "iron_ore" else 9}
+        else:
+            return {"success": True, "found": False}
+        distance = math.dist((pos["x"], pos["y"], pos["z"]), (BOT_POS["x"], BOT_POS["y"], BOT_POS["z"]))
+        return {"success": True, "found": True, "position": pos, "distance": distance}
+
+    def action(self, action, params):
+        if action == "getBlockAt":
+            return self._block(params["x"], params["y"], params["z"])
+        if action == "findBlock":
+            return self._find(params["blockType"], params.get("maxDistance"))
+        if action == "viewInventory":
+            return {"success": True, "inventory": [{"name": "iron_pickaxe", "count": 1}]}
+        if action == "collectBlock" and self.far_ore and params["blockType"] not in self._failed_collect:
+            # 远处的矿石第一次采集失败，触发挖通道
+            self._failed_collect.add(params["blockType"])
+            return {"success": False, "message": "No path to block"}
+        if action == "goTo":
+            self._goto_calls += 1
+            if self._goto_calls % 2:
+                return {"success": False, "message": "No path"}
+        return {"success": True, "message": f"{action} done"}
+
+    async def execute_action(self, action, parameters=None, timeout=None):
+        parameters = parameters or {}
+        if action == "batch":
+            if not self.supports_batch:
+                # 旧版本服务：这次请求被拒绝，不计入往返（旧代码根本不会发出它）
+                return {"success": False, "message": "Unknown action: batch"}
+            self.round_trips += 1
+            return {"success": True, "results": [self.action(a["action"], a.get("parameters") or {})
+                                                 for a in parameters["actions"]]}
+        self.round_trips += 1
+        return self.action(action, parameters)
+
+    async def get_observation(self):
+        self.round_trips += 1
+        return {"position": dict(BOT_POS), "health": {"health": 20, "food": 20}, "inventory": []}
+
+    async def get_status(self):
+        self.round_trips += 1
+        return {"connected": True}
+
+
+def load_skill(skills_dir: Path, file_name: str):
+    namespace = {}
+    exec(compile((skills_dir / file_name).read_text(encoding="utf-8"), file_name, "exec"), namespace)
+    return namespace
+
+
+SCENARIOS = [
+    ("采集木头(count=3)", {}, "采集木头.py", "采集木头", {"count": 3}),
+    ("挖矿(stone, 3) 近处直挖", {}, "挖矿.py", "挖矿", {"oreType": "stone", "count": 3}),
+    ("挖矿(iron_ore, 2) 远处挖通道", {"far_ore": True}, "挖矿.py", "挖矿", {"oreType": "iron_ore", "count": 2}),
+    ("合成.find_valid_placement_position", {"free_spot": (0, 64, -2)}, "合成.py", "find_valid_placement_position", {}),
+]
+
+
+async def run_scenario(skills_dir, supports_batch, service_kwargs, file_name, func_name, kwargs):
+    service = FakeBotService(supports_batch, **service_kwargs)
+    bot_client.execute_action = service.execute_action
+    bot_client.get_observation = service.get_observation
+    bot_client.get_status = service.get_status
+    func = load_skill(skills_dir, file_name)[func_name]
+    with contextlib.redirect_stdout(io.StringIO()):
+        await func(BotAPI(), **kwargs)
+    return service.round_trips
+
+
+async def run(skills_dir: Path = SKILLS_DIR):
+    print(f"技能目录: {skills_dir}")
+    print(f"{'技能/场景':<40}{'逐个请求':>8}{'batch':>8}")
+    for label, service_kwargs, file_name, func_name, kwargs in SCENARIOS:
+        single = await run_scenario(skills_dir, False, service_kwargs, file_name, func_name, kwargs)
+        batched = await run_scenario(skills_dir, True, service_kwargs, file_name, func_name, kwargs)
+        print(f"{label:<40}{single:>8}{batched:>8}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run(Path(sys.argv[1]) if len(sys.argv) > 1 else SKILLS_DIR))
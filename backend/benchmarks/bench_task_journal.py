@@ -0,0 +1,62 @@
+"""
+任务日志对事件循环的开销
+
+在临时目录中打开任务日志，测量 update_progress（每次都会写一条日志事件）
+在事件循环上的耗时，对比不开日志的情况；然后关闭日志、重新回放，确认事件都已落盘。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_task_journal [进度更新次数]
+"""
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.task.journal import TaskJournal
+from app.task.manager import TaskManager
+
+
+async def skill(name, kwargs):
+    await asyncio.sleep(3600)
+
+
+async def measure(manager: TaskManager, updates: int) -> float:
+    task = manager.create_task("挖矿", "", skill, "挖矿", {}, resume={"skill": "挖矿", "kwargs": {}})
+    await asyncio.sleep(0)
+    start = time.perf_counter()
+    for i in range(updates):
+        manager.update_progress(task.id, f"已挖到 {i} 个")
+    elapsed = (time.perf_counter() - start) / updates
+    await manager.cancel_task(task.id)
+    return elapsed
+
+
+async def run(updates: int = 20000):
+    without = await measure(TaskManager(), updates)
+
+    path = Path(tempfile.mkdtemp()) / "tasks.journal"
+    manager = TaskManager()
+    journal = TaskJournal(str(path))
+    await manager.recover(journal, skill)
+    with_journal = await measure(manager, updates)
+    start = time.perf_counter()
+    await manager.shutdown()
+    drain = time.perf_counter() - start
+
+    replay = TaskJournal(str(path))
+    start = time.perf_counter()
+    records = replay.load()
+    load_time = time.perf_counter() - start
+    record = next(iter(records.values()))
+
+    print(f"update_progress 无日志:   {without * 1e6:6.2f} µs")
+    print(f"update_progress 有日志:   {with_journal * 1e6:6.2f} µs (事件循环上)")
+    print(f"写线程: {journal.events_written} 条事件, {journal.batches} 批, 压缩 {journal.compactions} 次, "
+          f"关闭时等待 {drain * 1e3:.1f} ms")
+    print(f"回放: {len(records)} 个任务, {load_time * 1e3:.1f} ms, 最后进度: {record.get('progress')!r}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    asyncio.run(run(*args))
@@ -0,0 +1,79 @@
+"""
+任务状态查询的耗时基准
+
+模拟 Agent tick：3 个运行中任务、若干等待中任务、满的历史记录，对比：
+- rebuild: 每次重新扫描任务并序列化（等价于引入缓存之前的 get_status_summary）
+- cached:  任务状态没有变化时 get_status_summary 直接返回缓存
+- changed: 每次调用前都有一次进度更新（最坏情况，等于 rebuild）
+另外测量 get_task 查找历史任务和 running_tasks / current_task 的耗时。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_task_summary [迭代次数]
+"""
+import asyncio
+import sys
+import time
+
+from app.task.manager import TaskManager
+
+
+async def run(iterations: int = 20000):
+    manager = TaskManager(max_concurrent_tasks=3)
+    hold = asyncio.Event()
+
+    async def job():
+        await hold.wait()
+
+    async def quick():
+        return "ok"
+
+    # 填满历史
+    for i in range(manager._max_history):
+        manager.create_task(f"历史任务{i}", "", quick)
+    await asyncio.sleep(0.01)
+
+    # 3 个运行中（不同资源），5 个等待中
+    running = [manager.create_task(f"运行{i}", "", job, resources=[r])
+               for i, r in enumerate(["movement", "inventory", "chat"])]
+    for i in range(5):
+        manager.create_task(f"等待{i}", "", job, resources=["movement"])
+    await asyncio.sleep(0.01)
+    for task in running:
+        for n in range(20):
+            manager.update_progress(task.id, f"进度 {n}")
+
+    def timeit(func, n=iterations):
+        start = time.perf_counter()
+        for _ in range(n):
+            func()
+        return (time.perf_counter() - start) / n * 1e6
+
+    rebuild = timeit(manager._build_status_summary)
+    manager.get_status_summary()
+    cached = timeit(manager.get_status_summary)
+
+    def changed():
+        manager.update_progress(running[0].id, "进度")
+        manager.get_status_summary()
+    changed_cost = timeit(changed, n=iterations // 10)
+
+    oldest = manager._task_history[0].id
+    lookup = timeit(lambda: manager.get_task(oldest))
+    current = timeit(lambda: manager.current_task)
+    active = timeit(lambda: manager.has_active_tasks)
+
+    print(f"运行中 {len(manager.running_tasks)}, 等待中 {len(manager.pending_tasks)}, 历史 {len(manager._task_history)}")
+    print(f"get_status_summary rebuild:  {rebuild:8.2f} µs")
+    print(f"get_status_summary cached:   {cached:8.2f} µs")
+    print(f"get_status_summary changed:  {changed_cost:8.2f} µs")
+    print(f"get_task (最旧的历史):         {lookup:8.2f} µs")
+    print(f"current_task:                {current:8.2f} µs")
+    print(f"has_active_tasks:            {active:8.2f} µs")
+
+    hold.set()
+    await manager.cancel_all_tasks()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    asyncio.run(run(*args))
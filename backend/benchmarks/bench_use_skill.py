@@ -0,0 +1,82 @@
+"""
+重复调用 useSkill 的耗时基准
+
+把内置技能复制到临时目录，反复调用同一个技能，对比：
+- before: 每次都读取文件、compile 并 exec 技能模块（等价于引入 SkillCache 之前的行为）
+- after:  通过 SkillCache 按文件 mtime/内容哈希缓存
+
+分别测量只加载（合成.py，最大的内置技能）和完整的 useSkill 调用（技能体立即返回）。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_use_skill [迭代次数]
+"""
+import asyncio
+import contextlib
+import io
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.script import executor
+from app.skills.cache import SkillCache
+from app.skills.manager import SkillManager
+
+
+SKILLS_DIR = Path(__file__).resolve().parent.parent / "skills"
+
+
+def old_load(manager: SkillManager, name: str):
+    """旧实现：get_skill 读取文件后 compile + exec"""
+    skill = manager.get_skill(name)
+    namespace = executor._skill_globals()
+    exec(compile(skill["full_code"], f"<skill:{name}>", "exec"), namespace, namespace)
+    return namespace[manager._safe_func_name(name)]
+
+
+async def run(iterations: int = 500):
+    with tempfile.TemporaryDirectory() as tmp:
+        shutil.copytree(SKILLS_DIR, tmp, dirs_exist_ok=True)
+        manager = SkillManager(skills_dir=tmp)
+        manager.save_skill("空技能", "立即返回，用于测量调用开销", "return True")
+        cache = SkillCache(manager)
+
+        # 只加载
+        start = time.perf_counter()
+        for _ in range(iterations):
+            old_load(manager, "合成")
+        load_before = (time.perf_counter() - start) / iterations
+
+        start = time.perf_counter()
+        for _ in range(iterations):
+            cache.load("合成", executor._skill_globals).func
+        load_after = (time.perf_counter() - start) / iterations
+
+        # 完整 useSkill
+        executor.skill_manager = manager
+        executor.skill_cache = cache
+        bot = executor.BotAPI()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            for _ in range(iterations):
+                cache.invalidate()
+                await bot.useSkill("空技能")
+            use_before = (time.perf_counter() - start) / iterations
+
+            start = time.perf_counter()
+            for _ in range(iterations):
+                await bot.useSkill("空技能")
+            use_after = (time.perf_counter() - start) / iterations
+
+        print(f"迭代: {iterations}")
+        print(f"加载 合成.py   before: {load_before * 1e6:9.1f} µs  after: {load_after * 1e6:7.1f} µs  "
+              f"({load_before / load_after:.0f}x)")
+        print(f"useSkill 空技能 before: {use_before * 1e6:9.1f} µs  after: {use_after * 1e6:7.1f} µs  "
+              f"({use_before / use_after:.0f}x)")
+        print(f"缓存统计: {cache.get_stats()}")
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:2]]
+    asyncio.run(run(*args))
@@ -0,0 +1,143 @@
+"""
+动作调用延迟基准：HTTP POST /action vs WebSocket RPC
+
+在子进程中启动一个本地替身 Bot 服务（HTTP 和 WebSocket 接口与 bot/src/server.js 一致，
+动作立即返回），用 BotClient 分别以 HTTP 和 WebSocket RPC 发送小动作，对比：
+- 顺序调用的单次延迟（技能中逐个 getBlockAt 的场景）
+- 并发在途请求的吞吐
+
+用法（在 backend 目录下）:
+    python -m benchmarks.bench_ws_rpc [调用次数] [并发数]
+"""
+import asyncio
+import json
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+
+from app.bot.client import BotClient
+from app.config import settings
+
+
+# ========== 替身 Bot 服务 ==========
+
+standin_app = FastAPI()
+
+
+def _fake_action(action: str, parameters: dict) -> dict:
+    if action == "getBlockAt":
+        return {"success": True, "block": {"name": "stone", "x": parameters.get("x"), "y": parameters.get("y"), "z": parameters.get("z")}}
+    return {"success": True, "message": f"{action} done"}
+
+
+@standin_app.get("/status")
+async def standin_status():
+    return {"connected": True, "username": "standin"}
+
+
+@standin_app.get("/observation")
+async def standin_observation():
+    return {"position": {"x": 0, "y": 64, "z": 0}, "health": {"health": 20, "food": 20}}
+
+
+@standin_app.post("/action")
+async def standin_action(body: dict):
+    return _fake_action(body.get("action"), body.get("parameters") or {})
+
+
+@standin_app.websocket("/ws")
+async def standin_ws(ws: WebSocket):
+    await ws.accept()
+
+    async def handle(message: dict):
+        if message.get("method") == "action":
+            result = _fake_action(message.get("action"), message.get("parameters") or {})
+        else:
+            result = {"connected": True}
+        await ws.send_text(json.dumps({"type": "rpcResult", "id": message["id"], "status": 200, "result": result}))
+
+    try:
+        while True:
+            message = json.loads(await ws.receive_text())
+            if message.get("type") == "rpc":
+                asyncio.create_task(handle(message))
+    except WebSocketDisconnect:
+        pass
+
+
+# ========== 基准 ==========
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _measure(client: BotClient, calls: int, concurrency: int):
+    latencies = []
+    for i in range(calls):
+        start = time.perf_counter()
+        await client.execute_action("getBlockAt", {"x": i, "y": 64, "z": 0})
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for batch_start in range(0, calls, concurrency):
+        await asyncio.gather(*[
+            client.execute_action("getBlockAt", {"x": i, "y": 64, "z": 0})
+            for i in range(batch_start, min(batch_start + concurrency, calls))
+        ])
+    throughput = calls / (time.perf_counter() - start)
+    return latencies, throughput
+
+
+def _report(label: str, latencies, throughput):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies) * 1e3
+    p99 = latencies[int(len(latencies) * 0.99) - 1] * 1e3
+    print(f"{label}: p50 {p50:6.3f} ms, p99 {p99:6.3f} ms, 并发吞吐 {throughput:8.0f} 次/秒")
+
+
+async def run(calls: int = 2000, concurrency: int = 32):
+    port = _free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.bench_ws_rpc:standin_app",
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+    )
+    client = BotClient()
+    client.base_url = f"http://127.0.0.1:{port}"
+    client.ws_url = f"ws://127.0.0.1:{port}/ws"
+    try:
+        await client.init()
+        for _ in range(100):
+            try:
+                await client.http_client.get("/status")
+                break
+            except Exception:
+                await asyncio.sleep(0.1)
+        await client.start_ws_listener()
+        while not client.ws_connected:
+            await asyncio.sleep(0.05)
+
+        settings.bot_ws_rpc = False
+        http = await _measure(client, calls, concurrency)
+        settings.bot_ws_rpc = True
+        rpc = await _measure(client, calls, concurrency)
+
+        print(f"调用次数: {calls}, 并发: {concurrency}")
+        _report("HTTP POST /action", *http)
+        _report("WebSocket RPC    ", *rpc)
+        print(f"p50 加速比: {statistics.median(http[0]) / statistics.median(rpc[0]):.1f}x, "
+              f"HTTP 请求 {client.http_request_count} 次, RPC 请求 {client.rpc_request_count} 次")
+    finally:
+        await client.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    asyncio.run(run(*args))
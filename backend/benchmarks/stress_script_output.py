@@ -0,0 +1,100 @@
+"""
+并发脚本输出隔离压力测试
+
+同时运行 N 个脚本（模拟的 Bot，动作随机延迟），每个脚本交替 print、bot.log 和 await 动作，
+同时有一个后台任务持续 print（模拟 Agent 循环 / uvicorn 日志）。检查：
+- 每个脚本的 output 只包含它自己的行，且一行不少
+- 后台任务的输出没有被任何脚本捕获
+失败时以非零状态码退出。
+
+用法（在 backend 目录下）:
+    python -m benchmarks.stress_script_output [脚本数量] [每个脚本的行数]
+"""
+import asyncio
+import io
+import random
+import sys
+import time
+
+from app.bot.client import bot_client
+from app.script.executor import ScriptExecutor
+
+
+async def fake_execute_action(action, parameters=None, timeout=None):
+    await asyncio.sleep(random.uniform(0, 0.005))
+    return {"success": True, "message": f"{action} done"}
+
+
+SCRIPT = '''
+async def main(bot):
+    for i in range({lines}):
+        print("script-{sid} line", i)
+        bot.log("script-{sid} log " + str(i))
+        await bot.chat("hi")
+    return {sid}
+'''
+
+
+async def background_printer(stop: asyncio.Event):
+    count = 0
+    while not stop.is_set():
+        print("background line", count)
+        count += 1
+        await asyncio.sleep(0.001)
+    return count
+
+
+async def run(scripts: int = 50, lines: int = 20) -> bool:
+    bot_client.execute_action = fake_execute_action
+    executor = ScriptExecutor(timeout=60)
+
+    real_stdout = sys.stdout
+    console = io.StringIO()
+    sys.stdout = console
+    try:
+        stop = asyncio.Event()
+        printer = asyncio.create_task(background_printer(stop))
+        start = time.perf_counter()
+        results = await asyncio.gather(*[
+            executor.execute(SCRIPT.format(sid=sid, lines=lines)) for sid in range(scripts)
+        ])
+        elapsed = time.perf_counter() - start
+        stop.set()
+        background_count = await printer
+    finally:
+        sys.stdout = real_stdout
+
+    failures = []
+    for sid, result in enumerate(results):
+        if not result.get("success") or result.get("result") != sid:
+            failures.append(f"script {sid} failed: {result.get('error')}")
+            continue
+        output_lines = [line for line in result["output"].splitlines() if line]
+        foreign = [line for line in output_lines if f"script-{sid} " not in line]
+        expected = 2 * lines  # print + bot.log 各一行
+        if foreign:
+            failures.append(f"script {sid} captured {len(foreign)} foreign lines, e.g. {foreign[0]!r}")
+        if len(output_lines) != expected:
+            failures.append(f"script {sid} captured {len(output_lines)} lines, expected {expected}")
+
+    console_lines = console.getvalue().splitlines()
+    leaked = [line for line in console_lines if "script-" in line]
+    background_seen = sum(1 for line in console_lines if line.startswith("background line"))
+    if leaked:
+        failures.append(f"{len(leaked)} script lines leaked to the console, e.g. {leaked[0]!r}")
+    if background_seen != background_count:
+        failures.append(f"background printed {background_count} lines but only {background_seen} reached the console")
+
+    print(f"脚本: {scripts} 个并发, 每个 {lines} 轮, 耗时 {elapsed:.2f}s, 后台输出 {background_count} 行")
+    if failures:
+        print("FAILED")
+        for failure in failures[:20]:
+            print("  " + failure)
+        return False
+    print("OK: 每个脚本的输出相互隔离，后台输出全部到达控制台")
+    return True
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:3]]
+    sys.exit(0 if asyncio.run(run(*args)) else 1)
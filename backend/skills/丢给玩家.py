@@ -155,14 +155,12 @@ async def skill_丢给玩家(bot, player_name: str, item_name: str, count: int =
     # 6. 等待 playerCollect 事件
     # 使用实体ID集合进行精确匹配
     if dropped_entity_ids:
-        # 精确匹配：只匹配我们丢出的物品
-        def entity_filter(event):
-            collected = event.get("collected", {})
-            collected_id = collected.get("id")
-            return collected_id in dropped_entity_id_set
-        
-        # 等待第一个匹配事件
-        event = await bot.waitForEvent("playerCollect", filter_func=entity_filter, timeout=timeout)
+        # 精确匹配：只匹配我们丢出的物品（按实体ID建立索引，无需过滤函数）
+        event = await bot.waitForEvent(
+            "playerCollect",
+            match={"collected.id": dropped_entity_id_set},
+            timeout=timeout
+        )
     else:
         # 回退到非精确匹配（任意捡起事件）
         event = await bot.waitForPlayerCollect(player_name=None, timeout=timeout)
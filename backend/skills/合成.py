@@ -288,13 +288,20 @@ async def find_valid_placement_position(bot):
         (2, 0, 0), (-2, 0, 0), (0, 0, 2), (0, 0, -2),
     ]
     
+    # 一次请求查完所有候选位置及其下方的方块
+    positions = []
     for dx, dy, dz in offsets:
+        positions.append((bot_x + dx, bot_y + dy, bot_z + dz))
+        positions.append((bot_x + dx, bot_y + dy - 1, bot_z + dz))
+    block_results = await bot.getBlocksAt(positions)
+    
+    for i, (dx, dy, dz) in enumerate(offsets):
         target_x = bot_x + dx
         target_y = bot_y + dy
         target_z = bot_z + dz
         
         # 检查目标位置
-        target_block = await bot.getBlockAt(target_x, target_y, target_z)
+        target_block = block_results[2 * i]
         if not target_block.get("success"):
             continue
         
@@ -303,7 +310,7 @@ async def find_valid_placement_position(bot):
             continue
         
         # 检查下方是否有支撑
-        below_block = await bot.getBlockAt(target_x, target_y - 1, target_z)
+        below_block = block_results[2 * i + 1]
         if not below_block.get("success"):
             continue
         
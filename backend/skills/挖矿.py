@@ -119,8 +119,7 @@ async def 挖矿(bot, oreType="stone", count=5):
     # 内嵌辅助函数：获取当前位置
     async def get_bot_position():
         """获取bot当前位置"""
-        status = await bot.getStatus()
-        return status.get("position", {})
+        return await bot.getPosition()
     
     # 内嵌辅助函数：计算两点距离
     def calc_distance(pos1, pos2):
@@ -170,6 +169,8 @@ async def 挖矿(bot, oreType="stone", count=5):
                         "wall_torch", "redstone_torch", "soul_torch", "lantern",
                         "soul_lantern", "chain", "iron_bars", "glass", "glass_pane"]
         
+        # 先算出视线经过的所有方块，再一次请求查完
+        ray_blocks = []
         for i in range(1, steps):
             t = i / steps
             check_x = int(cur_x + dx * t)
@@ -182,7 +183,14 @@ async def 挖矿(bot, oreType="stone", count=5):
                 check_z == int(target_pos.get("z"))):
                 continue
             
-            block_result = await bot.getBlockAt(check_x, check_y, check_z)
+            if (check_x, check_y, check_z) not in ray_blocks:
+                ray_blocks.append((check_x, check_y, check_z))
+        
+        if not ray_blocks:
+            return True
+        
+        block_results = await bot.getBlocksAt(ray_blocks)
+        for (check_x, check_y, check_z), block_result in zip(ray_blocks, block_results):
             if block_result.get("success"):
                 block = block_result.get("block", {})
                 block_name = block.get("name", "air")
@@ -240,6 +248,7 @@ async def 挖矿(bot, oreType="stone", count=5):
             
             # 检查前方需要挖掘的方块
             blocks_to_dig = []
+            candidates = []
             
             # 检查前方1-2格的方块（水平方向）
             for step in [1, 2]:
@@ -248,42 +257,19 @@ async def 挖矿(bot, oreType="stone", count=5):
                 
                 # 检查脚下和头部高度
                 for y_offset in [0, 1]:
-                    check_y = int(cur_y) + y_offset
-                    block_result = await bot.getBlockAt(check_x, check_y, check_z)
-                    if block_result.get("success"):
-                        block = block_result.get("block", {})
-                        block_name = block.get("name", "air")
-                        if block_name not in unbreakable:
-                            blocks_to_dig.append({
-                                "x": check_x,
-                                "y": check_y,
-                                "z": check_z,
-                                "name": block_name
-                            })
+                    candidates.append((check_x, int(cur_y) + y_offset, check_z))
             
             # 如果目标在上方，需要挖掘上方的方块
             if dy > 0.3:
-                check_x = int(cur_x)
-                check_y = int(cur_y) + 2
-                check_z = int(cur_z)
-                block_result = await bot.getBlockAt(check_x, check_y, check_z)
-                if block_result.get("success"):
-                    block = block_result.get("block", {})
-                    block_name = block.get("name", "air")
-                    if block_name not in unbreakable:
-                        blocks_to_dig.append({
-                            "x": check_x,
-                            "y": check_y,
-                            "z": check_z,
-                            "name": block_name
-                        })
+                candidates.append((int(cur_x), int(cur_y) + 2, int(cur_z)))
             
             # 如果目标在下方，需要挖掘脚下的方块
             if dy < -0.3:
-                check_x = int(cur_x)
-                check_y = int(cur_y) - 1
-                check_z = int(cur_z)
-                block_result = await bot.getBlockAt(check_x, check_y, check_z)
+                candidates.append((int(cur_x), int(cur_y) - 1, int(cur_z)))
+            
+            # 所有候选方块一次请求查完
+            block_results = await bot.getBlocksAt(candidates)
+            for (check_x, check_y, check_z), block_result in zip(candidates, block_results):
                 if block_result.get("success"):
                     block = block_result.get("block", {})
                     block_name = block.get("name", "air")
@@ -377,8 +363,12 @@ async def 挖矿(bot, oreType="stone", count=5):
         best_ore = None
         best_score = float('inf')
         
-        for ore_name in target_ores:
-            result = await bot.findBlock(ore_name, 48)
+        # 所有矿石变种一次请求查完
+        results = await bot.batch([
+            ("findBlock", {"blockType": ore_name, "maxDistance": 48}) for ore_name in target_ores
+        ])
+        
+        for ore_name, result in zip(target_ores, results):
             if result.get("found"):
                 pos = result.get("position", {})
                 pos_key = f"{pos.get('x')},{pos.get('y')},{pos.get('z')}"
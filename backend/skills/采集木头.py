@@ -45,8 +45,12 @@ async def 采集木头(bot, count=1):
         best_wood = None
         best_score = float('inf')  # 分数越低越好
         
-        for wood_type in wood_types:
-            result = await bot.findBlock(wood_type, 32)
+        # 所有木头类型一次请求查完
+        results = await bot.batch([
+            ("findBlock", {"blockType": wood_type, "maxDistance": 32}) for wood_type in wood_types
+        ])
+        
+        for wood_type, result in zip(wood_types, results):
             if result.get("found"):
                 pos = result.get("position", {})
                 pos_key = f"{pos.get('x')},{pos.get('y')},{pos.get('z')}"
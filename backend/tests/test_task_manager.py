@@ -0,0 +1,56 @@
+"""
+TaskManager 调度回归测试
+
+运行: cd backend && python -m pytest tests
+"""
+import asyncio
+
+from app.task.manager import TaskManager, TaskStatus
+
+
+def test_cancel_preemptor_while_victim_unwinds():
+    """抢占者在被抢占任务清理期间被取消：被抢占任务立即重新开始，不能被当成结束"""
+
+    async def scenario():
+        manager = TaskManager()
+        runs = 0
+        unwinding = asyncio.Event()
+        finish_cleanup = asyncio.Event()
+
+        async def victim_job():
+            nonlocal runs
+            runs += 1
+            try:
+                await asyncio.sleep(3600)
+            except asyncio.CancelledError:
+                # 模拟停止寻路等需要时间的清理
+                unwinding.set()
+                await finish_cleanup.wait()
+                raise
+
+        async def preemptor_job():
+            await asyncio.sleep(3600)
+
+        victim = manager.create_task("victim", "", victim_job, priority=0, resources=["movement"])
+        await asyncio.sleep(0)
+        preemptor = manager.create_task("preemptor", "", preemptor_job, priority=5, resources=["movement"])
+        await unwinding.wait()
+
+        assert await manager.cancel_task(preemptor.id)
+        finish_cleanup.set()
+        for _ in range(5):
+            await asyncio.sleep(0)
+
+        assert runs == 2
+        assert victim.status == TaskStatus.RUNNING
+        assert victim.preemptions == 1
+        assert manager.get_task(victim.id) is victim
+        assert victim in manager.running_tasks
+        assert victim.id not in {t.id for t in manager._task_history}
+        assert manager._holders == {"movement": victim.id}
+
+        assert await manager.cancel_task(victim.id)
+        assert victim.status == TaskStatus.CANCELLED
+        assert manager._holders == {}
+
+    asyncio.run(scenario())
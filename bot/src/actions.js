@@ -3,6 +3,24 @@ const { goals } = pathfinderPkg;
 import Vec3 from 'vec3';
 import minecraftData from 'minecraft-data';
 
+// 可以放进 batch 的只读动作（不移动、不改变背包和世界）
+const BATCH_READONLY_ACTIONS = new Set([
+  'viewInventory',
+  'scanBlocks',
+  'findBlock',
+  'getBlockAt',
+  'scanEntities',
+  'listPlayers',
+  'canReach',
+  'getPathTo',
+  'listRecipes',
+  'findCraftingTable',
+  'findFurnace',
+  'findChest',
+  'getRecipeData'
+]);
+const BATCH_MAX_SIZE = 256;
+
 /**
  * Action system for the bot
  * Provides high-level actions that can be invoked via API
@@ -109,6 +127,13 @@ export class Actions {
           z: 'number - Z coordinate'
         }
       },
+      {
+        name: 'batch',
+        description: 'Run several read-only query actions in one request and return their results in order',
+        parameters: {
+          actions: 'array - List of {action, parameters} (read-only actions only, max 256)'
+        }
+      },
       {
         name: 'scanEntities',
         description: 'Scan all entities within range and return detailed information',
@@ -321,6 +346,8 @@ export class Actions {
           return await this.findBlock(params.blockType, params.maxDistance);
         case 'getBlockAt':
           return await this.getBlockAt(params.x, params.y, params.z);
+        case 'batch':
+          return await this.batch(params.actions);
         case 'scanEntities':
           return await this.scanEntities(params.range, params.entityType);
         case 'listPlayers':
@@ -378,6 +405,30 @@ export class Actions {
     }
   }
 
+  /**
+   * Run several read-only actions in one round-trip
+   * 每一项单独返回结果，某一项失败不影响其他项
+   */
+  async batch(actions) {
+    if (!Array.isArray(actions)) {
+      return { success: false, message: 'actions must be an array' };
+    }
+    if (actions.length > BATCH_MAX_SIZE) {
+      return { success: false, message: `Too many actions in batch: ${actions.length} (max ${BATCH_MAX_SIZE})` };
+    }
+    
+    const results = [];
+    for (const item of actions) {
+      const name = item?.action;
+      if (!BATCH_READONLY_ACTIONS.has(name)) {
+        results.push({ success: false, message: `Action not allowed in batch: ${name}` });
+        continue;
+      }
+      results.push(await this.execute(name, item.parameters || {}));
+    }
+    return { success: true, count: results.length, results };
+  }
+
   /**
    * Send chat message
    */
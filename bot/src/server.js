@@ -20,6 +20,7 @@ class BotServer {
     this.actions = null;
     this.observer = null;
     this.wsClients = new Set();
+    this._throttleState = {};
     
     this._setupMiddleware();
     this._setupRoutes();
@@ -122,6 +123,19 @@ class BotServer {
       console.log('[Server] WebSocket client connected');
       this.wsClients.add(ws);
       
+      // 请求/响应通道：{type:'rpc', id, method, action?, parameters?} -> {type:'rpcResult', id, status, result}
+      ws.on('message', (data) => {
+        let message;
+        try {
+          message = JSON.parse(data.toString());
+        } catch (error) {
+          return;
+        }
+        if (message?.type === 'rpc') {
+          this._handleRpc(ws, message);
+        }
+      });
+      
       ws.on('close', () => {
         console.log('[Server] WebSocket client disconnected');
         this.wsClients.delete(ws);
@@ -134,6 +148,52 @@ class BotServer {
     });
   }
 
+  /**
+   * 处理 WebSocket 上的 RPC 请求，返回值与对应的 HTTP 接口一致
+   * 请求可以并发执行，响应通过 id 与请求对应
+   */
+  async _handleRpc(ws, message) {
+    const { id, method } = message;
+    let status = 200;
+    let result;
+    
+    try {
+      if (method === 'status') {
+        result = {
+          connected: this.bot?.isConnected || false,
+          username: config.minecraft.username
+        };
+      } else if (method === 'observation') {
+        if (!this.observer) {
+          status = 400;
+          result = { error: 'Bot not connected' };
+        } else {
+          result = this.observer.getObservation();
+        }
+      } else if (method === 'action') {
+        if (!this.actions) {
+          status = 400;
+          result = { success: false, message: 'Bot not connected' };
+        } else if (!message.action) {
+          status = 400;
+          result = { success: false, message: 'Action required' };
+        } else {
+          result = await this.actions.execute(message.action, message.parameters || {});
+        }
+      } else {
+        status = 404;
+        result = { error: `Unknown rpc method: ${method}` };
+      }
+    } catch (error) {
+      status = 500;
+      result = { success: false, message: error.message };
+    }
+    
+    if (ws.readyState === 1) { // OPEN
+      ws.send(JSON.stringify({ type: 'rpcResult', id, status, result }));
+    }
+  }
+
   _setupEventForwarding() {
     if (!this.bot) return;
     
@@ -243,6 +303,54 @@ class BotServer {
       });
     });
 
+    // Forward world state changes so the backend can mirror them locally
+    // (position / inventory / nearby entities / time), throttled to limit traffic
+    mcBot.on('move', () => {
+      this._throttledBroadcast('position', 250, () => {
+        const position = this.bot?.getPosition();
+        return position ? { type: 'position', position, timestamp: Date.now() } : null;
+      });
+    });
+
+    mcBot.inventory.on('updateSlot', () => {
+      this._throttledBroadcast('inventory', 50, () => {
+        if (!this.bot?.getMineflayerBot()) return null;
+        const inventory = this.bot.getMineflayerBot().inventory.items().map(item => ({
+          name: item.name,
+          displayName: item.displayName,
+          count: item.count,
+          slot: item.slot
+        }));
+        return { type: 'inventory', inventory, timestamp: Date.now() };
+      });
+    });
+
+    const forwardEntities = () => {
+      this._throttledBroadcast('entities', 1000, () => {
+        if (!this.bot?.getMineflayerBot()?.entity) return null;
+        return { type: 'entities', nearbyEntities: this.bot.getNearbyEntities(16), timestamp: Date.now() };
+      });
+    };
+    mcBot.on('entityMoved', forwardEntities);
+    mcBot.on('entitySpawn', forwardEntities);
+    mcBot.on('entityGone', forwardEntities);
+
+    mcBot.on('time', () => {
+      this._throttledBroadcast('time', 5000, () => {
+        const bot = this.bot?.getMineflayerBot();
+        if (!bot) return null;
+        return {
+          type: 'time',
+          time: {
+            timeOfDay: bot.time.timeOfDay,
+            isDay: bot.time.timeOfDay < 13000 || bot.time.timeOfDay > 23000
+          },
+          weather: { isRaining: bot.isRaining },
+          timestamp: Date.now()
+        };
+      });
+    });
+
     // Forward entity spawn (useful for tracking dropped items)
     mcBot.on('entitySpawn', (entity) => {
       // Only broadcast for item entities to avoid spam
@@ -266,6 +374,30 @@ class BotServer {
     });
   }
 
+  /**
+   * Broadcast at most once per interval for a given key.
+   * A trailing broadcast is scheduled so the last state change is never lost.
+   * @param {string} key
+   * @param {number} intervalMs
+   * @param {() => object} build - builds the event payload at send time
+   */
+  _throttledBroadcast(key, intervalMs, build) {
+    const state = this._throttleState[key] || (this._throttleState[key] = { last: 0, timer: null });
+    const wait = intervalMs - (Date.now() - state.last);
+    if (wait <= 0) {
+      state.last = Date.now();
+      const data = build();
+      if (data) this._broadcast(data);
+    } else if (!state.timer) {
+      state.timer = setTimeout(() => {
+        state.timer = null;
+        state.last = Date.now();
+        const data = build();
+        if (data) this._broadcast(data);
+      }, wait);
+    }
+  }
+
   _broadcast(data) {
     const message = JSON.stringify(data);
     for (const client of this.wsClients) {